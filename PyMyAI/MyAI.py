@@ -1,10 +1,121 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import zlib
+import multiprocessing
+import random
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import shogi
+import shogi.CSA
+import shogi.KIF
+
+
+# --- 駒の価値（評価辞書、cp: 歩=100） ---
+PIECE_VALUE_DICT = {
+    "P": 100,
+    "L": 500,
+    "N": 500,
+    "S": 700,
+    "G": 800,
+    "B": 1000,
+    "R": 1200,
+    "+P": 200,
+    "+L": 600,
+    "+N": 600,
+    "+S": 900,
+    "+B": 1500,
+    "+R": 1800,
+    "p": -100,
+    "l": -500,
+    "n": -500,
+    "s": -700,
+    "g": -800,
+    "b": -1000,
+    "r": -1200,
+    "+p": -200,
+    "+l": -600,
+    "+n": -600,
+    "+s": -900,
+    "+b": -1500,
+    "+r": -1800,
+}
+
+# 成駒 -> 元の駒種（取った駒は成りを戻して持ち駒になる）
+UNPROMOTED = [
+    shogi.PIECE_PROMOTED.index(piece_type)
+    if shogi.PROM_PAWN <= piece_type <= shogi.PROM_ROOK
+    else piece_type
+    for piece_type in range(16)
+]
+
+
+def piece_type_values(piece_value_dict):
+    """駒種(shogi.PAWN ... shogi.PROM_ROOK)ごとの価値（歩=1）。玉は取り合いの並べ替え用に最大
+
+    cpを100で割って四捨五入する（切り捨てだと430と480が同じ4に、100未満が0になる）。
+    駒のあるマスは最低1。
+    """
+    values = [0] + [
+        max(1, round(piece_value_dict.get(shogi.PIECE_SYMBOLS[piece_type].upper(), 0) / 100))
+        for piece_type in shogi.PIECE_TYPES
+    ]
+    values[shogi.KING] = 100
+    return values
+
+
+def see_values(piece_value_dict):
+    """取り合い（SEE）で使う駒の価値。取られると盤上の価値を失い相手の持ち駒になるので
+    盤上の価値＋成る前の駒の価値（cp）。玉は取られたら終わりなので十分大きく
+    """
+    values = [0] * 16
+    for piece_type in shogi.PIECE_TYPES:
+        symbol = shogi.PIECE_SYMBOLS[piece_type].upper()
+        base = shogi.PIECE_SYMBOLS[UNPROMOTED[piece_type]].upper()
+        values[piece_type] = piece_value_dict.get(symbol, 0) + piece_value_dict.get(base, 0)
+    values[shogi.KING] = 100000
+    return values
+
+
+def compile_piece_values(piece_value_dict):
+    """評価辞書を [手番 * 16 + 駒種] で引ける整数表(盤上用, 持ち駒用)に変換"""
+    board_values = [0] * 32
+    hand_values = [0] * 32
+    for color in shogi.COLORS:
+        for piece_type in shogi.PIECE_TYPES:
+            symbol = shogi.Piece(piece_type, color).symbol()
+            board_values[color * 16 + piece_type] = piece_value_dict.get(symbol, 0)
+        for piece_type in range(shogi.PAWN, shogi.KING):
+            symbol = shogi.PIECE_SYMBOLS[piece_type]
+            if color == shogi.BLACK:
+                symbol = symbol.upper()
+            hand_values[color * 16 + piece_type] = piece_value_dict.get(symbol, 0)
+    return board_values, hand_values
 
 
 # --- 評価用クラス ---
 class ShogiAI:
-    def __init__(self, piece_value_dict):
+    """駒得の評価値（先手から見た値）を指し手ごとに差分更新する
+
+    reset(board)で全数計算した後は push/pop で盤面と一緒に更新する。
+    debug=True なら毎手、全数計算との一致を確かめる。
+    """
+
+    # 駒得以外の評価（Positionを受け取り先手から見た値を返す）。Noneなら駒得だけ
+    positional = None
+
+    def __init__(self, piece_value_dict, debug=False):
         self.piece_value_dict = piece_value_dict
+        self.board_values, self.hand_values = compile_piece_values(piece_value_dict)
+        self.debug = debug
+        self.score = 0
+        self.deltas = []
 
     def evaluate(self, piece_list):
         """駒の合計点で盤面を評価"""
@@ -13,6 +124,101 @@ class ShogiAI:
             total += self.piece_value_dict.get(piece, 0)
         return total
 
+    def evaluate_full(self, board):
+        """盤上駒＋持ち駒を全数計算"""
+        board_values = self.board_values
+        hand_values = self.hand_values
+        white = board.occupied[shogi.WHITE]
+        total = 0
+        for square, piece_type in enumerate(board.pieces):
+            if piece_type:
+                color = 1 if white & shogi.BB_SQUARES[square] else 0
+                total += board_values[color * 16 + piece_type]
+        for color in shogi.COLORS:
+            for piece_type, count in board.pieces_in_hand[color].items():
+                total += hand_values[color * 16 + piece_type] * count
+        return total
+
+    def reset(self, board):
+        self.score = self.evaluate_full(board)
+        self.deltas = []
+
+    def push(self, board, move):
+        """指し手を指し、評価値を差分で更新する"""
+        color = board.turn * 16
+        board_values = self.board_values
+        if move.drop_piece_type:
+            piece_type = move.drop_piece_type
+            delta = board_values[color + piece_type] - self.hand_values[color + piece_type]
+        else:
+            piece_type = board.pieces[move.from_square]
+            delta = -board_values[color + piece_type]
+            if move.promotion:
+                piece_type = shogi.PIECE_PROMOTED[piece_type]
+            delta += board_values[color + piece_type]
+            captured = board.pieces[move.to_square]
+            if captured:
+                delta += (
+                    self.hand_values[color + UNPROMOTED[captured]]
+                    - board_values[16 - color + captured]
+                )
+        board.push(move)
+        self.score += delta
+        self.deltas.append(delta)
+        if self.debug:
+            self.check(board)
+
+    def pop(self, board):
+        board.pop()
+        self.score -= self.deltas.pop()
+
+    def check(self, board):
+        full = self.evaluate_full(board)
+        if full != self.score:
+            raise AssertionError(
+                f"差分評価が全数計算と一致しません: {self.score} != {full} ({board.sfen()})"
+            )
+
+    def evaluate_position(self, pos):
+        """探索用の局面(Position)を全数計算"""
+        board_values = self.board_values
+        hand_values = self.hand_values
+        total = 0
+        for code in pos.board:
+            total += board_values[code]
+        for index, count in enumerate(pos.hands):
+            total += hand_values[(index >> 3) * 16 + (index & 7)] * count
+        return total
+
+    def check_position(self, pos):
+        full = self.evaluate_position(pos)
+        if full != pos.material:
+            raise AssertionError(
+                f"差分評価が全数計算と一致しません: {pos.material} != {full} ({pos.sfen()})"
+            )
+
+
+def load_piece_values(path):
+    """{"P": 100, "L": 500, ...} 形式（先手の駒だけ、cp）のJSONを読み、後手の駒を負の値で補った評価辞書を返す"""
+    with open(path, encoding="utf-8") as f:
+        values = json.load(f)
+    table = {}
+    for symbol, value in values.items():
+        table[symbol.upper()] = int(value)
+        table[symbol.lower()] = -int(value)
+    return table
+
+
+# tune.py で棋譜から合わせた駒の価値があれば、起動時にそれを使う
+PIECE_VALUES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "piece_values.json")
+if os.path.exists(PIECE_VALUES_PATH):
+    PIECE_VALUE_DICT = load_piece_values(PIECE_VALUES_PATH)
+# 並べ替え・SEE・delta pruning も評価と同じ駒の価値で
+PIECE_TYPE_VALUES = piece_type_values(PIECE_VALUE_DICT)
+SEE_VALUES = see_values(PIECE_VALUE_DICT)
+
+default_evaluator = ShogiAI(PIECE_VALUE_DICT)
+
 
 # --- 盤面を駒リストに変換 (持ち駒は含まない) ---
 def board_to_piece_list(board):
@@ -31,11 +237,11 @@ def board_to_hand_list(board):
     hand_list = []
 
     # 先手の持ち駒
-    for p in board.pieces_in_hand[shogi.BLACK]:
-        hand_list.append(p.symbol())
+    for piece_type, count in board.pieces_in_hand[shogi.BLACK].items():
+        hand_list += [shogi.PIECE_SYMBOLS[piece_type].upper()] * count
     # 後手の持ち駒
-    for p in board.pieces_in_hand[shogi.WHITE]:
-        hand_list.append(p.symbol().lower())  # 後手は小文字
+    for piece_type, count in board.pieces_in_hand[shogi.WHITE].items():
+        hand_list += [shogi.PIECE_SYMBOLS[piece_type]] * count  # 後手は小文字
 
     return hand_list
 
@@ -49,12 +255,1311 @@ def evaluate_board(board, piece_value_dict):
     return ai.evaluate(pieces)
 
 
+# --- 指し手 <-> 16bit整数 ---
+def encode_move(move):
+    """shogi.Moveを16bit整数に変換 (0は「手なし」)"""
+    if move.drop_piece_type:
+        return move.to_square | (81 + move.drop_piece_type) << 7
+    return move.to_square | move.from_square << 7 | move.promotion << 14
+
+
+def decode_move(code):
+    """encode_moveの逆変換"""
+    to_square = code & 127
+    from_square = (code >> 7) & 127
+    if from_square > 81:
+        return shogi.Move(None, to_square, False, from_square - 81)
+    return shogi.Move(from_square, to_square, bool(code >> 14))
+
+
+def move_to_usi(code):
+    return decode_move(code).usi()
+
+
+def move_from_usi(usi):
+    return encode_move(shogi.Move.from_usi(usi))
+
+
+def board_to_usi_position(board):
+    """shogi.Boardを (開始局面のSFEN, USIの指し手リスト) に変換"""
+    moves = list(board.move_stack)
+    for _ in moves:
+        board.pop()
+    sfen = board.sfen()
+    for move in moves:
+        board.push(move)
+    return sfen, [move.usi() for move in moves]
+
+
+# --- 探索用の局面（配列ベース） ---
+# 駒コード: 0=空き、先手の駒=駒種(1..14)、後手の駒=駒種+16。手番 = コード >> 4
+# 指し手は encode_move と同じ整数（打つ手は移動元 = 81 + 駒種）
+PROMOTION_FLAG = 1 << 14
+WHITE_PIECE = 16
+
+# 成った後の駒コード / 成れる駒か
+PROMOTED_CODE = [0] * 32
+CAN_PROMOTE = bytearray(32)
+for _piece_type in range(shogi.PAWN, shogi.KING):
+    if shogi.PIECE_PROMOTED[_piece_type] is not None:
+        for _color_bit in (0, WHITE_PIECE):
+            PROMOTED_CODE[_piece_type | _color_bit] = (
+                shogi.PIECE_PROMOTED[_piece_type] | _color_bit
+            )
+            CAN_PROMOTE[_piece_type | _color_bit] = 1
+# 成駒を元に戻した駒コード
+UNPROMOTED_CODE = [code & WHITE_PIECE | UNPROMOTED[code & 15] for code in range(32)]
+
+# 駒コード -> 手番ごとの「自分の駒か」
+OWN_PIECE = [
+    bytes(1 if code and code >> 4 == color else 0 for code in range(32))
+    for color in shogi.COLORS
+]
+
+# 先手から見た利きの方向 (段の増減, 筋の増減)。後手は段の向きを反転する
+_GOLD_STEPS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, 0))
+_KING_STEPS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+_DIAGONALS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+_ORTHOGONALS = ((-1, 0), (0, -1), (0, 1), (1, 0))
+STEP_DIRECTIONS = {
+    shogi.PAWN: ((-1, 0),),
+    shogi.KNIGHT: ((-2, -1), (-2, 1)),
+    shogi.SILVER: ((-1, -1), (-1, 0), (-1, 1), (1, -1), (1, 1)),
+    shogi.GOLD: _GOLD_STEPS,
+    shogi.KING: _KING_STEPS,
+    shogi.PROM_PAWN: _GOLD_STEPS,
+    shogi.PROM_LANCE: _GOLD_STEPS,
+    shogi.PROM_KNIGHT: _GOLD_STEPS,
+    shogi.PROM_SILVER: _GOLD_STEPS,
+    shogi.PROM_BISHOP: _ORTHOGONALS,
+    shogi.PROM_ROOK: _DIAGONALS,
+}
+RAY_DIRECTIONS = {
+    shogi.LANCE: ((-1, 0),),
+    shogi.BISHOP: _DIAGONALS,
+    shogi.ROOK: _ORTHOGONALS,
+    shogi.PROM_BISHOP: _DIAGONALS,
+    shogi.PROM_ROOK: _ORTHOGONALS,
+}
+
+
+def _ray(square, dr, dc):
+    rank, file = divmod(square, 9)
+    squares = []
+    rank += dr
+    file += dc
+    while 0 <= rank < 9 and 0 <= file < 9:
+        squares.append(rank * 9 + file)
+        if abs(dr) == 2:  # 桂馬は1回だけ
+            break
+        rank += dr
+        file += dc
+    return tuple(squares)
+
+
+def _piece_directions(table, code):
+    dirs = table.get(code & 15, ())
+    if code & WHITE_PIECE:
+        return tuple((-dr, dc) for dr, dc in dirs)
+    return dirs
+
+
+# 駒コード -> 升 -> 1歩で行ける升 / 走る方向ごとの升の並び
+STEP_TARGETS = [[()] * 81 for _ in range(32)]
+RAY_TARGETS = [[()] * 81 for _ in range(32)]
+for _code in range(1, 31):
+    if _code & 15 == 0 or _code & 15 > shogi.PROM_ROOK:
+        continue
+    for _square in range(81):
+        STEP_TARGETS[_code][_square] = tuple(
+            _ray(_square, dr, dc)[0]
+            for dr, dc in _piece_directions(STEP_DIRECTIONS, _code)
+            if _ray(_square, dr, dc)
+        )
+        RAY_TARGETS[_code][_square] = tuple(
+            ray
+            for ray in (
+                _ray(_square, dr, dc)
+                for dr, dc in _piece_directions(RAY_DIRECTIONS, _code)
+            )
+            if ray
+        )
+
+# 利きの逆引き: [攻め方][升] -> ((移動元, 駒コードのビットマスク), ...)
+STEP_ATTACKERS = [[() for _ in range(81)] for _ in shogi.COLORS]
+SLIDER_ATTACKERS = [[() for _ in range(81)] for _ in shogi.COLORS]
+for _color in shogi.COLORS:
+    _codes = [
+        code
+        for code in range(1, 31)
+        if code >> 4 == _color and 0 < code & 15 <= shogi.PROM_ROOK
+    ]
+    _step = [dict() for _ in range(81)]
+    for _code in _codes:
+        for _square in range(81):
+            for _target in STEP_TARGETS[_code][_square]:
+                _step[_target][_square] = _step[_target].get(_square, 0) | 1 << _code
+    for _square in range(81):
+        STEP_ATTACKERS[_color][_square] = tuple(_step[_square].items())
+        _sliders = []
+        for dr, dc in _KING_STEPS:
+            ray = _ray(_square, dr, dc)
+            mask = 0
+            for _code in _codes:
+                if (-dr, -dc) in _piece_directions(RAY_DIRECTIONS, _code):
+                    mask |= 1 << _code
+            if ray and mask:
+                _sliders.append((ray, mask))
+        SLIDER_ATTACKERS[_color][_square] = tuple(_sliders)
+
+# 升どうしが同じ筋・段・斜めに並んでいるか（ピンの可能性）
+ALIGNED = [
+    bytes(
+        1
+        if a != b
+        and (
+            a // 9 == b // 9
+            or a % 9 == b % 9
+            or abs(a // 9 - b // 9) == abs(a % 9 - b % 9)
+        )
+        else 0
+        for b in range(81)
+    )
+    for a in range(81)
+]
+
+# 升と升の間の升（同じ筋・段・斜めに並んでいなければ空）
+BETWEEN = [[()] * 81 for _ in range(81)]
+for _a in range(81):
+    for _dr, _dc in _KING_STEPS:
+        _line = _ray(_a, _dr, _dc)
+        for _i, _b in enumerate(_line):
+            BETWEEN[_a][_b] = _line[:_i]
+
+# [手番][升] -> 敵陣か
+PROMOTION_ZONE = [
+    bytes(1 if square // 9 <= 2 else 0 for square in range(81)),
+    bytes(1 if square // 9 >= 6 else 0 for square in range(81)),
+]
+# [駒コード][升] -> 不成では行き所のない升か（歩・香は最奥段、桂は奥2段）
+DEAD_SQUARE = [bytearray(81) for _ in range(32)]
+for _square in range(81):
+    _rank = _square // 9
+    for _color_bit, _last, _second in ((0, 0, 1), (WHITE_PIECE, 8, 7)):
+        if _rank == _last:
+            for _piece_type in (shogi.PAWN, shogi.LANCE, shogi.KNIGHT):
+                DEAD_SQUARE[_piece_type | _color_bit][_square] = 1
+        if _rank == _second:
+            DEAD_SQUARE[shogi.KNIGHT | _color_bit][_square] = 1
+
+# zobristハッシュ用の乱数（固定シードで毎回同じ値）
+_random = random.Random(0x5F3759DF)
+ZOBRIST_PIECE = [_random.getrandbits(64) for _ in range(32 * 81)]
+ZOBRIST_HAND = [_random.getrandbits(64) for _ in range(16 * 20)]  # [手番*8+駒種][枚目]
+ZOBRIST_SIDE = _random.getrandbits(64)
+del _random
+
+STACK_SIZE = 1024
+
+
+class Position:
+    """探索専用の局面
+
+    盤はbytearray(81)の駒コード、持ち駒は [手番*8+駒種] の枚数、
+    指し手は整数。make/unmakeはオブジェクトを作らずO(1)で進める・戻す。
+    shogi.Board / SFEN との変換は探索の入口と出口だけで行う。
+    """
+
+    def __init__(self, evaluator=None):
+        if evaluator is None:
+            evaluator = default_evaluator
+        self.evaluator = evaluator
+        self.board_values = evaluator.board_values
+        self.hand_values = evaluator.hand_values
+        self.positional = evaluator.positional
+        self.board = bytearray(81)
+        self.hands = bytearray(16)
+        self.king_squares = [-1, -1]
+        self.turn = shogi.BLACK
+        self.key = 0
+        self.material = 0  # 先手から見た駒得
+        self.ply = 0
+        # 手ごとの戻し用スタック
+        self.move_stack = array("l", [0]) * STACK_SIZE
+        self.captured_stack = bytearray(STACK_SIZE)
+        self.key_stack = array("Q", [0]) * STACK_SIZE
+        self.material_stack = array("l", [0]) * STACK_SIZE
+        # 手数ごとの、手番側が王手されていたか（連続王手の千日手の判定用。探索と棋譜の再生で付ける）
+        self.check_stack = bytearray(STACK_SIZE)
+
+    # --- 変換 ---
+    @classmethod
+    def from_sfen(cls, sfen, evaluator=None):
+        pos = cls(evaluator)
+        parts = sfen.split()
+        square = 0
+        promoted = False
+        for c in parts[0]:
+            if c == "/":
+                continue
+            if c.isdigit():
+                square += int(c)
+            elif c == "+":
+                promoted = True
+            else:
+                piece = shogi.Piece.from_symbol(c)
+                piece_type = piece.piece_type
+                if promoted:
+                    piece_type = shogi.PIECE_PROMOTED[piece_type]
+                    promoted = False
+                pos.board[square] = piece_type | piece.color << 4
+                if piece_type == shogi.KING:
+                    pos.king_squares[piece.color] = square
+                square += 1
+        pos.turn = shogi.BLACK if parts[1] == "b" else shogi.WHITE
+        if parts[2] != "-":
+            count = 0
+            for c in parts[2]:
+                if c.isdigit():
+                    count = count * 10 + int(c)
+                    continue
+                piece = shogi.Piece.from_symbol(c)
+                pos.hands[piece.color * 8 + piece.piece_type] += count or 1
+                count = 0
+        pos.key = pos.compute_key()
+        pos.material = pos.evaluator.evaluate_position(pos)
+        return pos
+
+    @classmethod
+    def from_usi(cls, sfen, usi_moves, evaluator=None):
+        """開始局面のSFENとUSIの指し手リストから作る"""
+        pos = cls.from_sfen(sfen, evaluator)
+        pos.check_stack[0] = pos.in_check()
+        for usi in usi_moves:
+            pos.make(move_from_usi(usi))
+            pos.check_stack[pos.ply] = pos.in_check()
+        return pos
+
+    @classmethod
+    def from_board(cls, board, evaluator=None):
+        """shogi.Boardから作る。千日手判定のため棋譜も手順ごと再生する"""
+        sfen, usi_moves = board_to_usi_position(board)
+        return cls.from_usi(sfen, usi_moves, evaluator)
+
+    def sfen(self):
+        rows = []
+        for rank in range(9):
+            row = []
+            empty = 0
+            for code in self.board[rank * 9 : rank * 9 + 9]:
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    row.append(str(empty))
+                    empty = 0
+                row.append(shogi.Piece(code & 15, code >> 4).symbol())
+            if empty:
+                row.append(str(empty))
+            rows.append("".join(row))
+        hands = []
+        for color in shogi.COLORS:
+            for piece_type in range(shogi.ROOK, shogi.NONE, -1):
+                count = self.hands[color * 8 + piece_type]
+                if count:
+                    symbol = shogi.Piece(piece_type, color).symbol()
+                    hands.append((str(count) if count > 1 else "") + symbol)
+        return "{0} {1} {2} {3}".format(
+            "/".join(rows),
+            "b" if self.turn == shogi.BLACK else "w",
+            "".join(hands) or "-",
+            self.ply + 1,
+        )
+
+    def to_board(self):
+        return shogi.Board(self.sfen())
+
+    def compute_key(self):
+        key = ZOBRIST_SIDE if self.turn == shogi.WHITE else 0
+        for square, code in enumerate(self.board):
+            if code:
+                key ^= ZOBRIST_PIECE[code * 81 + square]
+        for index, count in enumerate(self.hands):
+            for n in range(count):
+                key ^= ZOBRIST_HAND[index * 20 + n]
+        return key
+
+    # --- 指し手を進める・戻す ---
+    def make(self, move):
+        ply = self.ply
+        if ply == len(self.move_stack):
+            self._grow_stacks()
+        us = self.turn
+        board = self.board
+        to_square = move & 127
+        from_square = (move >> 7) & 127
+        key = self.key
+        material = self.material
+        self.move_stack[ply] = move
+        self.key_stack[ply] = key
+        self.material_stack[ply] = material
+        key ^= ZOBRIST_SIDE
+
+        if from_square >= 81:
+            # 打つ手
+            code = (from_square - 81) | us << 4
+            index = us * 8 + from_square - 81
+            count = self.hands[index] - 1
+            self.hands[index] = count
+            key ^= ZOBRIST_HAND[index * 20 + count] ^ ZOBRIST_PIECE[code * 81 + to_square]
+            material += self.board_values[code] - self.hand_values[code]
+            captured = 0
+        else:
+            code = board[from_square]
+            captured = board[to_square]
+            key ^= ZOBRIST_PIECE[code * 81 + from_square]
+            if move & PROMOTION_FLAG:
+                promoted = PROMOTED_CODE[code]
+                material += self.board_values[promoted] - self.board_values[code]
+                code = promoted
+            if captured:
+                key ^= ZOBRIST_PIECE[captured * 81 + to_square]
+                hand_code = UNPROMOTED_CODE[captured] ^ WHITE_PIECE
+                index = us * 8 + (hand_code & 15)
+                count = self.hands[index]
+                self.hands[index] = count + 1
+                key ^= ZOBRIST_HAND[index * 20 + count]
+                material += self.hand_values[hand_code] - self.board_values[captured]
+            board[from_square] = 0
+            key ^= ZOBRIST_PIECE[code * 81 + to_square]
+            if code & 15 == shogi.KING:
+                self.king_squares[us] = to_square
+
+        board[to_square] = code
+        self.captured_stack[ply] = captured
+        self.key = key
+        self.material = material
+        self.turn = us ^ 1
+        self.ply = ply + 1
+        if self.evaluator.debug:
+            self.evaluator.check_position(self)
+
+    def unmake(self):
+        ply = self.ply - 1
+        move = self.move_stack[ply]
+        captured = self.captured_stack[ply]
+        us = self.turn ^ 1
+        board = self.board
+        to_square = move & 127
+        from_square = (move >> 7) & 127
+
+        if from_square >= 81:
+            self.hands[us * 8 + from_square - 81] += 1
+            board[to_square] = 0
+        else:
+            code = board[to_square]
+            if move & PROMOTION_FLAG:
+                code = UNPROMOTED_CODE[code]
+            board[from_square] = code
+            board[to_square] = captured
+            if captured:
+                self.hands[us * 8 + UNPROMOTED[captured & 15]] -= 1
+            if code & 15 == shogi.KING:
+                self.king_squares[us] = from_square
+
+        self.turn = us
+        self.ply = ply
+        self.key = self.key_stack[ply]
+        self.material = self.material_stack[ply]
+
+    def make_null(self):
+        """手番だけを相手に渡す（null move）。unmake_nullで戻す"""
+        ply = self.ply
+        if ply == len(self.move_stack):
+            self._grow_stacks()
+        self.move_stack[ply] = 0
+        self.captured_stack[ply] = 0
+        self.key_stack[ply] = self.key
+        self.material_stack[ply] = self.material
+        self.key ^= ZOBRIST_SIDE
+        self.turn ^= 1
+        self.ply = ply + 1
+
+    def unmake_null(self):
+        ply = self.ply - 1
+        self.turn ^= 1
+        self.ply = ply
+        self.key = self.key_stack[ply]
+
+    def rewind(self, ply):
+        """plyの局面まで戻す。探索を途中で打ち切ったときに使う（null moveは手が0）"""
+        while self.ply > ply:
+            if self.move_stack[self.ply - 1]:
+                self.unmake()
+            else:
+                self.unmake_null()
+
+    def _grow_stacks(self):
+        self.move_stack.extend(array("l", [0]) * STACK_SIZE)
+        self.captured_stack.extend(bytearray(STACK_SIZE))
+        self.key_stack.extend(array("Q", [0]) * STACK_SIZE)
+        self.material_stack.extend(array("l", [0]) * STACK_SIZE)
+        self.check_stack.extend(bytearray(STACK_SIZE))
+
+    # --- 利き ---
+    def is_attacked(self, square, color):
+        """squareにcolor側の駒の利きがあるか"""
+        board = self.board
+        for from_square, mask in STEP_ATTACKERS[color][square]:
+            if mask >> board[from_square] & 1:
+                return True
+        for ray, mask in SLIDER_ATTACKERS[color][square]:
+            for s in ray:
+                code = board[s]
+                if code:
+                    if mask >> code & 1:
+                        return True
+                    break
+        return False
+
+    def attackers(self, square, color):
+        """squareに利いているcolor側の駒の升"""
+        board = self.board
+        squares = []
+        for from_square, mask in STEP_ATTACKERS[color][square]:
+            if mask >> board[from_square] & 1:
+                squares.append(from_square)
+        for ray, mask in SLIDER_ATTACKERS[color][square]:
+            for s in ray:
+                code = board[s]
+                if code:
+                    if mask >> code & 1:
+                        squares.append(s)
+                    break
+        return squares
+
+    def in_check(self):
+        king = self.king_squares[self.turn]
+        return king >= 0 and self.is_attacked(king, self.turn ^ 1)
+
+    # --- 指し手生成 ---
+    def generate_moves(self):
+        """疑似合法手（自玉への王手放置・打ち歩詰めは未チェック）"""
+        us = self.turn
+        board = self.board
+        own = OWN_PIECE[us]
+        zone = PROMOTION_ZONE[us]
+        moves = []
+        append = moves.append
+        empties = []
+        pawn_files = 0
+        pawn_code = shogi.PAWN | us << 4
+
+        for from_square in range(81):
+            code = board[from_square]
+            if not code:
+                empties.append(from_square)
+                continue
+            if not own[code]:
+                continue
+            if code == pawn_code:
+                pawn_files |= 1 << from_square % 9
+            base = from_square << 7
+            promotable = CAN_PROMOTE[code]
+            dead = DEAD_SQUARE[code]
+            from_zone = zone[from_square]
+            for to_square in STEP_TARGETS[code][from_square]:
+                if own[board[to_square]]:
+                    continue
+                if promotable and (from_zone or zone[to_square]):
+                    append(to_square | base | PROMOTION_FLAG)
+                    if dead[to_square]:
+                        continue
+                append(to_square | base)
+            for ray in RAY_TARGETS[code][from_square]:
+                for to_square in ray:
+                    target = board[to_square]
+                    if own[target]:
+                        break
+                    if promotable and (from_zone or zone[to_square]):
+                        append(to_square | base | PROMOTION_FLAG)
+                        if not dead[to_square]:
+                            append(to_square | base)
+                    else:
+                        append(to_square | base)
+                    if target:
+                        break
+
+        # 持ち駒を打つ手
+        hands = self.hands
+        drops = [
+            (piece_type | us << 4, (81 + piece_type) << 7)
+            for piece_type in range(shogi.PAWN, shogi.KING)
+            if hands[us * 8 + piece_type]
+        ]
+        if drops:
+            for to_square in empties:
+                for code, base in drops:
+                    if DEAD_SQUARE[code][to_square]:
+                        continue
+                    if code == pawn_code and pawn_files >> to_square % 9 & 1:
+                        continue  # 二歩
+                    append(to_square | base)
+        return moves
+
+    def generate_captures(self):
+        """駒を取る疑似合法手だけ（成り・不成の両方）。合法かは指す直前に is_legal で確かめる"""
+        us = self.turn
+        board = self.board
+        own = OWN_PIECE[us]
+        enemy = OWN_PIECE[us ^ 1]
+        zone = PROMOTION_ZONE[us]
+        moves = []
+        append = moves.append
+        for from_square in range(81):
+            code = board[from_square]
+            if not own[code]:
+                continue
+            base = from_square << 7
+            promotable = CAN_PROMOTE[code]
+            dead = DEAD_SQUARE[code]
+            from_zone = zone[from_square]
+            for to_square in STEP_TARGETS[code][from_square]:
+                if not enemy[board[to_square]]:
+                    continue
+                if promotable and (from_zone or zone[to_square]):
+                    append(to_square | base | PROMOTION_FLAG)
+                    if dead[to_square]:
+                        continue
+                append(to_square | base)
+            for ray in RAY_TARGETS[code][from_square]:
+                for to_square in ray:
+                    target = board[to_square]
+                    if not target:
+                        continue
+                    if enemy[target]:
+                        if promotable and (from_zone or zone[to_square]):
+                            append(to_square | base | PROMOTION_FLAG)
+                            if not dead[to_square]:
+                                append(to_square | base)
+                        else:
+                            append(to_square | base)
+                    break
+        return moves
+
+    def see(self, move):
+        """駒を取る手の取り合いの損得（手番側から見たcp、SEE_VALUESの値で）
+
+        to_squareに利く駒のうち一番安い駒から順に取り返し合い、
+        どちらも損なら途中で止める前提の値を返す。飛び駒の後ろの駒（X線）も数える。
+        """
+        board = self.board
+        to_square = move & 127
+        from_square = (move >> 7) & 127
+        code = board[from_square]
+        if move & PROMOTION_FLAG:
+            code = PROMOTED_CODE[code]
+        gains = [SEE_VALUES[board[to_square] & 15]]
+        on_square = SEE_VALUES[code & 15]
+        removed = [(from_square, board[from_square])]
+        board[from_square] = 0
+        side = self.turn ^ 1
+        while True:
+            attackers = self.attackers(to_square, side)
+            if not attackers:
+                break
+            square = min(attackers, key=lambda s: SEE_VALUES[board[s] & 15])
+            gains.append(on_square - gains[-1])
+            on_square = SEE_VALUES[board[square] & 15]
+            removed.append((square, board[square]))
+            board[square] = 0
+            side ^= 1
+        for square, piece in removed:
+            board[square] = piece
+        # 後ろから、取り返すかやめるかの良い方を選ぶ
+        for i in range(len(gains) - 1, 0, -1):
+            gains[i - 1] = -max(-gains[i - 1], gains[i])
+        return gains[0]
+
+    def is_legal(self, move, in_check):
+        """疑似合法手が合法か（王手放置・打ち歩詰めの確認）"""
+        us = self.turn
+        from_square = (move >> 7) & 127
+        if from_square >= 81:
+            pawn_drop = from_square - 81 == shogi.PAWN and self._pawn_checks(
+                move & 127
+            )
+            if not in_check and not pawn_drop:
+                return True
+        else:
+            king = self.king_squares[us]
+            if (
+                not in_check
+                and self.board[from_square] & 15 != shogi.KING
+                and (king < 0 or not ALIGNED[king][from_square])
+            ):
+                return True
+            pawn_drop = False
+
+        self.make(move)
+        king = self.king_squares[us]  # 詰将棋では攻め方に玉がない
+        legal = king < 0 or not self.is_attacked(king, us ^ 1)
+        if legal and pawn_drop and not self.has_legal_move():
+            legal = False  # 打ち歩詰め
+        self.unmake()
+        return legal
+
+    def _pawn_checks(self, to_square):
+        """to_squareに打った歩が相手玉に王手をかけるか"""
+        king = self.king_squares[self.turn ^ 1]
+        if self.turn == shogi.BLACK:
+            return king == to_square - 9
+        return king == to_square + 9
+
+    def legal_moves(self):
+        if self.in_check():
+            return self.evasions()
+        return [move for move in self.generate_moves() if self.is_legal(move, False)]
+
+    def evasions(self):
+        """王手されているときの合法手
+
+        玉以外の駒は、王手している駒を取るか間に入る手しか合法にならないので、
+        それ以外の升への手（特に大量の駒打ち）は指して確かめずに捨てる。
+        """
+        king = self.king_squares[self.turn]
+        checkers = self.attackers(king, self.turn ^ 1)
+        targets = ()
+        if len(checkers) == 1:
+            targets = (checkers[0],) + BETWEEN[king][checkers[0]]
+        board = self.board
+        moves = []
+        for move in self.generate_moves():
+            from_square = (move >> 7) & 127
+            if move & 127 not in targets and (
+                from_square >= 81 or board[from_square] & 15 != shogi.KING
+            ):
+                continue
+            if self.is_legal(move, True):
+                moves.append(move)
+        return moves
+
+    def check_moves(self):
+        """相手玉に王手をかける合法手
+
+        動いた後の駒が玉に利く升へ行く手と、開き王手になりうる（玉と同じ筋・段・斜めから動く）手だけを
+        実際に指して確かめる。
+        """
+        them = self.turn ^ 1
+        king = self.king_squares[them]
+        if king < 0:
+            return []
+        board = self.board
+        color_bit = self.turn << 4
+        checking = {}  # 駒コード -> その駒で玉に利く升
+        in_check = self.in_check()
+        moves = []
+        for move in self.generate_moves():
+            to_square = move & 127
+            from_square = (move >> 7) & 127
+            if from_square >= 81:
+                code = (from_square - 81) | color_bit
+            else:
+                code = board[from_square]
+                if move & PROMOTION_FLAG:
+                    code = PROMOTED_CODE[code]
+            squares = checking.get(code)
+            if squares is None:
+                # 玉の位置に相手の向きの同じ駒を置いたときの利き
+                flipped = code ^ WHITE_PIECE
+                squares = set(STEP_TARGETS[flipped][king])
+                for ray in RAY_TARGETS[flipped][king]:
+                    for square in ray:
+                        squares.add(square)
+                        if board[square]:
+                            break
+                checking[code] = squares
+            if to_square not in squares and (
+                from_square >= 81 or not ALIGNED[king][from_square]
+            ):
+                continue
+            if not self.is_legal(move, in_check):
+                continue
+            self.make(move)
+            if self.in_check():
+                moves.append(move)
+            self.unmake()
+        return moves
+
+    def is_legal_move(self, move):
+        """棋譜の指し手など、1手だけ合法か調べる"""
+        return move in self.generate_moves() and self.is_legal(move, self.in_check())
+
+    def has_legal_move(self):
+        in_check = self.in_check()
+        for move in self.generate_moves():
+            if self.is_legal(move, in_check):
+                return True
+        return False
+
+    def repetition_count(self):
+        """現局面がこれまでに現れた回数（現局面を含む）"""
+        return self.key_stack[: self.ply].count(self.key) + 1
+
+    def is_game_over(self):
+        return self.repetition_count() >= 4 or not self.has_legal_move()
+
+    def repetition(self):
+        """現局面が以前に現れていれば 0（千日手）/ 1（相手の連続王手で手番側の勝ち）/
+        -1（手番側の連続王手で負け）、現れていなければNone
+
+        探索中は最初の繰り返しで千日手とみなす。null moveをまたぐ繰り返しは数えない。
+        王手だったかは check_stack で見るので、途中の局面には付けておくこと。
+        """
+        key = self.key
+        ply = self.ply
+        stack = self.key_stack
+        if key not in stack[:ply]:
+            return None
+        # キーに手番が入っているので、同じ局面は偶数手前にしかない
+        i = ply - 2
+        while stack[i] != key:
+            i -= 2
+        if 0 in self.move_stack[i:ply]:
+            return None
+        checks = self.check_stack
+        checks[ply] = self.in_check()
+        if all(checks[i + 1 : ply : 2]):
+            return -1
+        if all(checks[i + 2 : ply + 1 : 2]):
+            return 1
+        return 0
+
+
+# --- 置換表（transposition table） ---
+EXACT, LOWER, UPPER = 0, 1, 2  # 評価値の種類: 確定値 / 下限 / 上限
+
+TT_ENTRY_BYTES = 16  # キー8byte + データ8byte
+SCORE_OFFSET = 1 << 31
+TT_GENERATION_MASK = 0x3F  # 世代は6bit（26〜31bit目）。その上は評価値
+
+
+class TranspositionTable:
+    """zobristハッシュをキーにした固定サイズの置換表
+
+    1スロット = キー(64bit) + データ(64bit)。データの内訳は
+    評価値(32bit) | 世代(6bit) | 種類(2bit) | 深さ(8bit) | 最善手(16bit)。
+
+    置換方針: 空き・同一局面・古い世代のスロットは常に上書き、
+    同じ世代なら深さが同じかより深い探索結果だけが上書きする。
+    """
+
+    def __init__(self, size_mb=16):
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        # スロット数は2の冪に切り下げ（インデックスをマスクで計算するため）
+        n = max(1, size_mb * 1024 * 1024 // TT_ENTRY_BYTES)
+        self.size = 1 << (n.bit_length() - 1)
+        self.mask = self.size - 1
+        self.keys = array("Q", bytes(8 * self.size))
+        self.data = array("Q", bytes(8 * self.size))
+        self.generation = 0
+        self.reset_stats()
+
+    def clear(self):
+        self.resize(self.size * TT_ENTRY_BYTES // (1024 * 1024))
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def new_search(self):
+        """探索開始ごとに世代を進める（古いエントリを置換しやすくする）"""
+        self.generation = (self.generation + 1) & TT_GENERATION_MASK
+
+    def probe(self, key):
+        """(深さ, 評価値, 種類, 最善手コード) を返す。見つからなければNone"""
+        index = key & self.mask
+        if self.keys[index] != key:
+            if self.data[index]:
+                self.collisions += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        d = self.data[index]
+        return (
+            (d >> 16) & 0xFF,
+            (d >> 32) - SCORE_OFFSET,
+            (d >> 24) & 0x3,
+            d & 0xFFFF,
+        )
+
+    def store(self, key, depth, score, bound, move_code):
+        index = key & self.mask
+        old = self.data[index]
+        if (
+            old
+            and self.keys[index] != key
+            and (old >> 26) & TT_GENERATION_MASK == self.generation
+            and (old >> 16) & 0xFF > depth
+        ):
+            return
+        # 同一局面で手が無い場合は以前の最善手を残す
+        if not move_code and self.keys[index] == key:
+            move_code = old & 0xFFFF
+        self.keys[index] = key
+        self.data[index] = (
+            (int(score) + SCORE_OFFSET) << 32
+            | self.generation << 26
+            | bound << 24
+            | min(depth, 0xFF) << 16
+            | move_code
+        )
+        self.stores += 1
+
+    def stats(self):
+        probes = self.hits + self.misses
+        used = sum(1 for d in self.data if d)
+        return {
+            "size": self.size,
+            "probes": probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "fill": used / self.size,
+        }
+
+
+transposition_table = TranspositionTable()
+
+
+# --- 解析キャッシュ（ディスク上の置換表） ---
+# 反復深化で読み終えた (局面, 深さ) → 評価値・最善手 をmmapしたファイルに置き、
+# 起動し直しても・別のプロセスからでも引けるようにする。開くときはヘッダを見るだけで展開しない。
+# ファイル = ヘッダ + 4スロットずつのバケツ。1スロット = 検査値(64bit) + データ(64bit)で、
+# 検査値は キー ^ データ。書きかけのスロットはキーが合わなくなるので、ロックなしで読み書きできる。
+# データ = 評価値(32bit, 手番側から見た値) | 日付(8bit) | 深さ(8bit) | 最善手(16bit)
+CACHE_MAGIC = b"MYAICACH"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<8sII")  # マジック, 版, バケツ数
+CACHE_SLOT = struct.Struct("<QQ")  # 検査値, データ
+CACHE_BUCKET = 4
+CACHE_AGE_WEIGHT = 2  # 1日古いエントリは深さ2つ分浅いものとして追い出す
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis.cache")
+
+
+def cache_day():
+    """エントリの日付（1日単位、256日で一周）"""
+    return int(time.time() // 86400) & 0xFF
+
+
+class AnalysisCache:
+    """mmapしたファイルの (局面, 深さ) → (評価値, 最善手) の表
+
+    size_mb が上限で、ファイルはそれ以上大きくならない。既存のファイルと大きさが違えば、
+    入っているエントリを移して作り直す。同じバケツが埋まっていれば、浅くて古いものから置き換える。
+    """
+
+    def __init__(self, path=CACHE_PATH, size_mb=64):
+        self.path = path
+        slots = max(CACHE_BUCKET, size_mb * 1024 * 1024 // CACHE_SLOT.size)
+        buckets = 1 << ((slots // CACHE_BUCKET).bit_length() - 1)
+        if self.file_buckets(path) != buckets:
+            self.create(path, buckets)
+        self.file = open(path, "r+b")
+        self.data = mmap.mmap(self.file.fileno(), 0)
+        self.buckets = CACHE_HEADER.unpack_from(self.data, 0)[2]
+        self.mask = self.buckets - 1
+        self.reset_stats()
+
+    @staticmethod
+    def file_buckets(path):
+        """既存のキャッシュファイルのバケツ数（なければ・壊れていれば0）"""
+        try:
+            with open(path, "rb") as f:
+                header = f.read(CACHE_HEADER.size)
+                size = os.fstat(f.fileno()).st_size
+        except OSError:
+            return 0
+        if len(header) < CACHE_HEADER.size:
+            return 0
+        magic, version, buckets = CACHE_HEADER.unpack(header)
+        expected = CACHE_HEADER.size + buckets * CACHE_BUCKET * CACHE_SLOT.size
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or size != expected:
+            return 0
+        return buckets
+
+    @classmethod
+    def create(cls, path, buckets):
+        """空のファイルを作って置き換える（古いファイルのエントリは移す）"""
+        old = []
+        if cls.file_buckets(path):
+            with open(path, "rb") as f:
+                old = list(cls.iter_slots(f.read()))
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, buckets))
+            f.truncate(CACHE_HEADER.size + buckets * CACHE_BUCKET * CACHE_SLOT.size)
+        if old:
+            cache = cls.__new__(cls)
+            cache.file = open(temp, "r+b")
+            cache.data = mmap.mmap(cache.file.fileno(), 0)
+            cache.buckets, cache.mask = buckets, buckets - 1
+            cache.reset_stats()
+            # 深いものを後に書いて残りやすくする
+            for key, data in sorted(old, key=lambda e: (e[1] >> 16) & 0xFF):
+                cache.write(key, data)
+            cache.close()
+        os.replace(temp, path)
+
+    @staticmethod
+    def iter_slots(data):
+        """埋まっているスロットの (キー, データ)"""
+        slots = array("Q")
+        slots.frombytes(data[CACHE_HEADER.size :])
+        if sys.byteorder != "little":
+            slots.byteswap()
+        for i in range(0, len(slots), 2):
+            if slots[i + 1]:
+                yield slots[i] ^ slots[i + 1], slots[i + 1]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def probe(self, key):
+        """(深さ, 評価値, 最善手コード) を返す。なければNone"""
+        self.probes += 1
+        offset = CACHE_HEADER.size + (key & self.mask) * CACHE_BUCKET * CACHE_SLOT.size
+        for _ in range(CACHE_BUCKET):
+            check, data = CACHE_SLOT.unpack_from(self.data, offset)
+            if data and check ^ data == key:
+                self.hits += 1
+                return (data >> 16) & 0xFF, (data >> 32) - SCORE_OFFSET, data & 0xFFFF
+            offset += CACHE_SLOT.size
+        return None
+
+    def store(self, key, depth, score, move_code):
+        self.write(
+            key,
+            (int(score) + SCORE_OFFSET) << 32
+            | cache_day() << 24
+            | min(depth, 0xFF) << 16
+            | move_code,
+        )
+
+    def write(self, key, data):
+        today = (data >> 24) & 0xFF
+        depth = (data >> 16) & 0xFF
+        offset = CACHE_HEADER.size + (key & self.mask) * CACHE_BUCKET * CACHE_SLOT.size
+        victim, worst, evict = offset, None, False
+        for _ in range(CACHE_BUCKET):
+            check, old = CACHE_SLOT.unpack_from(self.data, offset)
+            if old and check ^ old == key:
+                if (old >> 16) & 0xFF > depth:
+                    return  # もっと深い結果を残す
+                victim, evict = offset, False
+                break
+            if not old:
+                value = -1 << 16  # 空きを優先
+            else:
+                age = (today - ((old >> 24) & 0xFF)) & 0xFF
+                value = ((old >> 16) & 0xFF) - CACHE_AGE_WEIGHT * age
+            if worst is None or value < worst:
+                victim, worst, evict = offset, value, bool(old)
+            offset += CACHE_SLOT.size
+        CACHE_SLOT.pack_into(self.data, victim, key ^ data, data)
+        self.stores += 1
+        self.evictions += evict
+
+    def stats(self, full=False):
+        """ヒット率など。full=True ならファイル全体を数えて埋まり具合も出す"""
+        result = {
+            "path": self.path,
+            "size_mb": round(len(self.data) / (1024 * 1024), 1),
+            "slots": self.buckets * CACHE_BUCKET,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.probes, 3) if self.probes else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+        if full:
+            used = sum(1 for _ in self.iter_slots(self.data))
+            result["entries"] = used
+            result["fill"] = round(used / result["slots"], 4)
+        return result
+
+    # --- 探索との受け渡し ---
+    @staticmethod
+    def position_key(pos):
+        """局面キーに駒の価値を混ぜる（違う評価値の結果を取り違えないように）"""
+        values = array("i", pos.board_values + pos.hand_values).tobytes()
+        return pos.key ^ zlib.crc32(values) << 32
+
+    def lookup(self, pos):
+        """posの (深さ, 手番側から見た評価値, 読み筋) を返す。なければNone"""
+        entry = self.probe(self.position_key(pos))
+        if entry is None or not pos.is_legal_move(entry[2]):
+            return None
+        depth, value, move = entry
+        # 読み筋は子局面のエントリをたどる
+        pv = [move]
+        pos.make(move)
+        seen = {pos.key}
+        while len(pv) < depth:
+            child = self.probe(self.position_key(pos))
+            if child is None or not pos.is_legal_move(child[2]):
+                break
+            pos.make(child[2])
+            if pos.key in seen:
+                pos.unmake()
+                break
+            seen.add(pos.key)
+            pv.append(child[2])
+        for _ in pv:
+            pos.unmake()
+        return depth, value, pv
+
+    def store_pv(self, pos, depth, value, pv):
+        """深さdepthで読んだ結果を、読み筋の局面ごとに1手ずつ浅くして書く"""
+        made = 0
+        for move in pv:
+            if depth - made < 1:
+                break
+            self.store(self.position_key(pos), depth - made, value, move)
+            pos.make(move)
+            # 詰みの評価値は1手進むごとに詰みまでの手数が1減る
+            value = -value
+            if value >= MATE_BOUND:
+                value += 1
+            elif value <= -MATE_BOUND:
+                value -= 1
+            made += 1
+        for _ in range(made):
+            pos.unmake()
+
+
+analysis_cache = None  # open_analysis_cache で開いたもの。探索はあれば使う
+
+
+def open_analysis_cache(path=CACHE_PATH, size_mb=64):
+    """解析キャッシュを開く（なければ作る）。以後の iterative_deepening が使う"""
+    global analysis_cache
+    close_analysis_cache()
+    analysis_cache = AnalysisCache(path, size_mb)
+    return analysis_cache
+
+
+def close_analysis_cache():
+    global analysis_cache
+    if analysis_cache is not None:
+        analysis_cache.close()
+        analysis_cache = None
+
+
+# --- 探索の打ち切り条件（時間・ノード数） ---
+class SearchAborted(Exception):
+    """制限時間またはノード数上限に達した"""
+
+
+CUTOFF_BUCKETS = 8  # βカットを起こした手の順番の集計（最後の要素は8手目以降まとめて）
+
+
+class SearchStats:
+    """1回の探索の統計。get_best_move(with_stats=True) などで最善手と一緒に返す"""
+
+    def __init__(self):
+        self.nodes = 0  # 静止探索を含む全ノード数
+        self.qnodes = 0  # うち静止探索のノード数
+        self.cutoffs = [0] * CUTOFF_BUCKETS
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.seldepth = 0  # 静止探索を含めた最大の手数
+        self.null_cutoffs = 0  # null moveで打ち切ったノード数
+        self.reductions = 0  # LMRで浅く読んだ手の数
+        self.researches = 0  # PVS・aspirationの窓を外れて読み直した回数
+        self.see_pruned = 0  # 静止探索でSEEが負なので読まなかった駒取り
+        self.delta_pruned = 0  # 静止探索でαに届かないので読まなかった駒取り
+        self.iterations = []  # 反復ごとの {"depth", "value", "nodes", "ms"}
+        self.book = False  # 定跡から指した
+        self.mate = 0  # df-pnで詰みを見つけた手数
+        self.cache_depth = 0  # 解析キャッシュから得た深さ
+
+    def merge(self, other):
+        """別の探索（並列探索のワーカーなど）の統計を足し込む"""
+        self.nodes += other.nodes
+        self.qnodes += other.qnodes
+        self.cutoffs = [a + b for a, b in zip(self.cutoffs, other.cutoffs)]
+        self.tt_probes += other.tt_probes
+        self.tt_hits += other.tt_hits
+        self.seldepth = max(self.seldepth, other.seldepth)
+        self.null_cutoffs += other.null_cutoffs
+        self.reductions += other.reductions
+        self.researches += other.researches
+        self.see_pruned += other.see_pruned
+        self.delta_pruned += other.delta_pruned
+
+    def depth(self):
+        return self.iterations[-1]["depth"] if self.iterations else 0
+
+    def ms(self):
+        return self.iterations[-1]["ms"] if self.iterations else 0
+
+    def first_move_cutoff_rate(self):
+        total = sum(self.cutoffs)
+        return self.cutoffs[0] / total if total else 0.0
+
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def as_dict(self):
+        return {
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "cutoffs": list(self.cutoffs),
+            "first_move_cutoff_rate": round(self.first_move_cutoff_rate(), 3),
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "seldepth": self.seldepth,
+            "null_cutoffs": self.null_cutoffs,
+            "reductions": self.reductions,
+            "researches": self.researches,
+            "see_pruned": self.see_pruned,
+            "delta_pruned": self.delta_pruned,
+            "cache_depth": self.cache_depth,
+            "iterations": list(self.iterations),
+        }
+
+    def summary(self):
+        """1行の要約"""
+        if self.book:
+            return "定跡"
+        if self.mate:
+            return f"{self.mate}手詰め ノード{self.nodes}"
+        if self.cache_depth and not self.iterations:
+            return f"キャッシュ 深さ{self.cache_depth}"
+        return (
+            f"深さ{self.depth()}/{self.seldepth} ノード{self.nodes}"
+            f"(静止{self.qnodes}) 置換表ヒット{self.tt_hit_rate():.0%} "
+            f"初手カット{self.first_move_cutoff_rate():.0%} {self.ms()}ms"
+        )
+
+
+class JsonLinesTrace:
+    """トレースのイベントを1行1JSONでファイルに書く（SearchLimitsのtraceに渡す）"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def __call__(self, event):
+        self.file.write(json.dumps(event) + "\n")
+
+
+# 探索の枝刈り・窓の工夫。SearchLimits(features=...) で個別に切れる
+SEARCH_FEATURES = ("pvs", "null_move", "lmr", "aspiration", "see", "delta")
+
+
+def parse_features(text):
+    """"pvs+lmr" / "all" / "none" 形式を SEARCH_FEATURES の部分集合にする"""
+    if text in ("all", None):
+        return frozenset(SEARCH_FEATURES)
+    names = frozenset(filter(None, text.replace(",", "+").split("+"))) - {"none"}
+    unknown = names - set(SEARCH_FEATURES)
+    if unknown:
+        raise ValueError(f"不明な探索の機能です: {', '.join(sorted(unknown))}")
+    return names
+
+
+class SearchLimits:
+    """1回の探索の制限と状態。探索関数に渡して回す
+
+    trace(event) を渡すと、ルートからtrace_ply手以内（省略時は全部）のノードで
+    イベントのdictを受け取る。traceがNoneなら何もしない。
+    featuresは使う SEARCH_FEATURES の集合（省略時は全部）。
+    """
+
+    def __init__(
+        self, deadline=None, max_nodes=None, trace=None, trace_ply=None, features=None
+    ):
+        self.deadline = deadline  # time.perf_counter()基準の締め切り
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.stopped = False  # 他のスレッドからstop()で止める
+        self.stats = SearchStats()
+        self.trace = trace
+        self.trace_ply = MAX_PLY if trace_ply is None else trace_ply
+        self.features = frozenset(SEARCH_FEATURES if features is None else features)
+        self.searcher = None  # Cython版で探索中なら myai_core.Searcher
+
+    def stop(self):
+        self.stopped = True
+        searcher = self.searcher
+        if searcher is not None:
+            searcher.stop()
+
+    def set_deadline(self, deadline):
+        """探索中に締め切りを変える（先読みが当たったときなど）"""
+        self.deadline = deadline
+        searcher = self.searcher
+        if searcher is not None:
+            searcher.set_deadline(0.0 if deadline is None else deadline)
+
+    def check(self):
+        """1ノードごとに呼ぶ。上限を超えたらSearchAbortedを投げる"""
+        self.nodes += 1
+        if self.stopped:
+            raise SearchAborted
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise SearchAborted
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchAborted
+
+
 # --- 静止探索（quiescence search） ---
-def quiescence(board, alpha, beta, piece_value_dict, depth=0):
-    stand_pat = evaluate_board(board, piece_value_dict)
+def static_value(pos):
+    """手番側から見た静的評価値"""
+    value = pos.material
+    if pos.positional is not None:
+        value += pos.positional(pos)
+    return -value if pos.turn == shogi.WHITE else value
+
+
+DELTA_MARGIN = 200  # 駒を取っても stand pat + 取る駒の価値 + これ が α に届かなければ読まない
 
-    indent = "    " * depth
-    print(f"{indent}Q探索 深さ{depth}: 評価={stand_pat}, α={alpha}, β={beta}")
+
+def quiescence(pos, alpha, beta, ply=0, limits=None):
+    """手番側から見た評価値で駒取りの手だけを延長探索する
+
+    駒を取る手だけを生成してMVV-LVA順に並べ、取り合いで損をする手（SEE < 0）と
+    取っても α に届かない手（delta pruning）は指さずに捨てる。合法かどうかは
+    実際に読む手だけ確かめる。plyはルートからの手数（統計とトレース用）。
+    """
+    if limits is None:
+        limits = SearchLimits()
+    limits.check()
+    stats = limits.stats
+    stats.qnodes += 1
+    if ply > stats.seldepth:
+        stats.seldepth = ply
+
+    stand_pat = static_value(pos)
+
+    if limits.trace is not None and ply <= limits.trace_ply:
+        limits.trace(
+            {"type": "qnode", "ply": ply, "eval": stand_pat, "alpha": alpha, "beta": beta}
+        )
 
     # βカット
     if stand_pat >= beta:
@@ -63,13 +1568,34 @@ def quiescence(board, alpha, beta, piece_value_dict, depth=0):
         alpha = stand_pat
 
     # 駒取りの手のみ延長探索
-    for move in board.legal_moves:
-        if board.piece_at(move.to_square) is None:
+    board = pos.board
+    features = limits.features
+    see = "see" in features
+    delta = "delta" in features
+    scored = []
+    for move in pos.generate_captures():
+        captured = SEE_VALUES[board[move & 127] & 15]
+        # 取り返されても損しない手はSEEを計算しない
+        attacker = SEE_VALUES[board[(move >> 7) & 127] & 15]
+        if delta and not move & PROMOTION_FLAG and stand_pat + captured + DELTA_MARGIN <= alpha:
+            stats.delta_pruned += 1
+            continue
+        if see and captured < attacker and pos.see(move) < 0:
+            stats.see_pruned += 1
             continue
+        scored.append((captured * 64 - attacker // 64, move))
+    scored.sort(reverse=True)
 
-        board.push(move)
-        score = -quiescence(board, -beta, -alpha, piece_value_dict, depth + 1)
-        board.pop()
+    in_check = None
+    for _, move in scored:
+        if in_check is None:
+            in_check = pos.in_check()
+        if not pos.is_legal(move, in_check):
+            continue
+
+        pos.make(move)
+        score = -quiescence(pos, -beta, -alpha, ply + 1, limits)
+        pos.unmake()
 
         if score >= beta:
             return beta
@@ -79,96 +1605,1859 @@ def quiescence(board, alpha, beta, piece_value_dict, depth=0):
     return alpha
 
 
-# --- αβ探索（最良手付き） ---
-def explore_moves(
-    board, depth, alpha=-float("inf"), beta=float("inf"), maximizing=True, ply=0
+# --- 指し手の並べ替え ---
+MAX_PLY = 64
+ORDER_PV = 1 << 30  # 読み筋・置換表の手
+ORDER_CAPTURE = 1 << 28  # 駒取り（MVV-LVA）
+ORDER_KILLER = 1 << 27  # キラー手（2手まで）
+
+
+class MoveOrdering:
+    """キラー手・ヒストリーの表と、βカットの統計"""
+
+    def __init__(self):
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        # 手番(1bit) + 指し手(15bit) -> 評価
+        self.history = array("l", [0]) * (1 << 16)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        """キラー手は局面依存なので消し、ヒストリーは半減させて残す"""
+        for killer in self.killers:
+            killer[0] = killer[1] = 0
+        history = self.history
+        for i in range(len(history)):
+            if history[i]:
+                history[i] >>= 1
+
+    def order(self, pos, hash_move, pv_move=0, ply=0, moves=None):
+        """読み筋/置換表の手 > 駒取り(MVV-LVA) > キラー手 > ヒストリー の順に並べる
+
+        movesを省略すると合法手を並べる（疑似合法手を渡せば合法かどうかは呼ぶ側で確かめる）。
+        """
+        if moves is None:
+            moves = pos.legal_moves()
+        first = pv_move or hash_move
+        killer1, killer2 = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        history = self.history
+        color = pos.turn << 15
+        board = pos.board
+        scored = []
+        for move in moves:
+            captured = board[move & 127]
+            if move == first:
+                score = ORDER_PV
+            elif captured:
+                score = (
+                    ORDER_CAPTURE
+                    + PIECE_TYPE_VALUES[captured & 15] * 256
+                    - PIECE_TYPE_VALUES[board[(move >> 7) & 127] & 15]
+                )
+            elif move == killer1:
+                score = ORDER_KILLER + 1
+            elif move == killer2:
+                score = ORDER_KILLER
+            else:
+                score = history[color | move]
+            scored.append((score, move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def record_cutoff(self, pos, move, depth, ply, move_index):
+        """βカットを起こした手を記録（駒取り以外はキラー・ヒストリーに反映）"""
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+        if pos.board[move & 127]:
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        index = pos.turn << 15 | move
+        self.history[index] = min(self.history[index] + depth * depth, 1 << 24)
+
+    def stats(self):
+        return {
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": (
+                self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+            ),
+        }
+
+
+move_ordering = MoveOrdering()
+
+
+# --- αβ探索（negamax） ---
+NULL_MOVE_REDUCTION = 2  # null moveの探索は depth - 1 - これ
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3  # 何手目から減らすか（0始まり）
+LMR_DEEP_MOVES = 12  # これより後ろの手は2手減らす
+ASPIRATION_WINDOW = 50  # 前回の評価値 ± これで探索を始める（cp）
+ASPIRATION_MAX = 800  # 失敗して広げた幅がこれを超えたら窓を開け放つ
+MATE_VALUE = 1_000_000  # 詰み（指す手がない）・連続王手の千日手の評価値。手数の分だけ0に寄せる
+MATE_BOUND = MATE_VALUE - 1000  # 絶対値がこれ以上なら詰みの評価値
+
+
+def value_to_tt(value, ply):
+    """詰みの評価値を「この局面から何手」に直して置換表に入れる"""
+    if value >= MATE_BOUND:
+        return value + ply
+    if value <= -MATE_BOUND:
+        return value - ply
+    return value
+
+
+def value_from_tt(value, ply):
+    if value >= MATE_BOUND:
+        return value - ply
+    if value <= -MATE_BOUND:
+        return value + ply
+    return value
+
+
+def negamax(
+    pos,
+    depth,
+    alpha,
+    beta,
+    ply=0,
+    tt=None,
+    limits=None,
+    pv=None,
+    ordering=None,
+    null_ok=True,
 ):
-    indent = "    " * ply
-
-    # 評価辞書
-    piece_value_dict = {
-        "P": 1,
-        "L": 5,
-        "N": 5,
-        "S": 7,
-        "G": 8,
-        "B": 10,
-        "R": 12,
-        "+P": 2,
-        "+L": 6,
-        "+N": 6,
-        "+S": 9,
-        "+B": 15,
-        "+R": 18,
-        "p": -1,
-        "l": -5,
-        "n": -5,
-        "s": -7,
-        "g": -8,
-        "b": -10,
-        "r": -12,
-        "+p": -2,
-        "+l": -6,
-        "+n": -6,
-        "+s": -9,
-        "+b": -15,
-        "+r": -18,
-    }
+    """手番側から見た評価値で探索し (評価値, 最善手の整数) を返す
+
+    1手目以外はnull windowで調べてから必要なときだけ読み直す（PVS）。
+    王手でない非PVノードではnull moveで枝刈りし、後ろの方の静かな手（駒打ちを含む）は
+    浅く読んでからαを超えたときだけ元の深さで読み直す（LMR）。
+    使う工夫は limits.features で選ぶ。pvには前回の反復の読み筋を渡す。
+    """
+    if tt is None:
+        tt = transposition_table
+    if ordering is None:
+        ordering = move_ordering
+    if limits is None:
+        limits = SearchLimits()
+
+    if ply > 0:
+        # 千日手は探索中の手順と棋譜のキーの列だけで見る（合法手の有無は手のループで分かる）
+        repetition = pos.repetition()
+        if repetition is not None:
+            return repetition * (MATE_VALUE - ply), 0
+    if depth <= 0:
+        return quiescence(pos, alpha, beta, ply, limits), 0
+
+    limits.check()
+    stats = limits.stats
+    if ply > stats.seldepth:
+        stats.seldepth = ply
+    if limits.trace is not None and ply <= limits.trace_ply:
+        limits.trace(
+            {"type": "node", "ply": ply, "depth": depth, "alpha": alpha, "beta": beta}
+        )
+
+    # 置換表を引く
+    key = pos.key
+    entry = tt.probe(key)
+    stats.tt_probes += 1
+    hash_move = 0
+    if entry is not None:
+        stats.tt_hits += 1
+        tt_depth, tt_score, tt_bound, hash_move = entry
+        tt_score = value_from_tt(tt_score, ply)
+        if ply > 0 and tt_depth >= depth:
+            if (
+                tt_bound == EXACT
+                or (tt_bound == LOWER and tt_score >= beta)
+                or (tt_bound == UPPER and tt_score <= alpha)
+            ):
+                return tt_score, 0
+
+    features = limits.features
+    pv_node = beta - alpha > 1
+    in_check = pos.in_check()
+    pos.check_stack[pos.ply] = in_check
+
+    # null move: 手を渡しても β 以上なら、指せばもっと良いはずなので打ち切る
+    if (
+        null_ok
+        and not pv_node
+        and not in_check
+        and depth >= NULL_MOVE_MIN_DEPTH
+        and "null_move" in features
+        and static_value(pos) >= beta
+    ):
+        # 打ち切られたときは呼び出し元が rewind で戻すので、ここでは戻さない
+        pos.make_null()
+        value = -negamax(
+            pos,
+            depth - 1 - NULL_MOVE_REDUCTION,
+            -beta,
+            -beta + 1,
+            ply + 1,
+            tt,
+            limits,
+            None,
+            ordering,
+            False,
+        )[0]
+        pos.unmake_null()
+        if value >= beta:
+            stats.null_cutoffs += 1
+            return beta, 0
+
+    alpha_orig = alpha
+    best_value = -float("inf")
+    best_move = 0
+    pv_move = pv[0] if pv else 0
+    pvs = "pvs" in features
+    lmr = "lmr" in features and depth >= LMR_MIN_DEPTH and not in_check
+    board = pos.board
+
+    # 王手されていれば合法手（応手）を全部作り、そうでなければ疑似合法手を読む直前に確かめる
+    moves = pos.evasions() if in_check else pos.generate_moves()
+    i = 0  # 読んだ合法手の数
+    for move in ordering.order(pos, hash_move, pv_move, ply, moves):
+        if not in_check and not pos.is_legal(move, False):
+            continue
+        quiet = not board[move & 127] and not move & PROMOTION_FLAG
+        pos.make(move)
+        child_pv = pv[1:] if move == pv_move else None
+        if i == 0:
+            value = -negamax(
+                pos, depth - 1, -beta, -alpha, ply + 1, tt, limits, child_pv, ordering
+            )[0]
+        else:
+            # PVSなら null window、そうでなければ通常の窓で調べる
+            window = -alpha - 1 if pvs else -beta
+            reduction = 0
+            if lmr and quiet and i >= LMR_MIN_MOVES and not pos.in_check():
+                reduction = 1 if i < LMR_DEEP_MOVES else 2
+                stats.reductions += 1
+                value = -negamax(
+                    pos,
+                    depth - 1 - reduction,
+                    window,
+                    -alpha,
+                    ply + 1,
+                    tt,
+                    limits,
+                    child_pv,
+                    ordering,
+                )[0]
+            if not reduction or value > alpha:
+                value = -negamax(
+                    pos, depth - 1, window, -alpha, ply + 1, tt, limits, child_pv, ordering
+                )[0]
+                if pvs and alpha < value < beta:
+                    stats.researches += 1
+                    value = -negamax(
+                        pos, depth - 1, -beta, -alpha, ply + 1, tt, limits, child_pv, ordering
+                    )[0]
+        pos.unmake()
+
+        if value > best_value:
+            best_value = value
+            best_move = move
+            if value > alpha:
+                alpha = value
+                if alpha >= beta:
+                    ordering.record_cutoff(pos, move, depth, ply, i)
+                    stats.cutoffs[min(i, CUTOFF_BUCKETS - 1)] += 1
+                    break
+        i += 1
+
+    if not best_move:
+        # 指せる手がない（将棋では詰みと同じく負け）
+        best_value = -(MATE_VALUE - ply)
+
+    # 置換表に保存（窓の外なら上限/下限として）
+    if best_value <= alpha_orig:
+        bound = UPPER
+    elif best_value >= beta:
+        bound = LOWER
+    else:
+        bound = EXACT
+    tt.store(key, depth, value_to_tt(best_value, ply), bound, best_move)
+
+    return best_value, best_move
 
-    if depth == 0 or board.is_game_over():
-        value = quiescence(board, alpha, beta, piece_value_dict)
-        return value, None
 
-    best_move = None
+def explore_moves(
+    pos,
+    depth,
+    alpha=-float("inf"),
+    beta=float("inf"),
+    maximizing=True,
+    ply=0,
+    tt=None,
+    limits=None,
+    pv=None,
+    ordering=None,
+):
+    """negamaxを先手から見た評価値で呼ぶ。(先手から見た評価値, 最善手の整数) を返す
 
+    maximizingは先手番か（posの手番と一致させる）。
+    """
     if maximizing:
-        value = -float("inf")
-        for move in board.legal_moves:
-            board.push(move)
-            child_value, _ = explore_moves(
-                board, depth - 1, alpha, beta, False, ply + 1
+        return negamax(pos, depth, alpha, beta, ply, tt, limits, pv, ordering)
+    value, move = negamax(pos, depth, -beta, -alpha, ply, tt, limits, pv, ordering)
+    return -value, move
+
+
+def aspiration_search(pos, depth, previous, tt, limits, pv, ordering):
+    """前回の評価値の周りの狭い窓で探索し、外れたら外れた側を広げて読み直す"""
+    if previous is None or depth < 2 or "aspiration" not in limits.features:
+        return negamax(pos, depth, -float("inf"), float("inf"), 0, tt, limits, pv, ordering)
+    delta = ASPIRATION_WINDOW
+    alpha, beta = previous - delta, previous + delta
+    while True:
+        value, move = negamax(pos, depth, alpha, beta, 0, tt, limits, pv, ordering)
+        if alpha < value < beta:
+            return value, move
+        limits.stats.researches += 1
+        delta *= 4
+        if value <= alpha:
+            alpha = previous - delta if delta <= ASPIRATION_MAX else -float("inf")
+        else:
+            beta = previous + delta if delta <= ASPIRATION_MAX else float("inf")
+
+
+# --- 置換表から読み筋を取り出す ---
+def extract_pv(pos, first_move, tt, max_length):
+    pv = [first_move]
+    pos.make(first_move)
+    seen = {pos.key}
+    while len(pv) < max_length:
+        entry = tt.probe(pos.key)
+        if entry is None or entry[3] not in pos.legal_moves():
+            break
+        pos.make(entry[3])
+        if pos.key in seen:  # 千日手ループ
+            pos.unmake()
+            break
+        seen.add(pos.key)
+        pv.append(entry[3])
+    for _ in pv:
+        pos.unmake()
+    return pv
+
+
+# --- 持ち時間の配分 ---
+def allocate_time(
+    remaining_ms, byoyomi_ms=0, increment_ms=0, moves_to_go=30, margin_ms=100
+):
+    """残り時間・秒読み・加算から今回の思考時間(ms)を決める"""
+    budget = remaining_ms / moves_to_go + increment_ms + byoyomi_ms
+    # 残り時間＋秒読みを超えない（通信・描画の余裕を残す）
+    upper = remaining_ms + byoyomi_ms - margin_ms
+    return max(1, int(min(budget, upper)))
+
+
+# --- Cython版の探索部（myai_core） ---
+# setup.py で MyAI.pyx を拡張モジュール myai_core としてビルドしてあれば、駒得だけの評価での探索は
+# そちらで行う（探索中はGILを離すので、UIなど他のスレッドが止まらない）。
+# なければこのファイルの探索を使う。環境変数 MYAI_BACKEND=python でPython版に固定できる。
+try:
+    if os.environ.get("MYAI_BACKEND") == "python":
+        raise ImportError
+    import myai_core
+except ImportError:
+    myai_core = None
+
+if myai_core is not None:
+    myai_core.init_tables(
+        {
+            "STEP_TARGETS": STEP_TARGETS,
+            "RAY_TARGETS": RAY_TARGETS,
+            "STEP_ATTACKERS": STEP_ATTACKERS,
+            "SLIDER_ATTACKERS": SLIDER_ATTACKERS,
+            "ALIGNED": ALIGNED,
+            "PROMOTION_ZONE": PROMOTION_ZONE,
+            "DEAD_SQUARE": DEAD_SQUARE,
+            "CAN_PROMOTE": CAN_PROMOTE,
+            "PROMOTED_CODE": PROMOTED_CODE,
+            "UNPROMOTED_CODE": UNPROMOTED_CODE,
+            "ZOBRIST_PIECE": ZOBRIST_PIECE,
+            "ZOBRIST_HAND": ZOBRIST_HAND,
+            "ZOBRIST_SIDE": ZOBRIST_SIDE,
+            "PIECE_TYPE_VALUES": PIECE_TYPE_VALUES,
+            "SEE_VALUES": SEE_VALUES,
+            "MATE_VALUE": MATE_VALUE,
+            "MATE_BOUND": MATE_BOUND,
+        }
+    )
+BACKENDS = ("python", "cython") if myai_core is not None else ("python",)
+BACKEND = BACKENDS[-1]  # 既定の探索部（set_backend で変える）
+core_searcher = None  # Cython版の既定の Searcher（置換表など。最初の探索で作る）
+core_hash_mb = 16
+
+
+def backend():
+    """今使っている探索部（"cython" か "python"）"""
+    return BACKEND
+
+
+def set_backend(name):
+    global BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"使えない探索部です: {name}")
+    BACKEND = name
+
+
+def resize_hash(size_mb):
+    """置換表の大きさを変える（Python版・Cython版の両方）"""
+    global core_searcher, core_hash_mb
+    transposition_table.resize(size_mb)
+    core_hash_mb = size_mb
+    core_searcher = None
+
+
+def get_core_searcher():
+    global core_searcher
+    if core_searcher is None:
+        core_searcher = myai_core.Searcher(core_hash_mb)
+    return core_searcher
+
+
+def core_set_position(searcher, pos):
+    searcher.set_values(pos.board_values, pos.hand_values)
+    searcher.set_position(
+        pos.board,
+        pos.hands,
+        pos.turn,
+        pos.king_squares,
+        pos.key,
+        pos.material,
+        pos.key_stack[: pos.ply],
+        pos.check_stack[: pos.ply],
+    )
+
+
+def core_aspiration_search(searcher, depth, previous, limits, pv, features):
+    """aspiration_search と同じ窓の広げ方で Searcher.search を呼ぶ。打ち切られたらSearchAborted"""
+    deadline = 0.0 if limits.deadline is None else limits.deadline
+    max_nodes = limits.max_nodes or 0
+    inf = myai_core.INF
+    if previous is None or depth < 2 or "aspiration" not in limits.features:
+        alpha, beta = -inf, inf
+    else:
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previous - delta, previous + delta
+    while True:
+        result = searcher.search(depth, alpha, beta, features, deadline, max_nodes, pv)
+        if result is None or limits.stopped:
+            raise SearchAborted
+        value, move = result
+        if alpha < value < beta or (alpha == -inf and beta == inf):
+            return value, move
+        limits.stats.researches += 1
+        delta *= 4
+        if value <= alpha:
+            alpha = previous - delta if delta <= ASPIRATION_MAX else -inf
+        else:
+            beta = previous + delta if delta <= ASPIRATION_MAX else inf
+
+
+def core_iterative_deepening(pos, first_depth, max_depth, on_iteration, limits, searcher, result):
+    """iterative_deepening のCython版。締め切り・ノード数は limits に設定済みのものを使う
+
+    resultは (先手から見た評価値, 最善手, 読み筋, 深さ) の初期値で、同じ形で返す。
+    """
+    if searcher is None:
+        searcher = get_core_searcher()
+    start = time.perf_counter()
+    stats = limits.stats
+    sign = 1 if pos.turn == shogi.BLACK else -1
+    features = sum(1 << i for i, name in enumerate(SEARCH_FEATURES) if name in limits.features)
+    core_set_position(searcher, pos)
+    searcher.new_search()
+    limits.searcher = searcher
+    if limits.stopped:
+        searcher.stop()
+
+    pv = result[2]
+    previous = None if not result[1] else sign * result[0]
+    try:
+        for depth in range(first_depth, max_depth + 1):
+            try:
+                previous, best_move = core_aspiration_search(
+                    searcher, depth, previous, limits, pv, features
+                )
+            except SearchAborted:
+                break
+            if not best_move:  # 指せる手がない
+                break
+            value = sign * previous
+            pv = searcher.pv(best_move, depth)
+            result = (value, best_move, pv, depth)
+            elapsed = time.perf_counter() - start
+            nodes = searcher.stats()["nodes"]
+            stats.iterations.append(
+                {"depth": depth, "value": value, "nodes": nodes, "ms": int(elapsed * 1000)}
             )
-            board.pop()
+            if on_iteration is not None:
+                on_iteration(
+                    depth, value, [decode_move(m) for m in pv], nodes, int(elapsed * 1000)
+                )
+            if limits.deadline is not None and start + 2 * elapsed > limits.deadline:
+                break
+    finally:
+        limits.searcher = None
+
+    # aspirationの読み直しはPython側で数えている
+    researches = stats.researches
+    for name, count in searcher.stats().items():
+        setattr(stats, name, count)
+    stats.researches += researches
+    limits.nodes = stats.nodes
+    return result
+
+
+# --- 反復深化 ---
+def iterative_deepening(
+    board,
+    max_depth,
+    time_limit_ms=None,
+    node_limit=None,
+    tt=None,
+    on_iteration=None,
+    ordering=None,
+    evaluator=None,
+    limits=None,
+    trace=None,
+    trace_ply=None,
+    features=None,
+    backend=None,
+    searcher=None,
+    cache=None,
+):
+    """深さ1,2,3...と探索し、最後に完了した反復の (評価値, 最善手, 読み筋, 深さ, 統計) を返す
+
+    boardはshogi.Board、最善手・読み筋はshogi.Moveで、統計はSearchStatsで返す。
+    time_limit_ms / node_limit に達したら途中の反復は捨てる。
+    on_iteration(depth, value, pv, nodes, elapsed_ms) は反復ごとに呼ばれる。
+    limitsを渡すと、探索中に別スレッドから止めたり締め切りを変えたりできる。
+    trace / trace_ply / features は SearchLimits と同じ。評価値は先手から見た値。
+    backend（省略時 BACKEND）が "cython" で、評価が駒得だけ・traceなしなら
+    Cython版で探索する。そのとき tt / ordering の代わりに searcher（省略時は既定のもの）を使う。
+    cache（省略時は open_analysis_cache で開いたもの、Falseで使わない）に同じ局面があれば
+    その深さの次から読み、max_depth まで読んであれば探索しない。読み終えた結果は書き込む。
+    """
+    start = time.perf_counter()
+    if limits is None:
+        limits = SearchLimits()
+    if trace is not None:
+        limits.trace = trace
+        limits.trace_ply = MAX_PLY if trace_ply is None else trace_ply
+    if features is not None:
+        limits.features = frozenset(features)
+    stats = limits.stats
+    if time_limit_ms is not None:
+        limits.deadline = start + time_limit_ms / 1000
+    if node_limit is not None:
+        limits.max_nodes = node_limit
+    pos = Position.from_board(board, evaluator)
+    sign = 1 if pos.turn == shogi.BLACK else -1
+    root_ply = pos.ply
+
+    if cache is None:
+        cache = analysis_cache
+    if pos.positional is not None:
+        cache = None  # 位置の評価は表によって変わるので残さない
+    result = (None, 0, [], 0)
+    seed = cache.lookup(pos) if cache else None
+    if seed is not None:
+        depth, previous, pv = seed
+        stats.cache_depth = depth
+        result = (sign * previous, pv[0], pv, depth)
+        if on_iteration is not None:
+            on_iteration(depth, sign * previous, [decode_move(m) for m in pv], 0, 0)
+
+    use_core = (backend or BACKEND) == "cython" and limits.trace is None and pos.positional is None
+    if result[3] >= max_depth:
+        pass  # キャッシュで足りた
+    elif use_core:
+        result = core_iterative_deepening(
+            pos, result[3] + 1, max_depth, on_iteration, limits, searcher, result
+        )
+    else:
+        if tt is None:
+            tt = transposition_table
+        if ordering is None:
+            ordering = move_ordering
+        tt.new_search()
+        ordering.new_search()
+        pv = result[2] or None
+        previous = None if not result[1] else sign * result[0]  # 手番側から見た評価値
+        for depth in range(result[3] + 1, max_depth + 1):
+            try:
+                previous, best_move = aspiration_search(
+                    pos, depth, previous, tt, limits, pv, ordering
+                )
+            except SearchAborted:
+                # 途中で打ち切った局面を元に戻す
+                pos.rewind(root_ply)
+                break
+            if not best_move:  # 指せる手がない
+                break
 
-            if child_value > value:
-                value = child_value
-                best_move = move
+            value = sign * previous
+            pv = extract_pv(pos, best_move, tt, depth)
+            result = (value, best_move, pv, depth)
+            elapsed = time.perf_counter() - start
+            stats.nodes = limits.nodes
+            stats.iterations.append(
+                {"depth": depth, "value": value, "nodes": limits.nodes, "ms": int(elapsed * 1000)}
+            )
+            if on_iteration is not None:
+                on_iteration(
+                    depth, value, [decode_move(m) for m in pv], limits.nodes, int(elapsed * 1000)
+                )
 
-            alpha = max(alpha, value)
-            if beta <= alpha:
+            # 次の反復は今回より長くかかるので、残りが少なければ始めない
+            if limits.deadline is not None and start + 2 * elapsed > limits.deadline:
                 break
+        stats.nodes = limits.nodes
 
-        return value, best_move
+    if cache and result[3] > stats.cache_depth:
+        cache.store_pv(pos, result[3], sign * result[0], result[2])
+    if not result[1]:
+        # 深さ1すら終わらなかった場合は合法手の先頭を返す
+        moves = pos.legal_moves()
+        if moves:
+            result = (None, moves[0], [moves[0]], 0)
+    value, best_move, pv, depth = result
+    return (
+        value,
+        decode_move(best_move) if best_move else None,
+        [decode_move(m) for m in pv],
+        depth,
+        stats,
+    )
+
+
+def get_best_move(
+    board,
+    depth,
+    tt=None,
+    time_limit_ms=None,
+    node_limit=None,
+    workers=1,
+    with_stats=False,
+    book="weighted",
+    mate_nodes=None,
+    features=None,
+    limits=None,
+    on_iteration=None,
+):
+    """time_limit_ms / node_limit を指定するとdepthを上限に反復深化する
+
+    定跡（book.bin）にある局面なら探索せずに定跡手を返す。
+    bookは "weighted"（出現数に比例して選ぶ）/ "best"（最多の手）/ None（使わない）。
+    相手玉に逃げ道が少なければ、探索の前にmate_nodes（省略時DFPN_QUICK_NODES、0で無効）
+    ノードまでdf-pnで詰みを探す。詰み探索は持ち時間・node_limitの1/10まで（時間の指定が
+    なければDFPN_QUICK_MSまで）で、使った分は探索の持ち時間・ノード数から引く。
+    limitsのstop()・締め切りは詰み探索も止める。
+    workers > 1 ならルートの手をプロセスプールに分けて探索する。
+    with_stats=True なら (最善手, SearchStats) を返す。
+    features / limits / on_iteration は iterative_deepening と同じ（逐次探索のみ）。
+    """
+    if book is not None:
+        move = book_move(board, book)
+        if move is not None:
+            if with_stats:
+                stats = SearchStats()
+                stats.book = True
+                return move, stats
+            return move
+    if mate_nodes is None:
+        mate_nodes = DFPN_QUICK_NODES
+    if mate_nodes:
+        # 相手玉が狭ければ先に詰みを探す
+        pos = Position.from_board(board)
+        if suspect_mate(pos):
+            start = time.perf_counter()
+            mate_ms = DFPN_QUICK_MS if time_limit_ms is None else max(1, time_limit_ms // 10)
+            if node_limit is not None:
+                mate_nodes = min(mate_nodes, max(1, node_limit // 10))
+            mate, moves, nodes = solve_mate(pos, mate_nodes, mate_ms, limits=limits)
+            if mate and moves:
+                if with_stats:
+                    stats = SearchStats()
+                    stats.nodes = nodes
+                    stats.mate = len(moves)
+                    return moves[0], stats
+                return moves[0]
+            if time_limit_ms is not None:
+                time_limit_ms = max(1, time_limit_ms - int((time.perf_counter() - start) * 1000))
+            if node_limit is not None:
+                node_limit = max(1, node_limit - nodes)
+    if workers > 1:
+        result = parallel_search(board, depth, workers, time_limit_ms, node_limit)
     else:
-        value = float("inf")
-        for move in board.legal_moves:
-            board.push(move)
-            child_value, _ = explore_moves(board, depth - 1, alpha, beta, True, ply + 1)
-            board.pop()
-
-            if child_value < value:
-                value = child_value
-                best_move = move
-
-            beta = min(beta, value)
-            if beta <= alpha:
+        result = iterative_deepening(
+            board,
+            depth,
+            time_limit_ms,
+            node_limit,
+            tt,
+            on_iteration=on_iteration,
+            limits=limits,
+            features=features,
+        )
+    if with_stats:
+        return result[1], result[4]
+    return result[1]
+
+
+# --- 詰み探索（df-pn） ---
+# 攻め方は王手だけ、玉方はすべての応手を読む証明数探索。
+# 値は手番側から見た (phi, delta)（手番側が勝つことの証明数・反証数）で持ち、
+# 攻め方の手番なら phi = 詰みの証明数、玉方の手番なら phi = 逃れの証明数になる。
+DFPN_INF = 1 << 30
+DFPN_MAX_DEPTH = 200  # これより長い手順は詰まないものとして扱う
+DFPN_NODES = 1_000_000
+DFPN_QUICK_NODES = 5_000  # get_best_move で探索の前に読むノード数
+DFPN_QUICK_MS = 100  # その時間の上限（持ち時間の指定がないとき）
+
+
+class MateLimits(SearchLimits):
+    """詰み探索の上限。parent（探索全体のlimits）のstop()と締め切りでも止まる"""
+
+    def __init__(self, deadline=None, max_nodes=None, parent=None):
+        super().__init__(deadline, max_nodes)
+        self.parent = parent
+
+    def check(self):
+        SearchLimits.check(self)
+        parent = self.parent
+        if parent is not None and (
+            parent.stopped
+            or parent.deadline is not None
+            and time.perf_counter() >= parent.deadline
+        ):
+            raise SearchAborted
+
+
+class DfpnTable:
+    """局面キー -> (phi, delta) の表。max_entries を超えたら未解決の局面から捨てる"""
+
+    def __init__(self, max_entries=1 << 18):
+        self.max_entries = max_entries
+        self.entries = {}
+
+    def clear(self):
+        self.entries.clear()
+
+    def get(self, key):
+        return self.entries.get(key, (1, 1))
+
+    def put(self, key, phi, delta):
+        entries = self.entries
+        if len(entries) >= self.max_entries and key not in entries:
+            # 詰み・不詰みが決まった局面は残す
+            solved = {k: v for k, v in entries.items() if v[0] == 0 or v[1] == 0}
+            self.entries = entries = solved if len(solved) < self.max_entries // 2 else {}
+        entries[key] = (phi, delta)
+
+
+def _dfpn_children(pos, or_node):
+    """[(手, 子局面のキー)]。攻め方は王手になる手だけ"""
+    children = []
+    for move in pos.check_moves() if or_node else pos.legal_moves():
+        pos.make(move)
+        children.append((move, pos.key))
+        pos.unmake()
+    return children
+
+
+def _dfpn_mid(pos, th_phi, th_delta, attacker, table, path, limits):
+    limits.check()
+    key = pos.key
+    or_node = pos.turn == attacker
+    children = _dfpn_children(pos, or_node)
+    if not children:
+        table.put(key, DFPN_INF, 0)  # 手がない側の負け
+        return
+    if len(path) >= DFPN_MAX_DEPTH:
+        # 長すぎる手順は攻め方の負けとする
+        table.put(key, *((DFPN_INF, 0) if or_node else (0, DFPN_INF)))
+        return
+    # 同一局面に戻る手は攻め方の失敗（千日手・連続王手の千日手）
+    repeated = (0, DFPN_INF) if or_node else (DFPN_INF, 0)
+
+    path.add(key)
+    while True:
+        phi, delta = DFPN_INF, 0
+        delta2 = DFPN_INF
+        best = None
+        for move, child_key in children:
+            if child_key in path:
+                child_phi, child_delta = repeated
+            else:
+                child_phi, child_delta = table.get(child_key)
+            delta += child_phi
+            if child_delta < phi:
+                delta2 = phi
+                phi = child_delta
+                best = move
+                best_phi = child_phi
+            elif child_delta < delta2:
+                delta2 = child_delta
+        delta = min(delta, DFPN_INF)
+        if phi >= th_phi or delta >= th_delta:
+            break
+        pos.make(best)
+        _dfpn_mid(
+            pos,
+            min(th_delta - delta + best_phi, DFPN_INF),
+            min(th_phi, delta2 + 1),
+            attacker,
+            table,
+            path,
+            limits,
+        )
+        pos.unmake()
+    path.discard(key)
+    table.put(key, phi, delta)
+
+
+def dfpn(pos, limits=None, table=None):
+    """手番側がposで玉を詰ませられるか。True / False / None（上限に達した）"""
+    if limits is None:
+        limits = SearchLimits()
+    if table is None:
+        table = DfpnTable()
+    root_ply = pos.ply
+    try:
+        _dfpn_mid(pos, DFPN_INF, DFPN_INF, pos.turn, table, set(), limits)
+    except SearchAborted:
+        pos.rewind(root_ply)
+        return None
+    phi, delta = table.get(pos.key)
+    if phi == 0:
+        return True
+    if delta == 0:
+        return False
+    return None
+
+
+def mate_sequence(pos, table):
+    """証明済みの表をたどって詰み手順（整数の手のリスト）を取り出す。たどれなければNone"""
+    attacker = pos.turn
+    moves = []
+    path = set()
+    while len(moves) < DFPN_MAX_DEPTH and pos.key not in path:
+        path.add(pos.key)
+        or_node = pos.turn == attacker
+        children = _dfpn_children(pos, or_node)
+        if not children:
+            break
+        if or_node:
+            # 玉方が負けと証明された子局面
+            proven = [move for move, key in children if table.get(key)[1] == 0]
+        else:
+            # 攻め方の勝ちと証明された子局面（すべてのはず）
+            proven = [move for move, key in children if table.get(key)[0] == 0]
+            if len(proven) < len(children):
+                proven = []
+        if not proven:
+            break
+        pos.make(proven[0])
+        moves.append(proven[0])
+    mated = pos.turn != attacker and not pos.has_legal_move()
+    for _ in moves:
+        pos.unmake()
+    return moves if mated else None
+
+
+def suspect_mate(pos):
+    """王手がかけられて、相手玉の逃げ道が3マス以下なら詰みを疑う"""
+    us = pos.turn
+    king = pos.king_squares[us ^ 1]
+    if king < 0:
+        return False
+    own = OWN_PIECE[us ^ 1]
+    flights = 0
+    for square in STEP_TARGETS[shogi.KING | (us ^ 1) << 4][king]:
+        if not own[pos.board[square]] and not pos.is_attacked(square, us):
+            flights += 1
+    return flights <= 3 and bool(pos.check_moves())
+
+
+def solve_mate(position, max_nodes=DFPN_NODES, time_limit_ms=None, table=None, limits=None):
+    """shogi.Board / SFEN / Position の手番側の詰みを探す
+
+    (詰み True / 不詰み False / 不明 None, 詰み手順の shogi.Move のリスト, ノード数) を返す。
+    limits（SearchLimits）を渡すと、そのstop()・締め切りでも打ち切る。
+    """
+    if isinstance(position, str):
+        pos = Position.from_sfen(position)
+    elif isinstance(position, Position):
+        pos = position
+    else:
+        pos = Position.from_board(position)
+    deadline = None
+    if time_limit_ms is not None:
+        deadline = time.perf_counter() + time_limit_ms / 1000
+    mate_limits = MateLimits(deadline, max_nodes, limits)
+    if table is None:
+        table = DfpnTable()
+    mate = dfpn(pos, mate_limits, table)
+    moves = mate_sequence(pos, table) if mate else None
+    return mate, [decode_move(m) for m in moves or []], mate_limits.nodes
+
+
+# --- 棋譜の読み込み ---
+RECORD_EXTENSIONS = (".kif", ".kifu", ".csa")
+
+
+def iter_records(paths):
+    """KIF/CSAファイル（ディレクトリなら中の全ファイル）の棋譜を (ファイル名, 棋譜) で順に返す
+
+    棋譜はpython-shogiのパーサーの形式（sfen, moves, win, names）。
+    読めないファイルは標準エラーに出して飛ばす。
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        if os.path.isdir(path):
+            files = []
+            for root, _, names in os.walk(path):
+                files += [
+                    os.path.join(root, name)
+                    for name in names
+                    if name.lower().endswith(RECORD_EXTENSIONS)
+                ]
+            files.sort()
+        else:
+            files = [path]
+        for file in files:
+            try:
+                if file.lower().endswith(".csa"):
+                    records = shogi.CSA.Parser.parse_file(file)
+                else:
+                    records = shogi.KIF.Parser.parse_file(file)
+            except Exception as e:
+                records = None
+                print(f"{file}: {e}", file=sys.stderr)
+            if not records:
+                print(f"{file}: 棋譜を読めませんでした", file=sys.stderr)
+                continue
+            for record in records:
+                yield file, record
+
+
+# --- 定跡 ---
+# 棋譜から (局面キー, 指し手) ごとの出現数・勝ち数を集計し、キー順に並べた固定長レコードで保存する。
+# 読み込み時には展開せず、mmapの上で二分探索する。
+BOOK_MAGIC = b"MYAIBOOK"
+BOOK_VERSION = 1
+BOOK_HEADER = struct.Struct("<8sII")  # マジック, 版, 件数
+BOOK_ENTRY = struct.Struct("<QIII")  # 局面キー, 指し手, 出現数, 手番側の勝ち数
+BOOK_KEY = struct.Struct("<Q")
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+BOOK_MAX_PLY = 30
+
+
+def build_book(paths, max_ply=BOOK_MAX_PLY, min_count=1):
+    """棋譜をmax_ply手目まで並べて集計し、(棋譜数, [(キー, 指し手, 出現数, 勝ち数)]) を返す"""
+    counts = {}
+    games = 0
+    for file, record in iter_records(paths):
+        pos = Position.from_sfen(record["sfen"])
+        winner = {"b": shogi.BLACK, "w": shogi.WHITE}.get(record.get("win"))
+        for usi in record["moves"][:max_ply]:
+            move = encode_move(shogi.Move.from_usi(usi))
+            if not pos.is_legal_move(move):
+                print(f"{file}: {pos.ply + 1}手目 {usi} は指せません", file=sys.stderr)
+                break
+            entry = counts.setdefault((pos.key, move), [0, 0])
+            entry[0] += 1
+            if pos.turn == winner:
+                entry[1] += 1
+            pos.make(move)
+        games += 1
+    entries = [
+        (key, move, count, wins)
+        for (key, move), (count, wins) in counts.items()
+        if count >= min_count
+    ]
+    return games, entries
+
+
+def write_book(path, entries):
+    """キー順・出現数の多い順に並べて書く（一時ファイルに書いてから置き換える）"""
+    entries = sorted(entries, key=lambda e: (e[0], -e[2], -e[3], e[1]))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, len(entries)))
+        for entry in entries:
+            f.write(BOOK_ENTRY.pack(*entry))
+    os.replace(tmp, path)
+
+
+class OpeningBook:
+    """write_bookで書いた定跡ファイルをmmapで引く"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size = BOOK_HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            self.data.close()
+            raise ValueError(f"定跡ファイルではありません: {path}")
+
+    def close(self):
+        self.data.close()
+
+    def probe(self, key):
+        """局面キーの [(指し手, 出現数, 勝ち数)] を出現数の多い順に返す"""
+        data = self.data
+        base = BOOK_HEADER.size
+        width = BOOK_ENTRY.size
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if BOOK_KEY.unpack_from(data, base + mid * width)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        while lo < self.size:
+            entry_key, move, count, wins = BOOK_ENTRY.unpack_from(data, base + lo * width)
+            if entry_key != key:
                 break
+            result.append((move, count, wins))
+            lo += 1
+        return result
+
+    def choose(self, pos, mode="weighted", rng=random):
+        """Positionの定跡手（整数）を選ぶ。なければ0
+
+        "weighted" は出現数に比例して選び、"best" は出現数（同数なら勝ち数）が最多の手。
+        """
+        entries = self.probe(pos.key)
+        if not entries:
+            return 0
+        # キーの衝突や壊れたファイルに備えて合法手だけ残す
+        legal = set(pos.legal_moves())
+        entries = [e for e in entries if e[0] in legal]
+        if not entries:
+            return 0
+        if mode == "best":
+            return entries[0][0]
+        return rng.choices([e[0] for e in entries], weights=[e[1] for e in entries])[0]
+
+
+opening_book = None
+_book_loaded = False
+
+
+def load_book(path=None):
+    """定跡ファイルを開き直す。ファイルがなければ定跡なし"""
+    global opening_book, _book_loaded
+    if opening_book is not None:
+        opening_book.close()
+    path = BOOK_PATH if path is None else path
+    opening_book = OpeningBook(path) if os.path.exists(path) else None
+    _book_loaded = True
+    return opening_book
+
+
+def book_move(board, mode="weighted"):
+    """shogi.Boardの局面の定跡手をshogi.Moveで返す。定跡になければNone"""
+    if not _book_loaded:
+        load_book()
+    if opening_book is None:
+        return None
+    move = opening_book.choose(Position.from_board(board), mode)
+    return decode_move(move) if move else None
+
+
+# --- 複数プロセスでのルート分割探索 ---
+# プールは手をまたいで使い回す（各ワーカーの置換表・ヒストリーも温まったまま）
+_pool = None
+_pool_workers = 0
+_shared_bound = None  # ルートでこれまでに見つかった最善値（全ワーカーで共有）
+_shared_nodes = None  # この反復で全ワーカーが使ったノード数の合計
+_worker_search_id = None
+SHARED_NODES_FLUSH = 256  # この数のノードごとに共有のノード数へ足し込む
+
+
+def _init_worker(shared_bound, shared_nodes):
+    global _shared_bound, _shared_nodes
+    _shared_bound = shared_bound
+    _shared_nodes = shared_nodes
+
+
+class SharedNodeLimits(SearchLimits):
+    """ワーカー用の上限。max_nodesは全ワーカーの合計（_shared_nodes）に対して効く"""
+
+    def __init__(self, deadline=None, max_nodes=None):
+        super().__init__(deadline, max_nodes)
+        self.flushed = 0  # 共有のノード数へ足し込み済みの数
+
+    def flush(self):
+        with _shared_nodes.get_lock():
+            _shared_nodes.value += self.nodes - self.flushed
+            total = _shared_nodes.value
+        self.flushed = self.nodes
+        return total
+
+    def check(self):
+        SearchLimits.check(self)
+        if self.max_nodes is not None and self.nodes - self.flushed >= SHARED_NODES_FLUSH:
+            if self.flush() > self.max_nodes:
+                raise SearchAborted
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers, _shared_bound, _shared_nodes
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _shared_bound = multiprocessing.Value("d", 0.0)
+        _shared_nodes = multiprocessing.Value("q", 0)
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(_shared_bound, _shared_nodes),
+        )
+        _pool_workers = workers
+        # 全ワーカーを起動しておく
+        for future in [_pool.submit(time.sleep, 0.05) for _ in range(workers)]:
+            future.result()
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+    _pool = None
+    _pool_workers = 0
+
+
+def _search_root_move(
+    search_id, sfen, usi_moves, move, depth, maximizing, deadline, node_limit
+):
+    """ワーカー: ルートで move を指した局面を深さ depth - 1 で探索する
+
+    共有の最善値を窓の端に使うので、最善を更新しない手はすぐに打ち切られる。
+    node_limitはこの反復の全ワーカー合計の上限（_shared_nodesで数える）。
+    (手, 評価値, 統計, 読み筋) を返し、打ち切られた場合の評価値はNone。
+    """
+    global _worker_search_id
+    if search_id != _worker_search_id:
+        _worker_search_id = search_id
+        transposition_table.new_search()
+        move_ordering.new_search()
+
+    pos = Position.from_usi(sfen, usi_moves)
+    if deadline is not None:
+        deadline = time.perf_counter() + (deadline - time.time())
+    limits = SharedNodeLimits(deadline, node_limit)
+    if node_limit is not None and _shared_nodes.value >= node_limit:
+        return move, None, limits.stats, []  # 他のワーカーが使い切った
+    bound = _shared_bound.value
+    alpha, beta = (bound, float("inf")) if maximizing else (-float("inf"), bound)
+
+    root_ply = pos.ply
+    pos.make(move)
+    try:
+        value, child_move = explore_moves(
+            pos, depth - 1, alpha, beta, not maximizing, 1, limits=limits
+        )
+    except SearchAborted:
+        pos.rewind(root_ply)
+        limits.flush()
+        limits.stats.nodes = limits.nodes
+        return move, None, limits.stats, []
+    pv = [move]
+    if child_move:
+        pv += extract_pv(pos, child_move, transposition_table, depth - 1)
+
+    with _shared_bound.get_lock():
+        if (value > _shared_bound.value) if maximizing else (value < _shared_bound.value):
+            _shared_bound.value = value
+    limits.flush()
+    limits.stats.nodes = limits.nodes
+    return move, value, limits.stats, pv
+
+
+def parallel_search(
+    board, max_depth, workers, time_limit_ms=None, node_limit=None, on_iteration=None
+):
+    """ルート分割の並列反復深化。戻り値は iterative_deepening と同じ
+
+    各反復ではまず読み筋の手を1手だけ探索して最善値を作り、
+    残りの手をワーカーに分配する。局面はSFEN＋指し手で渡す。
+    node_limitは全ワーカーの合計で数える。
+    """
+    pool = _get_pool(workers)
+    sfen, usi_moves = board_to_usi_position(board)
+    pos = Position.from_usi(sfen, usi_moves)
+    maximizing = pos.turn == shogi.BLACK
+    root_moves = move_ordering.order(pos, 0)
+    stats = SearchStats()
+    if not root_moves:
+        return None, None, [], 0, stats
+
+    start = time.perf_counter()
+    deadline = None if time_limit_ms is None else time.time() + time_limit_ms / 1000
+    search_id = (id(board), start)
+    result = (None, root_moves[0], [root_moves[0]], 0)
+
+    for depth in range(1, max_depth + 1):
+        _shared_bound.value = -float("inf") if maximizing else float("inf")
+        _shared_nodes.value = 0
+        args = (search_id, sfen, usi_moves)
+        remaining = None if node_limit is None else max(1, node_limit - stats.nodes)
+
+        # 1手目を単独で探索して窓を作り、残りを並列に
+        first = pool.submit(
+            _search_root_move,
+            *args, root_moves[0], depth, maximizing, deadline, remaining
+        )
+        scored = [first.result()]
+        if scored[0][1] is not None:
+            futures = {
+                pool.submit(
+                    _search_root_move,
+                    *args, move, depth, maximizing, deadline, remaining
+                )
+                for move in root_moves[1:]
+            }
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                scored += [future.result() for future in done]
+        for s in scored:
+            stats.merge(s[2])
+        if any(s[1] is None for s in scored):
+            break  # 時間切れ・ノード数切れで反復が終わらなかった
+
+        # 評価値の良い順に並べ直し、次の反復の手順にする
+        scored.sort(key=lambda s: s[1], reverse=maximizing)
+        root_moves = [s[0] for s in scored]
+        value, pv = scored[0][1], scored[0][3]
+        result = (value, root_moves[0], pv, depth)
+        elapsed = time.perf_counter() - start
+        stats.iterations.append(
+            {"depth": depth, "value": value, "nodes": stats.nodes, "ms": int(elapsed * 1000)}
+        )
+        if on_iteration is not None:
+            on_iteration(
+                depth, value, [decode_move(m) for m in pv], stats.nodes, int(elapsed * 1000)
+            )
+        if node_limit is not None and stats.nodes >= node_limit:
+            break
+        if deadline is not None and time.time() + elapsed > deadline:
+            break
 
-        return value, best_move
+    value, best_move, pv, depth = result
+    return value, decode_move(best_move), [decode_move(m) for m in pv], depth, stats
 
 
-def get_best_move(board, depth):
-    return explore_moves(board, depth)[1]
+def speedup_report(sfen, depth, worker_counts=(1, 2, 4, 8)):
+    """固定深さでの並列数ごとの探索時間と速度向上率（1ワーカー=逐次探索が基準）"""
+    report = []
+    base = None
+    for workers in worker_counts:
+        shutdown_pool()
+        transposition_table.clear()
+        move_ordering.__init__()
+        board = shogi.Board(sfen)
+        if workers > 1:
+            _get_pool(workers)
+        start = time.perf_counter()
+        if workers > 1:
+            value, move, _, _, _ = parallel_search(board, depth, workers)
+        else:
+            # 並列探索はPython版なので、比べる1プロセスの探索もPython版にする
+            value, move, _, _, _ = iterative_deepening(board, depth, backend="python", cache=False)
+        elapsed = time.perf_counter() - start
+        if base is None:
+            base = elapsed
+        report.append(
+            {
+                "workers": workers,
+                "depth": depth,
+                "seconds": round(elapsed, 3),
+                "speedup": round(base / elapsed, 2),
+                "move": move.usi() if move else None,
+                "value": value,
+            }
+        )
+    shutdown_pool()
+    return report
+
+
+# --- USIプロトコル ---
+# 将棋GUIには python PyMyAI/MyAI.py usi で登録する。リポジトリの直下で python -m MyAI とすると
+# Rust版の MyAI/ が見つかってしまうので、スクリプトのパスで起動する（PyMyAI/ で python MyAI.py usi でもよい）
+ENGINE_NAME = "MyAI"
+ENGINE_AUTHOR = "ShogiCode"
+# setoptionで切り替える探索の機能
+USI_FEATURE_OPTIONS = {
+    "PVS": "pvs",
+    "NullMove": "null_move",
+    "LMR": "lmr",
+    "Aspiration": "aspiration",
+    "SEE": "see",
+    "DeltaPruning": "delta",
+}
+
+
+class USIEngine:
+    """標準入出力でUSIプロトコルを話すエンジン
+
+    探索は別スレッドで行い、入力は stop / ponderhit のために読み続ける。
+    置換表・ヒストリーはモジュールの表をそのまま使うので、手をまたいで温まったまま。
+    """
+
+    def __init__(self, out=None):
+        self.out = out
+        self.lock = threading.Lock()
+        self.board = shogi.Board()
+        self.threads = 1
+        self.own_book = True
+        self.features = frozenset(SEARCH_FEATURES)
+        self.eval_name = "material"  # "material" / "table"（setoption Eval）
+        self.eval_file = None  # eval=table で読む表（setoption EvalFile）
+        self.evaluator = None  # Noneなら駒得だけ（既定の評価）
+        self.thread = None
+        self.limits = None
+        self.released = threading.Event()  # ponder/infinite中のbestmove送信待ち
+        self.ponder_time_ms = None
+
+    def send(self, line):
+        with self.lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def run(self, lines=None):
+        """quitまで1行ずつコマンドを処理する。USI以外のprintは標準エラーへ回す"""
+        if self.out is None:
+            self.out = sys.stdout
+        saved_stdout = sys.stdout
+        sys.stdout = sys.stderr
+        try:
+            for line in sys.stdin if lines is None else lines:
+                if not self.handle(line.strip()):
+                    break
+        finally:
+            self.stop()
+            sys.stdout = saved_stdout
+
+    def handle(self, line):
+        """1コマンドを処理する。quitならFalse"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "usi":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send("option name USI_Hash type spin default 16 min 1 max 4096")
+            self.send("option name Threads type spin default 1 min 1 max 64")
+            self.send("option name USI_Ponder type check default false")
+            self.send("option name OwnBook type check default true")
+            self.send("option name Eval type combo default material var material var table")
+            self.send("option name EvalFile type string default <empty>")
+            for name in USI_FEATURE_OPTIONS:
+                self.send(f"option name {name} type check default true")
+            self.send("usiok")
+        elif command == "isready":
+            self.wait()
+            self.send("readyok")
+        elif command == "setoption":
+            self.wait()
+            self.set_option(tokens)
+        elif command == "position":
+            self.wait()
+            self.set_position(tokens)
+        elif command == "go":
+            self.wait()
+            self.go(tokens)
+        elif command in ("stop", "gameover"):
+            self.stop()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            return False
+        return True
+
+    def set_option(self, tokens):
+        # setoption name <名前> value <値>
+        if "name" not in tokens:
+            return
+        i = tokens.index("name")
+        name = tokens[i + 1]
+        value = tokens[tokens.index("value") + 1] if "value" in tokens else None
+        if name in ("USI_Hash", "Hash") and value is not None:
+            resize_hash(int(value))
+        elif name == "Threads" and value is not None:
+            self.threads = max(1, int(value))
+        elif name == "OwnBook" and value is not None:
+            self.own_book = value == "true"
+        elif name == "Eval" and value is not None:
+            self.eval_name = value
+            self.load_evaluator()
+        elif name == "EvalFile":
+            # パスに空白があってもよいように value 以降を全部使う
+            path = " ".join(tokens[tokens.index("value") + 1 :]) if value is not None else ""
+            self.eval_file = None if path in ("", "<empty>") else path
+            self.load_evaluator()
+        elif name in USI_FEATURE_OPTIONS and value is not None:
+            feature = USI_FEATURE_OPTIONS[name]
+            if value == "true":
+                self.features = self.features | {feature}
+            else:
+                self.features = self.features - {feature}
+
+    def load_evaluator(self):
+        """Eval / EvalFile から探索で使う評価を作る
+
+        table なら evaluation.TableEvaluator（EvalFile が空なら tables.npz、なければ初期値の表）。
+        位置の評価がある探索はPython版になる。
+        """
+        if self.eval_name != "table":
+            self.evaluator = None
+            return
+        import evaluation
+
+        tables = evaluation.load_tables(self.eval_file) if self.eval_file else None
+        self.evaluator = evaluation.TableEvaluator(tables=tables)
+
+    def set_position(self, tokens):
+        # position startpos [moves ...] / position sfen <盤> <手番> <持ち駒> <手数> [moves ...]
+        if tokens[1] == "startpos":
+            board = shogi.Board()
+            rest = tokens[2:]
+        else:
+            board = shogi.Board(" ".join(tokens[2:6]))
+            rest = tokens[6:]
+        if rest and rest[0] == "moves":
+            for usi in rest[1:]:
+                board.push_usi(usi)
+        self.board = board
+
+    def go(self, tokens):
+        params = {}
+        for name in ("btime", "wtime", "byoyomi", "binc", "winc", "nodes", "depth", "movetime"):
+            if name in tokens:
+                params[name] = int(tokens[tokens.index(name) + 1])
+        infinite = "infinite" in tokens
+        ponder = "ponder" in tokens
+
+        # 手番側の持ち時間から思考時間を決める
+        black = self.board.turn == shogi.BLACK
+        remaining = params.get("btime" if black else "wtime")
+        time_ms = params.get("movetime")
+        if time_ms is None and remaining is not None:
+            time_ms = allocate_time(
+                remaining,
+                params.get("byoyomi", 0),
+                params.get("binc" if black else "winc", 0),
+            )
+
+        self.limits = SearchLimits(features=self.features)
+        self.released.clear()
+        self.ponder_time_ms = None
+        waits = infinite or ponder
+        if waits:
+            self.ponder_time_ms = time_ms
+            time_ms = None
+        else:
+            self.released.set()
+        self.thread = threading.Thread(
+            target=self.search,
+            args=(
+                params.get("depth", MAX_PLY - 1),
+                time_ms,
+                params.get("nodes"),
+                waits,
+            ),
+        )
+        self.thread.start()
+
+    def search(self, max_depth, time_ms, node_limit, waits):
+        move = book_move(self.board) if self.own_book and not waits else None
+        if move is not None:
+            self.send(f"bestmove {move.usi()}")
+            self.limits = None
+            return
+        if self.threads > 1 and not waits and self.evaluator is None:
+            # 並列探索は途中で止められないので、時間・深さ指定の探索だけで使う
+            # （ワーカーは駒得だけで読むので、Eval=table のときも使わない）
+            result = parallel_search(
+                self.board, max_depth, self.threads, time_ms, node_limit, self.info
+            )
+        else:
+            result = iterative_deepening(
+                self.board,
+                max_depth,
+                time_ms,
+                node_limit,
+                on_iteration=self.info,
+                limits=self.limits,
+                evaluator=self.evaluator,
+            )
+        # ponder/infinite は stop か ponderhit までbestmoveを返さない
+        self.released.wait()
+        _, move, pv, _, _ = result
+        if move is None:
+            self.send("bestmove resign")
+        elif len(pv) > 1:
+            self.send(f"bestmove {move.usi()} ponder {pv[1].usi()}")
+        else:
+            self.send(f"bestmove {move.usi()}")
+        self.limits = None
+
+    def info(self, depth, value, pv, nodes, elapsed_ms):
+        # 評価値は手番側から見たcp（歩=100）
+        score = int(value)
+        if self.board.turn == shogi.WHITE:
+            score = -score
+        nps = nodes * 1000 // max(1, elapsed_ms)
+        limits = self.limits
+        seldepth = max(depth, limits.stats.seldepth) if limits is not None else depth
+        if abs(score) >= MATE_BOUND:
+            # 詰みまでの手数（負なら詰まされる）
+            plies = MATE_VALUE - abs(score)
+            score_text = f"mate {plies if score > 0 else -plies}"
+        else:
+            score_text = f"cp {score}"
+        self.send(
+            f"info depth {depth} seldepth {seldepth} nodes {nodes} nps {nps} time {elapsed_ms} "
+            f"score {score_text} pv {' '.join(m.usi() for m in pv)}"
+        )
+
+    def ponderhit(self):
+        """予想手が当たった: 読んでいた探索をそのまま通常の持ち時間で続ける"""
+        limits = self.limits
+        if limits is not None and self.ponder_time_ms is not None:
+            limits.set_deadline(time.perf_counter() + self.ponder_time_ms / 1000)
+        self.ponder_time_ms = None
+        self.released.set()
+
+    def stop(self):
+        limits = self.limits
+        if limits is not None:
+            limits.stop()
+        self.released.set()
+        self.wait()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+# --- ベンチマーク（bench / perft） ---
+# 固定局面: 平手初期局面、001.kif（角換わり）の12・30・56・80手目、指し手の多い終盤「祭り」局面
+BENCH_POSITIONS = [
+    shogi.STARTING_SFEN,
+    "lnsgk2nl/1r4gs1/p1pppp1pp/6p2/1p5P1/2P6/PPSPPPP1P/7R1/LN1GKGSNL b Bb 13",
+    "ln1g3nl/1r3kg2/3pppspp/p5p2/1ps4P1/P4SP2/1PSPPP2P/2KG3R1/LN3G1NL b BPbp 31",
+    "ln1g3nl/1r3kg2/3+Spps1p/p5p2/2s4R1/PPp2P+b2/1S1PP1N1P/2KG5/LN3G2L b B5Pp 57",
+    "ln1g2+R2/1r1k5/3+bpp2p/p1l3p2/2S2s2B/PPGP1P3/4P3P/2K6/L4G2L b G2S2N7Pn 81",
+    "l6nl/5+P1gk/2np1S3/p1p4Pp/3P2Sp1/1PPb2P1P/P5GS1/R8/LN4bKL w RGgsn5p 1",
+]
+
+
+def bench(depth=3, node_limit=None, positions=None, time_limit_ms=None, features=None):
+    """固定局面を固定深さ（またはノード数・時間）で探索し、ノード数・nps・署名を返す
+
+    表は毎回空にしてから始めるので、同じ実装なら同じノード数・署名になる
+    （time_limit_ms を指定したときは除く）。featuresは使う SEARCH_FEATURES。
+    """
+    if features is None:
+        features = SEARCH_FEATURES
+    if positions is None:
+        positions = BENCH_POSITIONS
+    transposition_table.clear()
+    move_ordering.__init__()
+    if BACKEND == "cython":
+        get_core_searcher().clear()
+
+    results = []
+    total_nodes = 0
+    total_seconds = 0.0
+    signature = 0
+    for sfen in positions:
+        board = shogi.Board(sfen)
+        start = time.perf_counter()
+        value, move, _, completed, stats = iterative_deepening(
+            board, depth, time_limit_ms, node_limit, features=features, cache=False
+        )
+        seconds = time.perf_counter() - start
+        nodes = stats.nodes
+        usi = move.usi() if move else None
+        results.append(
+            {
+                "sfen": sfen,
+                "depth": completed,
+                "nodes": nodes,
+                "qnodes": stats.qnodes,
+                "seldepth": stats.seldepth,
+                "null_cutoffs": stats.null_cutoffs,
+                "reductions": stats.reductions,
+                "researches": stats.researches,
+                "see_pruned": stats.see_pruned,
+                "delta_pruned": stats.delta_pruned,
+                "ms": int(seconds * 1000),
+                "nps": int(nodes / seconds) if seconds else 0,
+                "us_per_node": round(seconds * 1e6 / nodes, 2) if nodes else 0,
+                "move": usi,
+                "value": value,
+            }
+        )
+        total_nodes += nodes
+        total_seconds += seconds
+        signature = zlib.crc32(f"{nodes}:{usi}".encode(), signature)
+
+    return {
+        "backend": BACKEND,
+        "depth": depth,
+        "node_limit": node_limit,
+        "time_limit_ms": time_limit_ms,
+        "features": sorted(features),
+        "mean_depth": round(sum(r["depth"] for r in results) / len(results), 2),
+        "nodes": total_nodes,
+        "ms": int(total_seconds * 1000),
+        "nps": int(total_nodes / total_seconds) if total_seconds else 0,
+        # 1ノードあたりの時間（終局判定・指し手生成の軽さの目安）
+        "us_per_node": round(total_seconds * 1e6 / total_nodes, 2) if total_nodes else 0,
+        "signature": f"{signature:08x}",
+        "positions": results,
+    }
+
+
+SELECTIVITY_STEPS = [
+    ("none", ()),
+    ("pvs", ("pvs",)),
+    ("+null_move", ("pvs", "null_move")),
+    ("+lmr", ("pvs", "null_move", "lmr")),
+    ("+aspiration", ("pvs", "null_move", "lmr", "aspiration")),
+    ("+see+delta", SEARCH_FEATURES),
+]
+
+
+def selectivity_report(time_limit_ms=1000, max_depth=MAX_PLY - 1, positions=None):
+    """同じ時間で、探索の機能を1つずつ足したときに届く深さとノード数を比べる"""
+    report = []
+    base = None
+    for name, features in SELECTIVITY_STEPS:
+        result = bench(max_depth, None, positions, time_limit_ms, features)
+        if base is None:
+            base = result["mean_depth"]
+        report.append(
+            {
+                "features": name,
+                "mean_depth": result["mean_depth"],
+                "depth_gain": round(result["mean_depth"] - base, 2),
+                "depths": [r["depth"] for r in result["positions"]],
+                "nodes": result["nodes"],
+                "nps": result["nps"],
+            }
+        )
+    return report
+
+
+def perft(pos, depth):
+    """Positionの指し手生成で末端局面数を数える"""
+    moves = pos.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        pos.make(move)
+        nodes += perft(pos, depth - 1)
+        pos.unmake()
+    return nodes
+
+
+def perft_board(board, depth):
+    """python-shogi の generate_legal_moves で末端局面数を数える"""
+    if depth == 1:
+        return sum(1 for _ in board.generate_legal_moves())
+    nodes = 0
+    for move in list(board.generate_legal_moves()):
+        board.push(move)
+        nodes += perft_board(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def perft_core(sfen, depth):
+    """Cython版の指し手生成で末端局面数を数える"""
+    searcher = myai_core.Searcher(1)
+    core_set_position(searcher, Position.from_sfen(sfen))
+    return searcher.perft(depth)
+
+
+PERFT_GENERATORS = {
+    "python-shogi": lambda sfen, depth: perft_board(shogi.Board(sfen), depth),
+    "python": lambda sfen, depth: perft(Position.from_sfen(sfen), depth),
+}
+if myai_core is not None:
+    PERFT_GENERATORS["cython"] = perft_core
+
+
+def perft_report(sfen, max_depth, generators=None):
+    """深さごと・生成器ごとの末端局面数と時間。全生成器で数が一致するかも示す"""
+    if generators is None:
+        generators = list(PERFT_GENERATORS)
+    report = {"sfen": sfen, "depths": []}
+    for depth in range(1, max_depth + 1):
+        row = {"depth": depth}
+        counts = set()
+        for name in generators:
+            start = time.perf_counter()
+            nodes = PERFT_GENERATORS[name](sfen, depth)
+            seconds = time.perf_counter() - start
+            row[name] = {
+                "nodes": nodes,
+                "ms": int(seconds * 1000),
+                "nps": int(nodes / seconds) if seconds else 0,
+            }
+            counts.add(nodes)
+        row["match"] = len(counts) == 1
+        report["depths"].append(row)
+    return report
 
 
 # --- 使用例 ---
 if __name__ == "__main__":
+    # evaluation などが import MyAI したとき、このモジュールをもう一度読み込まないようにする
+    sys.modules.setdefault("MyAI", sys.modules["__main__"])
+    parser = argparse.ArgumentParser(prog="MyAI")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("usi", help="USIエンジンとして動く（python PyMyAI/MyAI.py usi）")
+    bench_parser = commands.add_parser("bench", help="固定局面のベンチマーク (JSON)")
+    bench_parser.add_argument("--depth", type=int, default=3)
+    bench_parser.add_argument("--nodes", type=int, default=None)
+    bench_parser.add_argument("--time-ms", type=int, default=None, help="1局面あたりの時間")
+    bench_parser.add_argument(
+        "--features", default="all", help='使う探索の機能 例: "pvs+lmr" / "none"'
+    )
+    selectivity_parser = commands.add_parser(
+        "selectivity", help="同じ時間で探索の機能ごとに届く深さ (JSON)"
+    )
+    selectivity_parser.add_argument("--time-ms", type=int, default=1000)
+    perft_parser = commands.add_parser("perft", help="指し手生成の perft (JSON)")
+    perft_parser.add_argument("depth", type=int, nargs="?", default=3)
+    perft_parser.add_argument("sfen", nargs="*")
+    speedup_parser = commands.add_parser("speedup", help="並列探索の速度向上率 (JSON)")
+    speedup_parser.add_argument("depth", type=int, nargs="?", default=3)
+    speedup_parser.add_argument("sfen", nargs="*")
+    tsume_parser = commands.add_parser("tsume", help="SFENの詰将棋をまとめて解く (JSON lines)")
+    tsume_parser.add_argument("file", help="1行に1局面のSFENファイル（-で標準入力）")
+    tsume_parser.add_argument("--nodes", type=int, default=DFPN_NODES)
+    tsume_parser.add_argument("--time-ms", type=int, default=None)
+    cache_parser = commands.add_parser("cache", help="解析キャッシュの状態 (JSON)")
+    cache_parser.add_argument("--path", default=CACHE_PATH)
+    cache_parser.add_argument("--size-mb", type=int, default=None, help="大きさを変える")
+    book_parser = commands.add_parser("book", help="棋譜から定跡ファイルを作る")
+    book_parser.add_argument("paths", nargs="+", help="KIF/CSAファイルかディレクトリ")
+    book_parser.add_argument("-o", "--output", default=BOOK_PATH)
+    book_parser.add_argument("--max-ply", type=int, default=BOOK_MAX_PLY)
+    book_parser.add_argument("--min-count", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == "usi":
+        # python PyMyAI/MyAI.py usi
+        USIEngine().run()
+        sys.exit()
+    if args.command == "bench":
+        features = parse_features(args.features)
+        print(
+            json.dumps(bench(args.depth, args.nodes, None, args.time_ms, features), indent=2)
+        )
+        sys.exit()
+    if args.command == "selectivity":
+        print(json.dumps(selectivity_report(args.time_ms), indent=2))
+        sys.exit()
+    if args.command == "perft":
+        sfen = " ".join(args.sfen) or shogi.STARTING_SFEN
+        print(json.dumps(perft_report(sfen, args.depth), indent=2))
+        sys.exit()
+    if args.command == "tsume":
+        # python PyMyAI/MyAI.py tsume problems.sfen
+        lines = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8")
+        for line in lines:
+            sfen = line.strip()
+            if not sfen or sfen.startswith("#"):
+                continue
+            start = time.perf_counter()
+            mate, moves, nodes = solve_mate(sfen, args.nodes, args.time_ms)
+            result = {
+                "sfen": sfen,
+                "mate": mate,
+                "moves": [m.usi() for m in moves],
+                "nodes": nodes,
+                "ms": int((time.perf_counter() - start) * 1000),
+            }
+            print(json.dumps(result), flush=True)
+        sys.exit()
+    if args.command == "cache":
+        # python PyMyAI/MyAI.py cache --size-mb 256
+        size_mb = args.size_mb
+        if size_mb is None:
+            buckets = AnalysisCache.file_buckets(args.path)
+            if not buckets:
+                sys.exit(f"解析キャッシュがありません: {args.path}")
+            size_mb = max(1, buckets * CACHE_BUCKET * CACHE_SLOT.size // (1024 * 1024))
+        cache = AnalysisCache(args.path, size_mb)
+        print(json.dumps(cache.stats(full=True), indent=2))
+        cache.close()
+        sys.exit()
+    if args.command == "book":
+        # python PyMyAI/MyAI.py book static/kif
+        start = time.perf_counter()
+        games, entries = build_book(args.paths, args.max_ply, args.min_count)
+        write_book(args.output, entries)
+        print(
+            f"{games}局から{len(entries)}件の定跡を {args.output} に書きました "
+            f"({time.perf_counter() - start:.1f}秒)"
+        )
+        sys.exit()
+    if args.command == "speedup":
+        sfen = " ".join(args.sfen) or shogi.STARTING_SFEN
+        counts = [n for n in (1, 2, 4, 8, 16) if n <= multiprocessing.cpu_count()]
+        print(json.dumps(speedup_report(sfen, args.depth, counts), indent=2))
+        sys.exit()
+
     board = shogi.Board()
     depth = 3
-    value, best_move = explore_moves(board, depth)
+    value, best_move, pv, _, stats = iterative_deepening(
+        board,
+        depth,
+        on_iteration=lambda d, v, pv, nodes, ms: print(
+            f"深さ{d}: 評価={v} 読み筋={' '.join(m.usi() for m in pv)} "
+            f"ノード={nodes} {ms}ms"
+        ),
+    )
 
     print(f"\n探索結果の評価値: {value}")
     if best_move:
         print(f"AIが選んだ最良手: {best_move.usi()}")
     else:
         print("指せる手がありません。")
+    print(f"探索: {stats.summary()}")
+    print(f"置換表: {transposition_table.stats()}")
+    print(f"並べ替え: {move_ordering.stats()}")
@@ -1,145 +1,1103 @@
 # MyAI.pyx
-# cython: language_level=3
-
-import shogi
-
-# --- 評価用クラス ---
-cdef class ShogiAI:
-    cdef dict piece_value_dict
-
-    def __init__(self, dict piece_value_dict):
-        self.piece_value_dict = piece_value_dict
-
-    cpdef int evaluate(self, list piece_list):
-        """駒の合計点で盤面を評価"""
-        cdef int total = 0
-        cdef str piece
-        for piece in piece_list:
-            total += self.piece_value_dict.get(piece, 0)
-        return total
-
-# --- 盤面を駒リストに変換 (持ち駒は含まない) ---
-cpdef list board_to_piece_list(object board):
-    cdef list piece_list = []
-    cdef int square
-    cdef object piece
-    for square in shogi.SQUARES:
-        piece = board.piece_at(square)
-        if piece is not None:
-            piece_list.append(piece.symbol())
-    return piece_list
-
-# --- 持ち駒をリストに変換 ---
-cpdef list board_to_hand_list(object board):
-    cdef list hand_list = []
-    cdef int piece_type, count, i
-
-    # 先手
-    for piece_type, count in board.pieces_in_hand[shogi.BLACK].items():
-        for i in range(count):
-            hand_list.append(shogi.PIECE_SYMBOLS[piece_type])
-
-    # 後手
-    for piece_type, count in board.pieces_in_hand[shogi.WHITE].items():
-        for i in range(count):
-            hand_list.append(shogi.PIECE_SYMBOLS[piece_type].lower())
-
-    return hand_list
-
-# --- 盤面＋持ち駒を合計評価 ---
-cpdef int evaluate_board(object board, dict piece_value_dict, bint turn):
-    """turn=Trueなら先手、Falseなら後手"""
-    cdef ShogiAI ai = ShogiAI(piece_value_dict)
-    cdef list pieces = board_to_piece_list(board)
-    pieces += board_to_hand_list(board)
-    cdef int val = ai.evaluate(pieces)
-    if not turn:
-        val = -val
-    return val
-
-# --- 静止探索（quiescence search） ---
-cpdef int quiescence(object board, int alpha, int beta, dict piece_value_dict, bint turn, int depth=0):
-    cdef int stand_pat = evaluate_board(board, piece_value_dict, turn)
-    cdef object move
-    cdef int score
-
-    # βカット
-    if stand_pat >= beta:
-        return beta
-    if alpha < stand_pat:
-        alpha = stand_pat
-
-    # 駒取りの手のみ延長
-    for move in board.legal_moves:
-        if board.piece_at(move.to_square) is None:
-            continue
-        board.push(move)
-        score = -quiescence(board, -beta, -alpha, piece_value_dict, not turn, depth + 1)
-        board.pop()
-
-        if score >= beta:
-            return beta
-        if score > alpha:
-            alpha = score
-
-    return alpha
-
-# --- αβ探索（最良手付き） ---
-cpdef tuple explore_moves(object board,
-                          int depth,
-                          bint turn=True,
-                          double alpha=-1e9,
-                          double beta=1e9,
-                          bint maximizing=True,
-                          int ply=0):
-    cdef dict piece_value_dict = {
-        "P": 1, "L": 5, "N": 5, "S": 7, "G": 8,
-        "B": 10, "R": 12, "+P": 2, "+L": 6, "+N": 6,
-        "+S": 9, "+B": 15, "+R": 18,
-        "p": -1, "l": -5, "n": -5, "s": -7, "g": -8,
-        "b": -10, "r": -12, "+p": -2, "+l": -6,
-        "+n": -6, "+s": -9, "+b": -15, "+r": -18
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True, initializedcheck=False
+#
+# --- 探索部のCython版（拡張モジュール名は myai_core） ---
+# 局面・指し手生成・駒得の評価・αβ探索をCの配列だけで行い、探索中はGILを離す。
+# 駒コード・指し手の整数・持ち駒の並び・zobristの乱数は MyAI.py の Position と同じで、
+# 利きの表などは MyAI.py が init_tables() で渡す（同じ局面なら同じキーになる）。
+# MyAI.py はこのモジュールがあれば使い、なければPython版で探索する。
+#
+#   python setup.py build_ext --inplace
+
+from libc.stdint cimport int32_t, int64_t, uint8_t, uint32_t, uint64_t
+from libc.stdlib cimport calloc, free, malloc
+from libc.string cimport memcpy, memset
+
+cdef extern from *:
+    """
+    #ifdef _WIN32
+    #include <windows.h>
+    static double myai_now(void) {
+        LARGE_INTEGER count, freq;
+        QueryPerformanceCounter(&count);
+        QueryPerformanceFrequency(&freq);
+        return (double)count.QuadPart / (double)freq.QuadPart;
     }
+    #else
+    #include <time.h>
+    static double myai_now(void) {
+        struct timespec t;
+        clock_gettime(CLOCK_MONOTONIC, &t);
+        return (double)t.tv_sec + (double)t.tv_nsec * 1e-9;
+    }
+    #endif
+    """
+    # time.perf_counter() と同じ時計（締め切りをそのまま渡せる）
+    double myai_now() nogil
 
-    cdef double value
-    cdef object best_move = None
-    cdef object move
-    cdef tuple child_result
+cdef enum:
+    KING = 8
+    PAWN = 1
+    PROMOTION_FLAG = 1 << 14
+    SEARCH_PLY = 128  # 静止探索を含めた探索の手数の上限
+    MAX_PLY = 64  # キラー手を持つ手数
+    MAX_MOVES = 600  # 1局面の疑似合法手の上限（将棋の最大は593）
+    CUTOFF_BUCKETS = 8
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+    # SEARCH_FEATURES の順のビット
+    F_PVS = 1
+    F_NULL_MOVE = 2
+    F_LMR = 4
+    F_ASPIRATION = 8
+    F_SEE = 16
+    F_DELTA = 32
 
-    if depth == 0 or board.is_game_over():
-        return quiescence(board, int(alpha), int(beta), piece_value_dict, turn), None
+INF = 1 << 29
+cdef int C_INF = 1 << 29
+cdef int64_t SCORE_OFFSET = 2147483648  # 置換表の評価値を符号なしで持つためのゲタ
+cdef uint64_t TT_GENERATION_MASK = 0x3F  # 世代は6bit（26〜31bit目）。その上は評価値
+cdef int ORDER_PV = 1 << 30
+cdef int ORDER_CAPTURE = 1 << 28
+cdef int ORDER_KILLER = 1 << 27
+cdef int NULL_MOVE_REDUCTION = 2
+cdef int NULL_MOVE_MIN_DEPTH = 3
+cdef int LMR_MIN_DEPTH = 3
+cdef int LMR_MIN_MOVES = 3
+cdef int LMR_DEEP_MOVES = 12
+cdef int DELTA_MARGIN = 200
+cdef int MATE_VALUE = 1000000  # init_tables で MyAI.MATE_VALUE に合わせる
+cdef int MATE_BOUND = 1000000 - 1000
+cdef int NO_REPETITION = 2
 
-    if maximizing:
-        value = -1e9
-        for move in board.legal_moves:
-            board.push(move)
-            child_result = explore_moves(board, depth - 1, not turn, alpha, beta, False, ply + 1)
-            board.pop()
+# --- 表（init_tables で MyAI.py の表から作る） ---
+cdef uint8_t STEP_TO[32][81][8]
+cdef uint8_t STEP_N[32][81]
+cdef uint8_t RAY_SQ[32][81][4][8]
+cdef uint8_t RAY_LEN[32][81][4]
+cdef uint8_t RAY_N[32][81]
+cdef uint8_t STEP_ATT_FROM[2][81][12]
+cdef uint32_t STEP_ATT_MASK[2][81][12]
+cdef uint8_t STEP_ATT_N[2][81]
+cdef uint8_t SLIDER_SQ[2][81][8][8]
+cdef uint8_t SLIDER_LEN[2][81][8]
+cdef uint32_t SLIDER_MASK[2][81][8]
+cdef uint8_t SLIDER_N[2][81]
+cdef uint8_t ALIGNED[81][81]
+cdef uint8_t ZONE[2][81]
+cdef uint8_t DEAD[32][81]
+cdef uint8_t CAN_PROMOTE[32]
+cdef uint8_t PROMOTED_CODE[32]
+cdef uint8_t UNPROMOTED_CODE[32]
+cdef uint64_t ZOBRIST_PIECE[32 * 81]
+cdef uint64_t ZOBRIST_HAND[16 * 20]
+cdef uint64_t ZOBRIST_SIDE
+cdef int ORDER_VALUES[16]  # PIECE_TYPE_VALUES
+cdef int SEE_VALUES[16]
+tables_ready = False
 
-            if child_result[0] > value:
-                value = child_result[0]
-                best_move = move
 
-            alpha = max(alpha, value)
-            if beta <= alpha:
+def init_tables(t):
+    """MyAI.py の表（dict）をCの配列に写す。探索の前に1回呼ぶ"""
+    global ZOBRIST_SIDE, MATE_VALUE, MATE_BOUND, tables_ready
+    cdef int code, square, i, j, color
+    for code in range(32):
+        CAN_PROMOTE[code] = t["CAN_PROMOTE"][code]
+        PROMOTED_CODE[code] = t["PROMOTED_CODE"][code]
+        UNPROMOTED_CODE[code] = t["UNPROMOTED_CODE"][code]
+        for square in range(81):
+            targets = t["STEP_TARGETS"][code][square]
+            assert len(targets) <= 8
+            STEP_N[code][square] = len(targets)
+            for i, target in enumerate(targets):
+                STEP_TO[code][square][i] = target
+            rays = t["RAY_TARGETS"][code][square]
+            assert len(rays) <= 4
+            RAY_N[code][square] = len(rays)
+            for i, ray in enumerate(rays):
+                RAY_LEN[code][square][i] = len(ray)
+                for j, target in enumerate(ray):
+                    RAY_SQ[code][square][i][j] = target
+            DEAD[code][square] = t["DEAD_SQUARE"][code][square]
+    for color in range(2):
+        for square in range(81):
+            ZONE[color][square] = t["PROMOTION_ZONE"][color][square]
+            steps = t["STEP_ATTACKERS"][color][square]
+            assert len(steps) <= 12
+            STEP_ATT_N[color][square] = len(steps)
+            for i, (from_square, mask) in enumerate(steps):
+                STEP_ATT_FROM[color][square][i] = from_square
+                STEP_ATT_MASK[color][square][i] = mask
+            sliders = t["SLIDER_ATTACKERS"][color][square]
+            SLIDER_N[color][square] = len(sliders)
+            for i, (ray, mask) in enumerate(sliders):
+                SLIDER_LEN[color][square][i] = len(ray)
+                SLIDER_MASK[color][square][i] = mask
+                for j, target in enumerate(ray):
+                    SLIDER_SQ[color][square][i][j] = target
+    for i in range(81):
+        for j in range(81):
+            ALIGNED[i][j] = t["ALIGNED"][i][j]
+    for i in range(32 * 81):
+        ZOBRIST_PIECE[i] = t["ZOBRIST_PIECE"][i]
+    for i in range(16 * 20):
+        ZOBRIST_HAND[i] = t["ZOBRIST_HAND"][i]
+    ZOBRIST_SIDE = t["ZOBRIST_SIDE"]
+    MATE_VALUE = t["MATE_VALUE"]
+    MATE_BOUND = t["MATE_BOUND"]
+    for i in range(16):
+        ORDER_VALUES[i] = t["PIECE_TYPE_VALUES"][i] if i < len(t["PIECE_TYPE_VALUES"]) else 0
+        SEE_VALUES[i] = t["SEE_VALUES"][i]
+    tables_ready = True
+
+
+cdef class Searcher:
+    """1つの探索（局面・置換表・キラー手/ヒストリー・統計）
+
+    set_position で局面を渡し、search を深さごとに呼ぶ。
+    search の間はGILを離すので、別スレッドから stop / set_deadline できる。
+    """
+
+    # 局面（MyAI.Position と同じ並び）
+    cdef uint8_t board[81]
+    cdef uint8_t hands[16]
+    cdef int king_squares[2]
+    cdef int turn
+    cdef uint64_t key
+    cdef int material
+    cdef int ply
+    cdef int stack_size
+    cdef int32_t *move_stack
+    cdef uint8_t *captured_stack
+    cdef uint64_t *key_stack
+    cdef int32_t *material_stack
+    cdef uint8_t *check_stack
+    cdef int board_values[32]
+    cdef int hand_values[32]
+
+    # 置換表
+    cdef uint64_t *tt_keys
+    cdef uint64_t *tt_data
+    cdef uint64_t tt_mask
+    cdef uint64_t generation
+
+    # 並べ替え
+    cdef int32_t killers[MAX_PLY][2]
+    cdef int32_t *history
+    cdef int32_t *move_buffer  # [探索の手数][MAX_MOVES]
+    cdef int32_t *score_buffer
+    cdef int32_t pv_line[SEARCH_PLY]
+    cdef int pv_length
+    cdef int32_t root_move
+
+    # 制限
+    cdef int stopped
+    cdef int aborted
+    cdef double deadline
+    cdef int64_t max_nodes
+    cdef int features
+
+    # 統計
+    cdef int64_t nodes
+    cdef int64_t qnodes
+    cdef int64_t cutoffs[CUTOFF_BUCKETS]
+    cdef int64_t tt_probes
+    cdef int64_t tt_hits
+    cdef int seldepth
+    cdef int64_t null_cutoffs
+    cdef int64_t reductions
+    cdef int64_t researches
+    cdef int64_t see_pruned
+    cdef int64_t delta_pruned
+
+    def __cinit__(self, int hash_mb=16):
+        cdef uint64_t n = <uint64_t>hash_mb * 1024 * 1024 // 16
+        cdef uint64_t size = 1
+        while size * 2 <= n:
+            size *= 2
+        self.tt_keys = <uint64_t *>calloc(size, sizeof(uint64_t))
+        self.tt_data = <uint64_t *>calloc(size, sizeof(uint64_t))
+        self.tt_mask = size - 1
+        self.history = <int32_t *>calloc(1 << 16, sizeof(int32_t))
+        self.move_buffer = <int32_t *>malloc(SEARCH_PLY * MAX_MOVES * sizeof(int32_t))
+        self.score_buffer = <int32_t *>malloc(SEARCH_PLY * MAX_MOVES * sizeof(int32_t))
+        self.stack_size = 0
+        self.move_stack = NULL
+        self.captured_stack = NULL
+        self.key_stack = NULL
+        self.material_stack = NULL
+        self.check_stack = NULL
+        if (
+            not self.tt_keys
+            or not self.tt_data
+            or not self.history
+            or not self.move_buffer
+            or not self.score_buffer
+        ):
+            raise MemoryError()
+        self._grow(1024)
+
+    def __dealloc__(self):
+        free(self.tt_keys)
+        free(self.tt_data)
+        free(self.history)
+        free(self.move_buffer)
+        free(self.score_buffer)
+        free(self.move_stack)
+        free(self.captured_stack)
+        free(self.key_stack)
+        free(self.material_stack)
+        free(self.check_stack)
+
+    cdef _grow(self, int size):
+        free(self.move_stack)
+        free(self.captured_stack)
+        free(self.key_stack)
+        free(self.material_stack)
+        free(self.check_stack)
+        self.move_stack = <int32_t *>calloc(size, sizeof(int32_t))
+        self.captured_stack = <uint8_t *>calloc(size, sizeof(uint8_t))
+        self.key_stack = <uint64_t *>calloc(size, sizeof(uint64_t))
+        self.material_stack = <int32_t *>calloc(size, sizeof(int32_t))
+        self.check_stack = <uint8_t *>calloc(size, sizeof(uint8_t))
+        if (
+            not self.move_stack
+            or not self.captured_stack
+            or not self.key_stack
+            or not self.material_stack
+            or not self.check_stack
+        ):
+            raise MemoryError()
+        self.stack_size = size
+
+    # --- Pythonから呼ぶ ---
+    def set_values(self, board_values, hand_values):
+        """ShogiAI の board_values / hand_values（[手番*16+駒種] のcp）"""
+        cdef int i
+        for i in range(32):
+            self.board_values[i] = board_values[i]
+            self.hand_values[i] = hand_values[i]
+
+    def set_position(self, board, hands, int turn, king_squares, key, int material, keys, checks):
+        """MyAI.Position の中身（盤・持ち駒・手番・玉の升・キー・駒得・これまでのキーと王手）を写す"""
+        cdef int i
+        if not tables_ready:
+            raise RuntimeError("init_tables を先に呼んでください")
+        if len(keys) + SEARCH_PLY + 1 > self.stack_size:
+            self._grow(len(keys) + SEARCH_PLY + 1024)
+        for i in range(81):
+            self.board[i] = board[i]
+        for i in range(16):
+            self.hands[i] = hands[i]
+        self.turn = turn
+        self.king_squares[0] = king_squares[0]
+        self.king_squares[1] = king_squares[1]
+        self.key = key
+        self.material = material
+        self.ply = len(keys)
+        for i, k in enumerate(keys):
+            self.key_stack[i] = k
+            self.move_stack[i] = -1  # 棋譜の手（null moveの0と区別する）
+            self.material_stack[i] = 0
+            self.check_stack[i] = checks[i]
+        self.pv_length = 0
+
+    def new_search(self):
+        """探索開始ごとに呼ぶ（世代を進め、キラー手を消し、ヒストリーを半減、統計を0に）"""
+        cdef int i
+        self.generation = (self.generation + 1) & TT_GENERATION_MASK
+        memset(self.killers, 0, sizeof(self.killers))
+        for i in range(1 << 16):
+            self.history[i] >>= 1
+        self.stopped = 0
+        self.nodes = self.qnodes = 0
+        self.tt_probes = self.tt_hits = 0
+        self.seldepth = 0
+        self.null_cutoffs = self.reductions = self.researches = 0
+        self.see_pruned = self.delta_pruned = 0
+        memset(self.cutoffs, 0, sizeof(self.cutoffs))
+
+    def clear(self):
+        """置換表・ヒストリーを空にする"""
+        memset(self.tt_keys, 0, (self.tt_mask + 1) * sizeof(uint64_t))
+        memset(self.tt_data, 0, (self.tt_mask + 1) * sizeof(uint64_t))
+        memset(self.history, 0, (1 << 16) * sizeof(int32_t))
+        self.generation = 0
+
+    def stop(self):
+        """別スレッドから探索を止める"""
+        self.stopped = 1
+
+    def set_deadline(self, double deadline):
+        """time.perf_counter() 基準の締め切り（0なら無し）。探索中でも変えられる"""
+        self.deadline = deadline
+
+    def search(self, int depth, int alpha, int beta, int features, double deadline,
+               int64_t max_nodes, pv=()):
+        """深さ depth で探索して (手番側から見た評価値, 最善手) を返す。打ち切られたらNone
+
+        pvは前回の反復の読み筋で、その手順を最初に読む。max_nodes は new_search からの累計。
+        """
+        cdef int value
+        cdef int i
+        self.pv_length = min(len(pv), SEARCH_PLY)
+        for i in range(self.pv_length):
+            self.pv_line[i] = pv[i]
+        self.features = features
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.aborted = 0
+        self.root_move = 0
+        with nogil:
+            value = self.negamax(depth, alpha, beta, 0, 1, 1)
+        if self.aborted:
+            return None
+        return value, self.root_move
+
+    def pv(self, int first_move, int max_length):
+        """置換表から読み筋を取り出す（千日手のループで止める）"""
+        cdef int32_t move
+        cdef int n = 0
+        cdef int i
+        line = [first_move]
+        seen = set()
+        self.make(first_move)
+        n = 1
+        seen.add(self.key)
+        while len(line) < max_length:
+            move = self.tt_move(self.key)
+            if not move or not self.is_legal_move(move):
                 break
-        return value, best_move
-    else:
-        value = 1e9
-        for move in board.legal_moves:
-            board.push(move)
-            child_result = explore_moves(board, depth - 1, not turn, alpha, beta, True, ply + 1)
-            board.pop()
-
-            if child_result[0] < value:
-                value = child_result[0]
-                best_move = move
+            self.make(move)
+            n += 1
+            if self.key in seen:
+                self.unmake()
+                n -= 1
+                break
+            seen.add(self.key)
+            line.append(move)
+        for i in range(n):
+            self.unmake()
+        return line
+
+    def stats(self):
+        return {
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "cutoffs": [self.cutoffs[i] for i in range(CUTOFF_BUCKETS)],
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "seldepth": self.seldepth,
+            "null_cutoffs": self.null_cutoffs,
+            "reductions": self.reductions,
+            "researches": self.researches,
+            "see_pruned": self.see_pruned,
+            "delta_pruned": self.delta_pruned,
+        }
+
+    def legal_moves(self):
+        cdef int32_t *moves = self.move_buffer
+        cdef int n = self.generate_moves(moves)
+        cdef bint check = self.in_check()
+        return [moves[i] for i in range(n) if self.is_legal(moves[i], check)]
+
+    def perft(self, int depth):
+        cdef int64_t nodes
+        with nogil:
+            nodes = self.perft_nodes(depth, 0)
+        return nodes
+
+    def get_key(self):
+        return self.key
+
+    def probe(self, uint64_t key):
+        """置換表を引く。(深さ, 評価値, 種類, 最善手) か None（MyAI.TranspositionTable.probe と同じ）"""
+        cdef uint64_t entry
+        if self.tt_keys[key & self.tt_mask] != key:
+            return None
+        entry = self.tt_data[key & self.tt_mask]
+        return (
+            (entry >> 16) & 0xFF,
+            <int>(<int64_t>(entry >> 32) - SCORE_OFFSET),
+            (entry >> 24) & 0x3,
+            entry & 0xFFFF,
+        )
+
+    def store(self, uint64_t key, int depth, int score, int bound, int32_t move):
+        self.tt_store(key, depth, score, bound, move)
+
+    # --- 指し手を進める・戻す ---
+    cdef void make(self, int32_t move) noexcept nogil:
+        cdef int ply = self.ply
+        cdef int us = self.turn
+        cdef int to_square = move & 127
+        cdef int from_square = (move >> 7) & 127
+        cdef uint64_t key = self.key
+        cdef int material = self.material
+        cdef int code, captured, index, count, promoted, hand_code
+        self.move_stack[ply] = move
+        self.key_stack[ply] = key
+        self.material_stack[ply] = material
+        key ^= ZOBRIST_SIDE
+        if from_square >= 81:
+            code = (from_square - 81) | us << 4
+            index = us * 8 + from_square - 81
+            count = self.hands[index] - 1
+            self.hands[index] = count
+            key ^= ZOBRIST_HAND[index * 20 + count] ^ ZOBRIST_PIECE[code * 81 + to_square]
+            material += self.board_values[code] - self.hand_values[code]
+            captured = 0
+        else:
+            code = self.board[from_square]
+            captured = self.board[to_square]
+            key ^= ZOBRIST_PIECE[code * 81 + from_square]
+            if move & PROMOTION_FLAG:
+                promoted = PROMOTED_CODE[code]
+                material += self.board_values[promoted] - self.board_values[code]
+                code = promoted
+            if captured:
+                key ^= ZOBRIST_PIECE[captured * 81 + to_square]
+                hand_code = UNPROMOTED_CODE[captured] ^ 16
+                index = us * 8 + (hand_code & 15)
+                count = self.hands[index]
+                self.hands[index] = count + 1
+                key ^= ZOBRIST_HAND[index * 20 + count]
+                material += self.hand_values[hand_code] - self.board_values[captured]
+            self.board[from_square] = 0
+            key ^= ZOBRIST_PIECE[code * 81 + to_square]
+            if code & 15 == KING:
+                self.king_squares[us] = to_square
+        self.board[to_square] = code
+        self.captured_stack[ply] = captured
+        self.key = key
+        self.material = material
+        self.turn = us ^ 1
+        self.ply = ply + 1
+
+    cdef void unmake(self) noexcept nogil:
+        cdef int ply = self.ply - 1
+        cdef int32_t move = self.move_stack[ply]
+        cdef int captured = self.captured_stack[ply]
+        cdef int us = self.turn ^ 1
+        cdef int to_square = move & 127
+        cdef int from_square = (move >> 7) & 127
+        cdef int code
+        if from_square >= 81:
+            self.hands[us * 8 + from_square - 81] += 1
+            self.board[to_square] = 0
+        else:
+            code = self.board[to_square]
+            if move & PROMOTION_FLAG:
+                code = UNPROMOTED_CODE[code]
+            self.board[from_square] = code
+            self.board[to_square] = captured
+            if captured:
+                self.hands[us * 8 + (UNPROMOTED_CODE[captured] & 15)] -= 1
+            if code & 15 == KING:
+                self.king_squares[us] = from_square
+        self.turn = us
+        self.ply = ply
+        self.key = self.key_stack[ply]
+        self.material = self.material_stack[ply]
 
-            beta = min(beta, value)
-            if beta <= alpha:
+    cdef void make_null(self) noexcept nogil:
+        cdef int ply = self.ply
+        self.move_stack[ply] = 0
+        self.captured_stack[ply] = 0
+        self.key_stack[ply] = self.key
+        self.material_stack[ply] = self.material
+        self.key ^= ZOBRIST_SIDE
+        self.turn ^= 1
+        self.ply = ply + 1
+
+    cdef void unmake_null(self) noexcept nogil:
+        self.ply -= 1
+        self.turn ^= 1
+        self.key = self.key_stack[self.ply]
+
+    # --- 利き ---
+    cdef bint is_attacked(self, int square, int color) noexcept nogil:
+        cdef int i, j, code, s
+        for i in range(STEP_ATT_N[color][square]):
+            if STEP_ATT_MASK[color][square][i] >> self.board[STEP_ATT_FROM[color][square][i]] & 1:
+                return True
+        for i in range(SLIDER_N[color][square]):
+            for j in range(SLIDER_LEN[color][square][i]):
+                code = self.board[SLIDER_SQ[color][square][i][j]]
+                if code:
+                    if SLIDER_MASK[color][square][i] >> code & 1:
+                        return True
+                    break
+        return False
+
+    cdef int attackers(self, int square, int color, int *out) noexcept nogil:
+        """squareに利いているcolor側の駒の升を out に入れ、数を返す"""
+        cdef int i, j, code, s
+        cdef int n = 0
+        for i in range(STEP_ATT_N[color][square]):
+            s = STEP_ATT_FROM[color][square][i]
+            if STEP_ATT_MASK[color][square][i] >> self.board[s] & 1:
+                out[n] = s
+                n += 1
+        for i in range(SLIDER_N[color][square]):
+            for j in range(SLIDER_LEN[color][square][i]):
+                s = SLIDER_SQ[color][square][i][j]
+                code = self.board[s]
+                if code:
+                    if SLIDER_MASK[color][square][i] >> code & 1:
+                        out[n] = s
+                        n += 1
+                    break
+        return n
+
+    cdef bint in_check(self) noexcept nogil:
+        cdef int king = self.king_squares[self.turn]
+        return king >= 0 and self.is_attacked(king, self.turn ^ 1)
+
+    # --- 指し手生成 ---
+    cdef inline bint own(self, int code, int color) noexcept nogil:
+        return code != 0 and code >> 4 == color
+
+    cdef int generate_moves(self, int32_t *moves) noexcept nogil:
+        """疑似合法手（MyAI.Position.generate_moves と同じ）"""
+        cdef int us = self.turn
+        cdef int n = 0
+        cdef int pawn_files = 0
+        cdef int pawn_code = PAWN | us << 4
+        cdef int from_square, to_square, code, target, base, i, j, piece_type, count
+        cdef bint promotable, from_zone
+        cdef int drop_codes[7]
+        cdef int drop_bases[7]
+        cdef int drops = 0
+        for from_square in range(81):
+            code = self.board[from_square]
+            if not code or code >> 4 != us:
+                continue
+            if code == pawn_code:
+                pawn_files |= 1 << from_square % 9
+            base = from_square << 7
+            promotable = CAN_PROMOTE[code]
+            from_zone = ZONE[us][from_square]
+            for i in range(STEP_N[code][from_square]):
+                to_square = STEP_TO[code][from_square][i]
+                if self.own(self.board[to_square], us):
+                    continue
+                if promotable and (from_zone or ZONE[us][to_square]):
+                    moves[n] = to_square | base | PROMOTION_FLAG
+                    n += 1
+                    if DEAD[code][to_square]:
+                        continue
+                moves[n] = to_square | base
+                n += 1
+            for i in range(RAY_N[code][from_square]):
+                for j in range(RAY_LEN[code][from_square][i]):
+                    to_square = RAY_SQ[code][from_square][i][j]
+                    target = self.board[to_square]
+                    if self.own(target, us):
+                        break
+                    if promotable and (from_zone or ZONE[us][to_square]):
+                        moves[n] = to_square | base | PROMOTION_FLAG
+                        n += 1
+                        if not DEAD[code][to_square]:
+                            moves[n] = to_square | base
+                            n += 1
+                    else:
+                        moves[n] = to_square | base
+                        n += 1
+                    if target:
+                        break
+
+        # 持ち駒を打つ手
+        for piece_type in range(PAWN, KING):
+            if self.hands[us * 8 + piece_type]:
+                drop_codes[drops] = piece_type | us << 4
+                drop_bases[drops] = (81 + piece_type) << 7
+                drops += 1
+        if drops:
+            for to_square in range(81):
+                if self.board[to_square]:
+                    continue
+                for i in range(drops):
+                    code = drop_codes[i]
+                    if DEAD[code][to_square]:
+                        continue
+                    if code == pawn_code and pawn_files >> to_square % 9 & 1:
+                        continue
+                    moves[n] = to_square | drop_bases[i]
+                    n += 1
+        return n
+
+    cdef int generate_captures(self, int32_t *moves) noexcept nogil:
+        """駒を取る疑似合法手だけ"""
+        cdef int us = self.turn
+        cdef int n = 0
+        cdef int from_square, to_square, code, target, base, i, j
+        cdef bint promotable, from_zone
+        for from_square in range(81):
+            code = self.board[from_square]
+            if not code or code >> 4 != us:
+                continue
+            base = from_square << 7
+            promotable = CAN_PROMOTE[code]
+            from_zone = ZONE[us][from_square]
+            for i in range(STEP_N[code][from_square]):
+                to_square = STEP_TO[code][from_square][i]
+                if not self.own(self.board[to_square], us ^ 1):
+                    continue
+                if promotable and (from_zone or ZONE[us][to_square]):
+                    moves[n] = to_square | base | PROMOTION_FLAG
+                    n += 1
+                    if DEAD[code][to_square]:
+                        continue
+                moves[n] = to_square | base
+                n += 1
+            for i in range(RAY_N[code][from_square]):
+                for j in range(RAY_LEN[code][from_square][i]):
+                    to_square = RAY_SQ[code][from_square][i][j]
+                    target = self.board[to_square]
+                    if not target:
+                        continue
+                    if target >> 4 != us:
+                        if promotable and (from_zone or ZONE[us][to_square]):
+                            moves[n] = to_square | base | PROMOTION_FLAG
+                            n += 1
+                            if not DEAD[code][to_square]:
+                                moves[n] = to_square | base
+                                n += 1
+                        else:
+                            moves[n] = to_square | base
+                            n += 1
+                    break
+        return n
+
+    cdef bint is_legal(self, int32_t move, bint in_check) noexcept nogil:
+        """疑似合法手が合法か（王手放置・打ち歩詰め）"""
+        cdef int us = self.turn
+        cdef int from_square = (move >> 7) & 127
+        cdef int king = self.king_squares[us]
+        cdef int them_king
+        cdef bint pawn_drop = False
+        cdef bint legal
+        if from_square >= 81:
+            if from_square - 81 == PAWN:
+                them_king = self.king_squares[us ^ 1]
+                pawn_drop = them_king >= 0 and them_king == (move & 127) + (9 if us else -9)
+            if not in_check and not pawn_drop:
+                return True
+        elif (
+            not in_check
+            and self.board[from_square] & 15 != KING
+            and (king < 0 or not ALIGNED[king][from_square])
+        ):
+            return True
+        self.make(move)
+        king = self.king_squares[us]
+        legal = king < 0 or not self.is_attacked(king, us ^ 1)
+        if legal and pawn_drop and not self.has_legal_move():
+            legal = False  # 打ち歩詰め
+        self.unmake()
+        return legal
+
+    cdef bint has_legal_move(self) noexcept nogil:
+        cdef int32_t moves[MAX_MOVES]
+        cdef int n = self.generate_moves(moves)
+        cdef bint check = self.in_check()
+        cdef int i
+        for i in range(n):
+            if self.is_legal(moves[i], check):
+                return True
+        return False
+
+    cdef bint is_legal_move(self, int32_t move) noexcept nogil:
+        cdef int32_t moves[MAX_MOVES]
+        cdef int n = self.generate_moves(moves)
+        cdef int i
+        for i in range(n):
+            if moves[i] == move:
+                return self.is_legal(move, self.in_check())
+        return False
+
+    cdef int repetition(self) noexcept nogil:
+        """MyAI.Position.repetition と同じ（繰り返していなければ NO_REPETITION）"""
+        cdef int ply = self.ply
+        cdef int i = ply - 2
+        cdef int j
+        cdef bint us_checked = True
+        cdef bint them_checked = True
+        while i >= 0 and self.key_stack[i] != self.key:
+            i -= 2
+        if i < 0:
+            return NO_REPETITION
+        for j in range(i, ply):
+            if self.move_stack[j] == 0:
+                return NO_REPETITION  # null moveをまたぐ
+        self.check_stack[ply] = self.in_check()
+        for j in range(i + 1, ply + 1):
+            if (ply - j) % 2:
+                them_checked = them_checked and self.check_stack[j]
+            else:
+                us_checked = us_checked and self.check_stack[j]
+        if them_checked:
+            return -1
+        if us_checked:
+            return 1
+        return 0
+
+    cdef int64_t perft_nodes(self, int depth, int ply) noexcept nogil:
+        cdef int32_t *moves = self.move_buffer + ply * MAX_MOVES
+        cdef int n = self.generate_moves(moves)
+        cdef bint check = self.in_check()
+        cdef int64_t nodes = 0
+        cdef int i
+        for i in range(n):
+            if not self.is_legal(moves[i], check):
+                continue
+            if depth == 1:
+                nodes += 1
+            else:
+                self.make(moves[i])
+                nodes += self.perft_nodes(depth - 1, ply + 1)
+                self.unmake()
+        return nodes
+
+    # --- 評価 ---
+    cdef int static_value(self) noexcept nogil:
+        return -self.material if self.turn else self.material
+
+    cdef int see(self, int32_t move) noexcept nogil:
+        """取り合いの損得（MyAI.Position.see と同じ）"""
+        cdef int to_square = move & 127
+        cdef int from_square = (move >> 7) & 127
+        cdef int code = self.board[from_square]
+        cdef int gains[40]
+        cdef int removed_squares[40]
+        cdef uint8_t removed_codes[40]
+        cdef int squares[24]
+        cdef int n_gains = 1
+        cdef int n_removed = 1
+        cdef int on_square, side, count, i, best, square
+        if move & PROMOTION_FLAG:
+            code = PROMOTED_CODE[code]
+        gains[0] = SEE_VALUES[self.board[to_square] & 15]
+        on_square = SEE_VALUES[code & 15]
+        removed_squares[0] = from_square
+        removed_codes[0] = self.board[from_square]
+        self.board[from_square] = 0
+        side = self.turn ^ 1
+        while n_gains < 40:
+            count = self.attackers(to_square, side, squares)
+            if not count:
                 break
-        return value, best_move
+            best = squares[0]
+            for i in range(1, count):
+                if SEE_VALUES[self.board[squares[i]] & 15] < SEE_VALUES[self.board[best] & 15]:
+                    best = squares[i]
+            gains[n_gains] = on_square - gains[n_gains - 1]
+            n_gains += 1
+            on_square = SEE_VALUES[self.board[best] & 15]
+            removed_squares[n_removed] = best
+            removed_codes[n_removed] = self.board[best]
+            n_removed += 1
+            self.board[best] = 0
+            side ^= 1
+        for i in range(n_removed):
+            self.board[removed_squares[i]] = removed_codes[i]
+        for i in range(n_gains - 1, 0, -1):
+            if -gains[i - 1] > gains[i]:
+                gains[i - 1] = gains[i - 1]
+            else:
+                gains[i - 1] = -gains[i]
+        return gains[0]
+
+    # --- 置換表 ---
+    cdef int32_t tt_move(self, uint64_t key) noexcept nogil:
+        cdef uint64_t index = key & self.tt_mask
+        if self.tt_keys[index] != key:
+            return 0
+        return self.tt_data[index] & 0xFFFF
+
+    cdef void tt_store(self, uint64_t key, int depth, int score, int bound, int32_t move) noexcept nogil:
+        cdef uint64_t index = key & self.tt_mask
+        cdef uint64_t old = self.tt_data[index]
+        if (
+            old
+            and self.tt_keys[index] != key
+            and (old >> 26) & TT_GENERATION_MASK == self.generation
+            and <int>((old >> 16) & 0xFF) > depth
+        ):
+            return
+        if not move and self.tt_keys[index] == key:
+            move = old & 0xFFFF
+        if depth > 0xFF:
+            depth = 0xFF
+        self.tt_keys[index] = key
+        self.tt_data[index] = (
+            (<uint64_t>(<int64_t>score + SCORE_OFFSET) << 32)
+            | self.generation << 26
+            | <uint64_t>bound << 24
+            | <uint64_t>depth << 16
+            | <uint64_t>move
+        )
+
+    # --- 探索 ---
+    cdef bint check_limits(self) noexcept nogil:
+        """1ノードごとに呼ぶ。打ち切るならTrue（aborted を立てる）"""
+        self.nodes += 1
+        if self.stopped or (self.max_nodes and self.nodes > self.max_nodes):
+            self.aborted = 1
+        elif self.deadline > 0 and (self.nodes & 255) == 0 and myai_now() >= self.deadline:
+            self.aborted = 1
+        return self.aborted
+
+    cdef int pick(self, int32_t *moves, int32_t *scores, int i, int n) noexcept nogil:
+        """i番目以降で (評価, 手) が最大の手を i番目に持ってくる"""
+        cdef int best = i
+        cdef int j
+        cdef int32_t t
+        for j in range(i + 1, n):
+            if scores[j] > scores[best] or (scores[j] == scores[best] and moves[j] > moves[best]):
+                best = j
+        if best != i:
+            t = moves[i]
+            moves[i] = moves[best]
+            moves[best] = t
+            t = scores[i]
+            scores[i] = scores[best]
+            scores[best] = t
+        return moves[i]
+
+    cdef int quiesce(self, int alpha, int beta, int ply) noexcept nogil:
+        cdef int32_t *moves
+        cdef int32_t *scores
+        cdef int n, i, m, captured, attacker, stand_pat, score
+        cdef int32_t move
+        cdef int in_check = -1
+        if self.check_limits():
+            return 0
+        self.qnodes += 1
+        if ply > self.seldepth:
+            self.seldepth = ply
+        stand_pat = self.static_value()
+        if stand_pat >= beta:
+            return beta
+        if alpha < stand_pat:
+            alpha = stand_pat
+        if ply >= SEARCH_PLY - 1:
+            return alpha
+
+        moves = self.move_buffer + ply * MAX_MOVES
+        scores = self.score_buffer + ply * MAX_MOVES
+        n = self.generate_captures(moves)
+        m = 0
+        for i in range(n):
+            move = moves[i]
+            captured = SEE_VALUES[self.board[move & 127] & 15]
+            attacker = SEE_VALUES[self.board[(move >> 7) & 127] & 15]
+            if (
+                self.features & F_DELTA
+                and not move & PROMOTION_FLAG
+                and stand_pat + captured + DELTA_MARGIN <= alpha
+            ):
+                self.delta_pruned += 1
+                continue
+            if self.features & F_SEE and captured < attacker and self.see(move) < 0:
+                self.see_pruned += 1
+                continue
+            moves[m] = move
+            # Python版の captured * 64 - attacker // 64 と同じ（attackerは非負）
+            scores[m] = captured * 64 - attacker // 64
+            m += 1
+
+        for i in range(m):
+            move = self.pick(moves, scores, i, m)
+            if in_check < 0:
+                in_check = self.in_check()
+            if not self.is_legal(move, in_check):
+                continue
+            self.make(move)
+            score = -self.quiesce(-beta, -alpha, ply + 1)
+            self.unmake()
+            if self.aborted:
+                return 0
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    cdef void order(self, int32_t *moves, int32_t *scores, int n, int32_t first, int ply) noexcept nogil:
+        cdef int32_t killer1 = 0
+        cdef int32_t killer2 = 0
+        cdef int color = self.turn << 15
+        cdef int i, captured
+        cdef int32_t move
+        if ply < MAX_PLY:
+            killer1 = self.killers[ply][0]
+            killer2 = self.killers[ply][1]
+        for i in range(n):
+            move = moves[i]
+            captured = self.board[move & 127]
+            if move == first:
+                scores[i] = ORDER_PV
+            elif captured:
+                scores[i] = (
+                    ORDER_CAPTURE
+                    + ORDER_VALUES[captured & 15] * 256
+                    - ORDER_VALUES[self.board[(move >> 7) & 127] & 15]
+                )
+            elif move == killer1:
+                scores[i] = ORDER_KILLER + 1
+            elif move == killer2:
+                scores[i] = ORDER_KILLER
+            else:
+                scores[i] = self.history[color | move]
+
+    cdef void record_cutoff(self, int32_t move, int depth, int ply) noexcept nogil:
+        cdef int index
+        if self.board[move & 127]:
+            return
+        if ply < MAX_PLY and self.killers[ply][0] != move:
+            self.killers[ply][1] = self.killers[ply][0]
+            self.killers[ply][0] = move
+        index = self.turn << 15 | move
+        self.history[index] = min(self.history[index] + depth * depth, 1 << 24)
+
+    cdef int negamax(self, int depth, int alpha, int beta, int ply, bint null_ok,
+                     bint follow_pv) noexcept nogil:
+        """MyAI.negamax と同じ探索（手番側から見た評価値）"""
+        cdef uint64_t key, entry
+        cdef int tt_depth, tt_score, tt_bound, value, best_value, alpha_orig
+        cdef int32_t hash_move = 0
+        cdef int32_t pv_move = 0
+        cdef int32_t best_move = 0
+        cdef int32_t move
+        cdef int32_t *moves
+        cdef int32_t *scores
+        cdef int n, i, legal, reduction, window, bound
+        cdef bint pv_node, in_check, quiet, child_pv, pvs, lmr
+
+        if ply > 0:
+            value = self.repetition()
+            if value != NO_REPETITION:
+                return value * (MATE_VALUE - ply)
+        if depth <= 0 or ply >= SEARCH_PLY - 1:
+            return self.quiesce(alpha, beta, ply)
+        if self.check_limits():
+            return 0
+        if ply > self.seldepth:
+            self.seldepth = ply
+
+        # 置換表を引く
+        key = self.key
+        self.tt_probes += 1
+        if self.tt_keys[key & self.tt_mask] == key:
+            self.tt_hits += 1
+            entry = self.tt_data[key & self.tt_mask]
+            tt_depth = (entry >> 16) & 0xFF
+            tt_score = <int>(<int64_t>(entry >> 32) - SCORE_OFFSET)
+            tt_bound = (entry >> 24) & 0x3
+            hash_move = entry & 0xFFFF
+            if tt_score >= MATE_BOUND:
+                tt_score -= ply
+            elif tt_score <= -MATE_BOUND:
+                tt_score += ply
+            if ply > 0 and tt_depth >= depth:
+                if (
+                    tt_bound == EXACT
+                    or (tt_bound == LOWER and tt_score >= beta)
+                    or (tt_bound == UPPER and tt_score <= alpha)
+                ):
+                    return tt_score
+
+        pv_node = beta - alpha > 1
+        in_check = self.in_check()
+        self.check_stack[self.ply] = in_check
+
+        # null move
+        if (
+            null_ok
+            and not pv_node
+            and not in_check
+            and depth >= NULL_MOVE_MIN_DEPTH
+            and self.features & F_NULL_MOVE
+            and self.static_value() >= beta
+        ):
+            self.make_null()
+            value = -self.negamax(
+                depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1, False, False
+            )
+            self.unmake_null()
+            if self.aborted:
+                return 0
+            if value >= beta:
+                self.null_cutoffs += 1
+                return beta
+
+        alpha_orig = alpha
+        best_value = -C_INF - 1
+        if follow_pv and ply < self.pv_length:
+            pv_move = self.pv_line[ply]
+        pvs = self.features & F_PVS
+        lmr = self.features & F_LMR and depth >= LMR_MIN_DEPTH and not in_check
+
+        moves = self.move_buffer + ply * MAX_MOVES
+        scores = self.score_buffer + ply * MAX_MOVES
+        n = self.generate_moves(moves)
+        self.order(moves, scores, n, pv_move if pv_move else hash_move, ply)
+        legal = 0
+        for i in range(n):
+            move = self.pick(moves, scores, i, n)
+            if not self.is_legal(move, in_check):
+                continue
+            quiet = not self.board[move & 127] and not move & PROMOTION_FLAG
+            child_pv = follow_pv and move == pv_move
+            self.make(move)
+            if legal == 0:
+                value = -self.negamax(depth - 1, -beta, -alpha, ply + 1, True, child_pv)
+            else:
+                window = -alpha - 1 if pvs else -beta
+                reduction = 0
+                if lmr and quiet and legal >= LMR_MIN_MOVES and not self.in_check():
+                    reduction = 1 if legal < LMR_DEEP_MOVES else 2
+                    self.reductions += 1
+                    value = -self.negamax(
+                        depth - 1 - reduction, window, -alpha, ply + 1, True, child_pv
+                    )
+                if not self.aborted and (not reduction or value > alpha):
+                    value = -self.negamax(depth - 1, window, -alpha, ply + 1, True, child_pv)
+                    if not self.aborted and pvs and alpha < value < beta:
+                        self.researches += 1
+                        value = -self.negamax(depth - 1, -beta, -alpha, ply + 1, True, child_pv)
+            self.unmake()
+            if self.aborted:
+                return 0
+
+            if value > best_value:
+                best_value = value
+                best_move = move
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        self.record_cutoff(move, depth, ply)
+                        self.cutoffs[min(legal, CUTOFF_BUCKETS - 1)] += 1
+                        break
+            legal += 1
 
-# --- 最良手取得 ---
-cpdef object get_best_move(object board, int depth, bint turn=True):
-    return explore_moves(board, depth, turn)[1]
\ No newline at end of file
+        if not best_move:
+            best_value = -(MATE_VALUE - ply)  # 指せる手がない
+        if best_value <= alpha_orig:
+            bound = UPPER
+        elif best_value >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        if best_value >= MATE_BOUND:
+            self.tt_store(key, depth, best_value + ply, bound, best_move)
+        elif best_value <= -MATE_BOUND:
+            self.tt_store(key, depth, best_value - ply, bound, best_move)
+        else:
+            self.tt_store(key, depth, best_value, bound, best_move)
+        if ply == 0:
+            self.root_move = best_move
+        return best_value
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import shogi
+
+import MyAI
+
+# --- 棋譜の一括解析 ---
+# 棋譜の全局面をプロセスプールに配って探索し、1局面ずつ <棋譜>.analysis.jsonl に追記する。
+# 途中で止めても、次に同じコマンドを実行すれば終わっていない局面だけを解析する。
+# 全局面がそろったら悪手の印を付けて <棋譜>.analysis.json と（KIFなら）<棋譜>.analyzed.kif を書く。
+BLUNDER_CP = 300  # 指した側から見て評価値がこれ以上下がった手を悪手とする
+ANALYZED_KIF = ".analyzed.kif"
+
+
+def analyze_position(sfen, usi_moves, depth, time_ms, nodes):
+    """ワーカー: sfenから usi_moves を指した局面を探索する。評価値は先手から見たcp"""
+    board = shogi.Board(sfen)
+    for usi in usi_moves:
+        board.push_usi(usi)
+    value, move, pv, completed, stats = MyAI.iterative_deepening(
+        board, depth, time_ms, nodes
+    )
+    return {
+        "score": value,
+        "best": move.usi() if move else None,
+        "pv": [m.usi() for m in pv],
+        "depth": completed,
+        "nodes": stats.nodes,
+        "cached": stats.cache_depth,  # 解析キャッシュにあった深さ（なければ0）
+    }
+
+
+def open_cache(path, size_mb):
+    """ワーカーの初期化: 解析キャッシュを開く（全ワーカーで同じファイルを共有する）"""
+    MyAI.open_analysis_cache(path, size_mb)
+
+
+def analysis_path(file, index, suffix):
+    base = file if index == 0 else f"{file}.{index}"
+    return base + suffix
+
+
+def load_done(path):
+    """途中までの解析結果 {手数: 結果}"""
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        for line in text.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 中断で書きかけになった行
+            done[entry["ply"]] = entry
+        if text and not text.endswith("\n"):
+            # 書きかけの行の後ろに続けて追記しないように改行しておく
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n")
+    return done
+
+
+def mark_blunders(record, entries):
+    """各手について、指す前と指した後の評価値の差（指した側から見て）で悪手を判定する"""
+    first = 1 if shogi.Board(record["sfen"]).turn == shogi.BLACK else -1
+    for ply, entry in enumerate(entries):
+        entry["move"] = record["moves"][ply] if ply < len(record["moves"]) else None
+        entry["loss"] = None
+        entry["blunder"] = False
+        if entry["move"] is None or ply + 1 >= len(entries):
+            continue
+        before, after = entry["score"], entries[ply + 1]["score"]
+        if before is None or after is None:
+            continue
+        sign = -first if ply % 2 else first
+        entry["loss"] = (before - after) * sign
+        entry["blunder"] = entry["loss"] >= BLUNDER_CP
+
+
+def read_text(file):
+    for encoding in ("utf-8-sig", "cp932"):
+        try:
+            with open(file, encoding=encoding) as f:
+                return f.read(), encoding
+        except UnicodeDecodeError:
+            pass
+    raise ValueError(f"{file}: 文字コードが分かりません")
+
+
+MOVE_LINE = re.compile(r"^\s*(\d+)\s+\S")
+
+
+def format_comment(entry):
+    score = "-" if entry["score"] is None else f"{entry['score']:+d}"
+    comment = f"*MyAI 評価値 {score} 最善手 {entry['best']} 読み筋 {' '.join(entry['pv'])}"
+    if entry.get("blunder"):
+        comment += f" 悪手({entry['loss']})"
+    return comment
+
+
+def write_kif(file, entries, output):
+    """元のKIFの各指し手の行の後に、その手を指した後の局面の解析をコメントで入れる"""
+    text, encoding = read_text(file)
+    lines = text.splitlines()
+    result = []
+    in_moves = False
+    for line in lines:
+        result.append(line)
+        if line.startswith("手数----"):
+            in_moves = True
+            if entries:
+                result.append(format_comment(entries[0]))
+            continue
+        match = MOVE_LINE.match(line) if in_moves else None
+        if match:
+            ply = int(match.group(1))
+            if ply < len(entries):
+                result.append(format_comment(entries[ply]))
+    with open(output, "w", encoding=encoding) as f:
+        f.write("\n".join(result) + "\n")
+
+
+def analyze(
+    paths,
+    depth=4,
+    time_ms=None,
+    nodes=None,
+    workers=None,
+    kif=True,
+    cache_path=MyAI.CACHE_PATH,
+    cache_mb=64,
+):
+    """棋譜ファイル・ディレクトリを解析する。すでに解析済みの局面は飛ばす
+
+    cache_path（Noneで使わない）の解析キャッシュを全ワーカーで共有し、前に読んだ局面は
+    その深さの続きから読む。
+    """
+    games = []  # (ファイル, 棋譜の番号, 棋譜, jsonlのパス)
+    index = {}
+    for file, record in MyAI.iter_records(paths):
+        if file.endswith(ANALYZED_KIF):
+            continue  # 前回の出力
+        n = index.get(file, 0)
+        index[file] = n + 1
+        games.append((file, n, record, analysis_path(file, n, ".analysis.jsonl")))
+
+    start = time.perf_counter()
+    analyzed = 0
+    cache_hits = 0
+    initializer, initargs = None, ()
+    if cache_path is not None:
+        # ワーカーが同時に作らないように、先に作っておく
+        MyAI.AnalysisCache(cache_path, cache_mb).close()
+        initializer, initargs = open_cache, (cache_path, cache_mb)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, initargs=initargs
+    ) as pool:
+        futures = {}
+        for game in games:
+            file, n, record, path = game
+            done = load_done(path)
+            for ply in range(len(record["moves"]) + 1):
+                if ply not in done:
+                    future = pool.submit(
+                        analyze_position,
+                        record["sfen"],
+                        record["moves"][:ply],
+                        depth,
+                        time_ms,
+                        nodes,
+                    )
+                    futures[future] = (path, ply)
+        for future in as_completed(futures):
+            path, ply = futures[future]
+            entry = {"ply": ply, **future.result()}
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            analyzed += 1
+            cache_hits += entry["cached"] > 0
+            print(f"{path} {ply}手目 {entry['score']} {entry['best']}", file=sys.stderr)
+
+    for file, n, record, path in games:
+        done = load_done(path)
+        entries = [done[ply] for ply in sorted(done)]
+        mark_blunders(record, entries)
+        with open(analysis_path(file, n, ".analysis.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {"file": file, "sfen": record["sfen"], "win": record.get("win"), "plies": entries},
+                f,
+                ensure_ascii=False,
+                indent=1,
+            )
+        if kif and n == 0 and file.lower().endswith((".kif", ".kifu")):
+            write_kif(file, entries, os.path.splitext(file)[0] + ANALYZED_KIF)
+    seconds = time.perf_counter() - start
+    return {
+        "games": len(games),
+        "positions": analyzed,
+        "cache_hits": cache_hits,
+        "seconds": round(seconds, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="analyze")
+    parser.add_argument("paths", nargs="+", help="KIF/CSAファイルかディレクトリ")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--time-ms", type=int, default=None, help="1局面あたりの時間")
+    parser.add_argument("--nodes", type=int, default=None, help="1局面あたりのノード数")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-kif", action="store_true", help="KIFへのコメント出力をしない")
+    parser.add_argument("--cache", default=MyAI.CACHE_PATH, help="解析キャッシュのファイル")
+    parser.add_argument("--cache-mb", type=int, default=64)
+    parser.add_argument("--no-cache", action="store_true", help="解析キャッシュを使わない")
+    args = parser.parse_args()
+    print(
+        analyze(
+            args.paths,
+            args.depth,
+            args.time_ms,
+            args.nodes,
+            args.workers,
+            not args.no_kif,
+            None if args.no_cache else args.cache,
+            args.cache_mb,
+        )
+    )
@@ -0,0 +1,223 @@
+import os
+
+import numpy as np
+import shogi
+
+import MyAI
+
+# --- NumPyによる駒得＋駒の位置の評価 ---
+# 局面を 盤面81マスの駒コード（駒種 | 手番 << 4）と持ち駒16個の枚数 で表し、
+# 駒得・駒の位置（piece-square）・玉との相対位置（自玉の守り / 敵玉への攻め）の表を
+# NumPyの添字参照でまとめて引く。値はcp（歩=100）で、先手から見た値。
+#
+# 表は先手の駒の分だけ持ち、後手の駒は盤を180度回して符号を反転したものを使う。
+#   pst[駒種][マス]            駒種ごとのマスの点
+#   own_king[駒種][相対位置]   自玉から見た位置の点（守り駒）
+#   enemy_king[駒種][相対位置] 敵玉から見た位置の点（攻め駒）
+# 相対位置は (段の差 + 8) * 17 + (筋の差 + 8) の 0..288。
+PIECE_TYPES = 16
+RELATIVE = 17 * 17
+SQUARES = np.arange(81)
+# tune.py --tables で合わせた表。あれば TableEvaluator() の初期値になる
+TABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tables.npz")
+
+
+def _relative_table():
+    """RELATIVE_INDEX[手番][玉のマス][駒のマス]"""
+    rows, cols = SQUARES // 9, SQUARES % 9
+    dy = rows[None, :] - rows[:, None]
+    dx = cols[None, :] - cols[:, None]
+    black = (dy + 8) * 17 + (dx + 8)
+    # 後手の駒は盤を回して先手の表で引く
+    white = black[::-1, ::-1]
+    return np.stack([black, white])
+
+
+RELATIVE_INDEX = _relative_table()
+RELATIVE_LISTS = RELATIVE_INDEX.tolist()
+
+
+def chebyshev(index):
+    dy, dx = np.divmod(index, 17)
+    return np.maximum(abs(dy - 8), abs(dx - 8))
+
+
+def default_tables():
+    """手で決めた初期値の表（玉の囲い・守り駒・攻め駒）"""
+    pst = np.zeros((PIECE_TYPES, 81), dtype=np.int32)
+    own_king = np.zeros((PIECE_TYPES, RELATIVE), dtype=np.int32)
+    enemy_king = np.zeros((PIECE_TYPES, RELATIVE), dtype=np.int32)
+
+    # 玉は自陣の下段ほど安全
+    rows = SQUARES // 9
+    pst[shogi.KING] = np.select([rows >= 7, rows == 6], [40, 10], -30 * (6 - rows))
+
+    distance = chebyshev(np.arange(RELATIVE))
+    near = np.select([distance == 1, distance == 2, distance == 3], [1.0, 0.5, 0.2], 0.0)
+    # 金銀（と成駒）は自玉の近くにいると守りになる
+    for piece_type, value in (
+        (shogi.GOLD, 40),
+        (shogi.SILVER, 30),
+        (shogi.PROM_PAWN, 20),
+        (shogi.PROM_LANCE, 20),
+        (shogi.PROM_KNIGHT, 20),
+        (shogi.PROM_SILVER, 25),
+    ):
+        own_king[piece_type] = (near * value).astype(np.int32)
+    # 敵玉の近くにいる駒は攻めになる
+    for piece_type, value in (
+        (shogi.PAWN, 10),
+        (shogi.LANCE, 15),
+        (shogi.KNIGHT, 20),
+        (shogi.SILVER, 30),
+        (shogi.GOLD, 30),
+        (shogi.BISHOP, 20),
+        (shogi.ROOK, 25),
+        (shogi.PROM_PAWN, 30),
+        (shogi.PROM_LANCE, 30),
+        (shogi.PROM_KNIGHT, 30),
+        (shogi.PROM_SILVER, 30),
+        (shogi.PROM_BISHOP, 40),
+        (shogi.PROM_ROOK, 50),
+    ):
+        enemy_king[piece_type] = (near * value).astype(np.int32)
+    return {"pst": pst, "own_king": own_king, "enemy_king": enemy_king}
+
+
+def load_tables(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+class TableEvaluator(MyAI.ShogiAI):
+    """ShogiAIの駒得（差分更新）に、NumPyの表による位置の評価を足す
+
+    iterative_deepening(..., evaluator=TableEvaluator()) のように渡すと、
+    静止探索のstand patと末端の評価に positional が加わる。
+    探索は1局面ずつ positional を呼ぶ。evaluate_children / evaluate_sfens は
+    まとめて評価するとき（学習・解析）用で、探索からは使わない。
+    """
+
+    def __init__(self, piece_value_dict=None, tables=None, debug=False):
+        if piece_value_dict is None:
+            piece_value_dict = MyAI.PIECE_VALUE_DICT
+        super().__init__(piece_value_dict, debug)
+        if tables is None:
+            tables = load_tables(TABLES_PATH) if os.path.exists(TABLES_PATH) else default_tables()
+        self.set_tables(tables)
+
+    def set_tables(self, tables):
+        """先手の駒の表から、駒コード（0..31）で引く表を作る"""
+        self.tables = {name: np.asarray(table, dtype=np.int32) for name, table in tables.items()}
+        pst = np.zeros((32, 81), dtype=np.int32)
+        own_king = np.zeros((32, RELATIVE), dtype=np.int32)
+        enemy_king = np.zeros((32, RELATIVE), dtype=np.int32)
+        pst[:PIECE_TYPES] = self.tables["pst"]
+        pst[PIECE_TYPES:] = -self.tables["pst"][:, ::-1]
+        own_king[:PIECE_TYPES] = self.tables["own_king"]
+        own_king[PIECE_TYPES:] = -self.tables["own_king"]
+        enemy_king[:PIECE_TYPES] = self.tables["enemy_king"]
+        enemy_king[PIECE_TYPES:] = -self.tables["enemy_king"]
+        for table in (pst, own_king, enemy_king):
+            table[0] = 0  # 空きマス
+        self.pst, self.own_king, self.enemy_king = pst, own_king, enemy_king
+        # 1局面ずつ引く positional 用（NumPyを1行だけ呼ぶより速い）
+        self.pst_lists = pst.tolist()
+        self.own_king_lists = own_king.tolist()
+        self.enemy_king_lists = enemy_king.tolist()
+        self.material_table = np.array(self.board_values, dtype=np.int32)
+        hand = np.zeros(16, dtype=np.int32)
+        for index in range(16):
+            hand[index] = self.hand_values[(index >> 3) * 16 + (index & 7)]
+        self.hand_table = hand
+
+    @classmethod
+    def load(cls, path, piece_value_dict=None):
+        return cls(piece_value_dict, load_tables(path))
+
+    def save(self, path):
+        np.savez(path, **self.tables)
+
+    # --- 配列での評価 ---
+    def evaluate_arrays(self, boards, hands, kings, material=True):
+        """boards (n, 81) の駒コード、hands (n, 16) の枚数、kings (n, 2) の玉のマスをまとめて評価"""
+        boards = np.asarray(boards, dtype=np.intp)
+        colors = boards >> 4
+        kings = np.asarray(kings, dtype=np.intp)
+        own = np.where(colors == 0, kings[:, :1], kings[:, 1:])
+        enemy = np.where(colors == 0, kings[:, 1:], kings[:, :1])
+        scores = (
+            self.pst[boards, SQUARES]
+            + self.own_king[boards, RELATIVE_INDEX[colors, own, SQUARES]]
+            + self.enemy_king[boards, RELATIVE_INDEX[colors, enemy, SQUARES]]
+        ).sum(axis=1)
+        if material:
+            scores += self.material_table[boards].sum(axis=1)
+            scores += np.asarray(hands, dtype=np.int32) @ self.hand_table
+        return scores
+
+    def positional(self, pos):
+        """探索中の局面の位置の評価（駒得はPosition側で差分計算している）
+
+        静止探索の全ノードで呼ばれるので、NumPyではなくリストで引く。
+        値は evaluate_arrays(..., material=False) と同じ。
+        """
+        pst, own_king, enemy_king = self.pst_lists, self.own_king_lists, self.enemy_king_lists
+        black, white = (max(square, 0) for square in pos.king_squares)
+        black_own, black_enemy = RELATIVE_LISTS[0][black], RELATIVE_LISTS[0][white]
+        white_own, white_enemy = RELATIVE_LISTS[1][white], RELATIVE_LISTS[1][black]
+        value = 0
+        for square, code in enumerate(pos.board):
+            if not code:
+                continue
+            if code < PIECE_TYPES:
+                value += (
+                    pst[code][square]
+                    + own_king[code][black_own[square]]
+                    + enemy_king[code][black_enemy[square]]
+                )
+            else:
+                value += (
+                    pst[code][square]
+                    + own_king[code][white_own[square]]
+                    + enemy_king[code][white_enemy[square]]
+                )
+        return value
+
+    def evaluate_children(self, pos, moves=None):
+        """posの子局面（省略時は全合法手）を1回の呼び出しで評価し、(手, 先手から見た値の配列) を返す"""
+        if moves is None:
+            moves = pos.legal_moves()
+        n = len(moves)
+        boards = np.empty((n, 81), dtype=np.uint8)
+        hands = np.empty((n, 16), dtype=np.uint8)
+        kings = np.empty((n, 2), dtype=np.intp)
+        for i, move in enumerate(moves):
+            pos.make(move)
+            boards[i] = np.frombuffer(pos.board, dtype=np.uint8)
+            hands[i] = np.frombuffer(pos.hands, dtype=np.uint8)
+            kings[i] = pos.king_squares
+            pos.unmake()
+        return moves, self.evaluate_arrays(boards, hands, kings.clip(0))
+
+    def evaluate_sfens(self, sfens):
+        """SFENのリストをまとめて評価し、先手から見た値の配列を返す"""
+        boards, hands, kings = position_arrays(
+            MyAI.Position.from_sfen(sfen, self) for sfen in sfens
+        )
+        return self.evaluate_arrays(boards, hands, kings)
+
+
+def position_arrays(positions):
+    """Positionの並びを (boards, hands, kings) の配列にする"""
+    boards, hands, kings = [], [], []
+    for pos in positions:
+        boards.append(bytes(pos.board))
+        hands.append(bytes(pos.hands))
+        kings.append(pos.king_squares)
+    n = len(boards)
+    return (
+        np.frombuffer(b"".join(boards), dtype=np.uint8).reshape(n, 81),
+        np.frombuffer(b"".join(hands), dtype=np.uint8).reshape(n, 16),
+        np.array(kings, dtype=np.intp).reshape(n, 2).clip(0),
+    )
@@ -0,0 +1,249 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+import shogi
+
+import MyAI
+
+# --- 棋譜データベース ---
+# SQLiteに 対局（games）・指し手（moves）・局面キー→(対局, 手数) の索引（positions）を持つ。
+# 局面キーはMyAIのZobristキー（64bit符号なし）を符号付きに直して入れる。
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    source TEXT,
+    black TEXT,
+    white TEXT,
+    win TEXT,
+    sfen TEXT NOT NULL,
+    plies INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS moves (
+    game_id INTEGER NOT NULL,
+    ply INTEGER NOT NULL,
+    usi TEXT NOT NULL,
+    PRIMARY KEY (game_id, ply)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS positions (
+    key INTEGER NOT NULL,
+    game_id INTEGER NOT NULL,
+    ply INTEGER NOT NULL,
+    PRIMARY KEY (key, game_id, ply)
+) WITHOUT ROWID;
+"""
+
+
+def signed_key(key):
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class GameDB:
+    """棋譜を並べて局面で引けるようにするデータベース"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def add_game(self, record, source=None):
+        """棋譜1局を入れて対局IDを返す（commitは呼び出し側）"""
+        names = record.get("names") or [None, None]
+        pos = MyAI.Position.from_sfen(record["sfen"])
+        moves = []
+        keys = [pos.key]
+        for usi in record["moves"]:
+            move = MyAI.encode_move(shogi.Move.from_usi(usi))
+            if not pos.is_legal_move(move):
+                print(f"{source}: {pos.ply + 1}手目 {usi} は指せません", file=sys.stderr)
+                break
+            pos.make(move)
+            moves.append(usi)
+            keys.append(pos.key)
+
+        cursor = self.conn.execute(
+            "INSERT INTO games (source, black, white, win, sfen, plies) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (source, names[0], names[1], record.get("win"), record["sfen"], len(moves)),
+        )
+        game_id = cursor.lastrowid
+        self.conn.executemany(
+            "INSERT INTO moves VALUES (?, ?, ?)",
+            [(game_id, ply, usi) for ply, usi in enumerate(moves)],
+        )
+        # 同じ対局で同じ局面に戻った場合（千日手など）も手数ごとに入れる
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO positions VALUES (?, ?, ?)",
+            [(signed_key(key), game_id, ply) for ply, key in enumerate(keys)],
+        )
+        return game_id
+
+    def ingest(self, paths):
+        """KIF/CSAファイル・ディレクトリを取り込む。前回から変わっていないファイルは飛ばす
+
+        (取り込んだ対局数, 飛ばしたファイル数) を返す。
+        """
+        games = 0
+        skipped = set()
+        seen = {}
+        for file, record in MyAI.iter_records(paths):
+            if file not in seen:
+                stat = os.stat(file)
+                row = self.conn.execute(
+                    "SELECT size, mtime FROM sources WHERE path = ?", (file,)
+                ).fetchone()
+                if row == (stat.st_size, stat.st_mtime):
+                    skipped.add(file)
+                else:
+                    # 変わったファイルは入れ直す
+                    self.remove_source(file)
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+                        (file, stat.st_size, stat.st_mtime),
+                    )
+                seen[file] = True
+            if file in skipped:
+                continue
+            self.add_game(record, file)
+            games += 1
+        self.conn.commit()
+        return games, len(skipped)
+
+    def remove_source(self, file):
+        ids = [
+            (row[0],)
+            for row in self.conn.execute("SELECT id FROM games WHERE source = ?", (file,))
+        ]
+        self.conn.executemany("DELETE FROM positions WHERE game_id = ?", ids)
+        self.conn.executemany("DELETE FROM moves WHERE game_id = ?", ids)
+        self.conn.executemany("DELETE FROM games WHERE id = ?", ids)
+
+    def lookup_key(self, key, limit=None):
+        """局面キーに着いた対局を [(対局ID, 手数, 次の指し手 or None)] で返す"""
+        sql = (
+            "SELECT p.game_id, p.ply, m.usi FROM positions p "
+            "LEFT JOIN moves m ON m.game_id = p.game_id AND m.ply = p.ply "
+            "WHERE p.key = ?"
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.conn.execute(sql, (signed_key(key),)).fetchall()
+
+    def lookup_sfen(self, sfen, limit=None):
+        return self.lookup_key(MyAI.Position.from_sfen(sfen).key, limit)
+
+    def next_moves(self, sfen):
+        """局面の次の一手の集計 {指し手: 出現数}"""
+        counts = {}
+        for _, _, usi in self.lookup_sfen(sfen):
+            if usi is not None:
+                counts[usi] = counts.get(usi, 0) + 1
+        return counts
+
+    def game(self, game_id):
+        row = self.conn.execute(
+            "SELECT source, black, white, win, sfen, plies FROM games WHERE id = ?",
+            (game_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        moves = [
+            usi
+            for (usi,) in self.conn.execute(
+                "SELECT usi FROM moves WHERE game_id = ? ORDER BY ply", (game_id,)
+            )
+        ]
+        source, black, white, win, sfen, plies = row
+        return {
+            "id": game_id,
+            "source": source,
+            "names": [black, white],
+            "win": win,
+            "sfen": sfen,
+            "moves": moves,
+        }
+
+    def counts(self):
+        return {
+            table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("games", "moves", "positions")
+        }
+
+
+def throughput(paths, copies=200):
+    """棋譜を copies 回ずつメモリ上のDBに入れ、取り込みと検索の 局/秒 を測る"""
+    records = [record for _, record in MyAI.iter_records(paths)]
+    db = GameDB(":memory:")
+    start = time.perf_counter()
+    for i in range(copies):
+        for record in records:
+            db.add_game(record, f"copy{i}")
+    db.conn.commit()
+    ingest_seconds = time.perf_counter() - start
+    games = copies * len(records)
+
+    # 取り込んだ全局面を引き直す
+    queries = []
+    for record in records:
+        pos = MyAI.Position.from_sfen(record["sfen"])
+        for usi in record["moves"]:
+            queries.append(pos.key)
+            pos.make(MyAI.encode_move(shogi.Move.from_usi(usi)))
+    start = time.perf_counter()
+    hits = 0
+    for key in queries:
+        hits += len(db.lookup_key(key))
+    query_seconds = time.perf_counter() - start
+    return {
+        "games": games,
+        "ingest_games_per_sec": round(games / ingest_seconds, 1),
+        "queries": len(queries),
+        "hits": hits,
+        "queries_per_sec": round(len(queries) / query_seconds, 1),
+        "games_per_sec_matched": round(hits / query_seconds, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="gamedb")
+    parser.add_argument("--db", default="games.sqlite3")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="KIF/CSAを取り込む（追記）")
+    ingest_parser.add_argument("paths", nargs="+")
+    query_parser = commands.add_parser("query", help="SFENの局面に着いた対局と次の一手")
+    query_parser.add_argument("sfen", nargs="+")
+    bench_parser = commands.add_parser("bench", help="取り込み・検索の速度を測る")
+    bench_parser.add_argument("paths", nargs="+")
+    bench_parser.add_argument("--copies", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        print(throughput(args.paths, args.copies))
+        sys.exit()
+
+    db = GameDB(args.db)
+    if args.command == "ingest":
+        start = time.perf_counter()
+        games, skipped = db.ingest(args.paths)
+        seconds = time.perf_counter() - start
+        print(
+            f"{games}局を取り込みました（変更なしで飛ばしたファイル {skipped}） "
+            f"{games / seconds:.1f}局/秒 合計 {db.counts()}"
+        )
+    elif args.command == "query":
+        sfen = " ".join(args.sfen)
+        for game_id, ply, usi in db.lookup_sfen(sfen):
+            game = db.game(game_id)
+            print(f"#{game_id} {game['source']} {ply}手目の局面 次の手={usi} 勝者={game['win']}")
+        print(f"次の一手: {db.next_moves(sfen)}")
+    db.close()
@@ -0,0 +1,386 @@
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import shogi
+import shogi.KIF
+
+import MyAI
+
+# --- エンジン同士の対局（自己対戦） ---
+# 2つの設定のMyAIを、開始局面ごとに先後を入れ替えて対局させる。
+# 対局はワーカープロセスで並行に行い、SPRTで差がはっきりしたら残りを打ち切る。
+DEFAULT_ENGINE = {
+    "name": "MyAI",
+    "depth": 3,
+    "time_ms": None,
+    "nodes": None,
+    "values": None,  # load_piece_values で読む評価値のJSON
+    "backend": MyAI.BACKEND,  # "python" / "cython"（MyAI.BACKENDS のどれか）
+    "hash_mb": 16,
+    "features": "all",  # 探索の機能 例: "pvs+null_move"（MyAI.parse_features）
+    "eval": "material",  # "material"（駒得だけ） / "table"（evaluation.TableEvaluator）
+    "tables": None,  # eval=table で読む表（省略時は evaluation.TABLES_PATH、なければ初期値）
+}
+EVALS = ("material", "table")
+MAX_MOVES = 256  # この手数で引き分け（持将棋扱い）
+RANDOM_PLIES = 2  # 開始局面のあとにランダムに指す手数（同じ対局の繰り返しを避ける）
+
+
+def parse_engine(text, name):
+    """"depth=4,time_ms=200,values=fitted.json,eval=table" 形式のエンジン設定"""
+    engine = dict(DEFAULT_ENGINE, name=name)
+    for item in filter(None, text.split(",")):
+        key, value = item.split("=", 1)
+        if key not in engine:
+            raise ValueError(f"不明な設定です: {key}")
+        engine[key] = int(value) if key in ("depth", "time_ms", "nodes", "hash_mb") else value
+    MyAI.parse_features(engine["features"])
+    if engine["backend"] not in MyAI.BACKENDS:
+        raise ValueError(f"使えない探索部です: {engine['backend']}")
+    if engine["eval"] not in EVALS:
+        raise ValueError(f"不明な評価です: {engine['eval']}")
+    return engine
+
+
+def parse_opening(line):
+    """USIのposition形式（startpos / sfen ... [moves ...]）か、SFENだけの1行"""
+    tokens = line.split()
+    if tokens[0] == "startpos":
+        sfen, rest = shogi.STARTING_SFEN, tokens[1:]
+    else:
+        if tokens[0] == "sfen":
+            tokens = tokens[1:]
+        sfen, rest = " ".join(tokens[:4]), tokens[4:]
+    moves = rest[1:] if rest and rest[0] == "moves" else []
+    return sfen, moves
+
+
+def load_openings(path):
+    if path is None:
+        return [(sfen, []) for sfen in MyAI.BENCH_POSITIONS]
+    with open(path, encoding="utf-8") as f:
+        return [parse_opening(line) for line in f if line.strip() and not line.startswith("#")]
+
+
+def random_plies(opening, plies, rng):
+    """開始局面のあとに、詰みにならないランダムな手をplies手足す"""
+    sfen, moves = opening
+    board = shogi.Board(sfen)
+    for usi in moves:
+        board.push_usi(usi)
+    moves = list(moves)
+    for _ in range(plies):
+        candidates = sorted(board.legal_moves, key=lambda m: m.usi())
+        rng.shuffle(candidates)
+        for move in candidates:
+            board.push(move)
+            if not board.is_checkmate():
+                moves.append(move.usi())
+                break
+            board.pop()
+        else:
+            break
+    return sfen, moves
+
+
+def make_openings(openings, pairs, plies=RANDOM_PLIES, seed=0):
+    """pairs組の対局に使う、互いに異なる開始局面
+
+    エンジンは決定的なので、同じ開始局面を2組で使うと同じ対局が繰り返され、
+    SPRTが同じ結果を独立な標本として数えてしまう。足りなければValueError。
+    """
+    rng = random.Random(seed)
+    seen = set()
+    result = []
+    for pair in range(pairs):
+        base = openings[pair % len(openings)]
+        for _ in range(100 if plies else 1):
+            opening = random_plies(base, plies, rng)
+            key = (opening[0], tuple(opening[1]))
+            if key not in seen:
+                break
+        else:
+            raise ValueError(
+                f"{pairs}組の対局に異なる開始局面が足りません（{len(seen)}通り）。"
+                "開始局面を増やすか --random-plies を増やしてください"
+            )
+        seen.add(key)
+        result.append(opening)
+    return result
+
+
+class Player:
+    """1局の間だけ使うエンジン（置換表・並べ替えの表は対局ごと、エンジンごとに持つ）"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        values = MyAI.PIECE_VALUE_DICT
+        if engine["values"]:
+            values = MyAI.load_piece_values(engine["values"])
+        if engine["eval"] == "table":
+            # 位置の評価があるとCython版は使われないので、置換表はPython版のもの
+            import evaluation
+
+            tables = evaluation.load_tables(engine["tables"]) if engine["tables"] else None
+            self.evaluator = evaluation.TableEvaluator(values, tables)
+        else:
+            self.evaluator = MyAI.ShogiAI(values)
+        if engine["backend"] == "cython" and engine["eval"] == "material":
+            self.searcher = MyAI.myai_core.Searcher(engine["hash_mb"])
+            self.tt = self.ordering = None
+        else:
+            self.searcher = None
+            self.tt = MyAI.TranspositionTable(engine["hash_mb"])
+            self.ordering = MyAI.MoveOrdering()
+
+    def search(self, board):
+        engine = self.engine
+        return MyAI.iterative_deepening(
+            board,
+            engine["depth"],
+            engine["time_ms"],
+            engine["nodes"],
+            self.tt,
+            ordering=self.ordering,
+            evaluator=self.evaluator,
+            features=MyAI.parse_features(self.engine["features"]),
+            backend=engine["backend"],
+            searcher=self.searcher,
+        )[1]
+
+
+def perpetual_checker(pos, checks):
+    """千日手の局面で、同一局面が始まってから王手をかけ続けた側（なければNone）"""
+    first = pos.key_stack[: pos.ply].index(pos.key)
+    checked = [True, True]
+    for ply in range(first, pos.ply):
+        # 現局面から偶数手前に指したのは現在の手番側
+        mover = pos.turn if (pos.ply - ply) % 2 == 0 else 1 - pos.turn
+        checked[mover] = checked[mover] and checks[ply]
+    for color in shogi.COLORS:
+        if checked[color]:
+            return color
+    return None
+
+
+def play_game(game_id, opening, engines, max_moves=MAX_MOVES):
+    """ワーカー: 1局指して棋譜と結果を返す。engines は [先手, 後手] の設定"""
+    sfen, opening_moves = opening
+    board = shogi.Board(sfen)
+    for usi in opening_moves:
+        board.push_usi(usi)
+    pos = MyAI.Position.from_board(board)
+    players = [Player(engine) for engine in engines]
+    checks = [False] * pos.ply  # 各手で王手をかけたか（開始局面までの分は王手なしとする）
+    moves = []
+    winner, reason = None, "持将棋"
+
+    while True:
+        if not pos.has_legal_move():
+            winner, reason = 1 - pos.turn, "詰み"
+            break
+        if pos.repetition_count() >= 4:
+            checker = perpetual_checker(pos, checks)
+            if checker is None:
+                reason = "千日手"
+            else:
+                winner, reason = 1 - checker, "連続王手の千日手"
+            break
+        if len(moves) >= max_moves:
+            break
+        move = players[pos.turn].search(board)
+        if move is None:
+            winner, reason = 1 - pos.turn, "詰み"
+            break
+        board.push(move)
+        pos.make(MyAI.encode_move(move))
+        checks.append(pos.in_check())
+        moves.append(move.usi())
+
+    return {
+        "id": game_id,
+        "sfen": sfen,
+        "opening": opening_moves,
+        "moves": moves,
+        "names": [engine["name"] for engine in engines],
+        "winner": winner,
+        "reason": reason,
+    }
+
+
+KIF_END = {"詰み": "詰み", "千日手": "千日手", "連続王手の千日手": "反則勝ち", "持将棋": "持将棋"}
+
+
+def game_to_kif(game):
+    """対局結果をKIFの文字列にする（開始局面が平手でなければ盤面図を付ける）"""
+    names = game["names"]
+    lines = [f"先手：{names[0]}", f"後手：{names[1]}"]
+    board = shogi.Board(game["sfen"])
+    if game["sfen"] == shogi.STARTING_SFEN:
+        lines.append("手合割：平手")
+    else:
+        lines.append(board.kif_str().rstrip("\n"))
+        if board.turn == shogi.WHITE:
+            lines.append("後手番")
+    lines.append("手数----指手---------消費時間--")
+    moves = game["opening"] + game["moves"]
+    for i, usi in enumerate(moves):
+        lines.append(f"{i + 1:4d} {shogi.KIF.Exporter.kif_move_from(usi, board)}")
+        board.push_usi(usi)
+        if i + 1 == len(game["opening"]):
+            lines.append("*ここまで開始局面")
+    lines.append(f"{len(moves) + 1:4d} {KIF_END[game['reason']]}")
+    if game["winner"] is None:
+        lines.append(f"まで{len(moves)}手で{game['reason']}")
+    else:
+        side = "先手" if game["winner"] == shogi.BLACK else "後手"
+        foul = "反則" if game["reason"] == "連続王手の千日手" else ""
+        lines.append(f"まで{len(moves)}手で{side}の{foul}勝ち")
+    return "\n".join(lines) + "\n"
+
+
+def sprt(wins, draws, losses, elo0, elo1, alpha=0.05, beta=0.05):
+    """勝ち・引き分け・負けの数からSPRTの対数尤度比と上下の閾値を返す（正規近似）
+
+    分散には勝ちと負けを1つずつ仮に足す（事前分布）。全勝・全敗・全引き分けでも
+    分散が0にならず、片寄った対局でも閾値に届いて止まる。
+    """
+    lower = math.log(beta / (1 - alpha))
+    upper = math.log((1 - beta) / alpha)
+    n = wins + draws + losses
+    if n == 0:
+        return 0.0, lower, upper
+    score = (wins + draws / 2) / n
+    variance = (
+        (wins + 1) * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + (losses + 1) * score**2
+    ) / (n + 2)
+    s0 = 1 / (1 + 10 ** (-elo0 / 400))
+    s1 = 1 / (1 + 10 ** (-elo1 / 400))
+    llr = n * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
+    return llr, lower, upper
+
+
+def elo(wins, draws, losses):
+    n = wins + draws + losses
+    score = (wins + draws / 2) / n if n else 0.5
+    if score <= 0 or score >= 1:
+        return None
+    return -400 * math.log10(1 / score - 1)
+
+
+def run_match(
+    engines,
+    openings,
+    games=100,
+    workers=None,
+    max_moves=MAX_MOVES,
+    elo0=0,
+    elo1=10,
+    alpha=0.05,
+    beta=0.05,
+    out_dir=None,
+    plies=RANDOM_PLIES,
+    seed=0,
+):
+    """engines[0]（新）と engines[1]（基準）を対局させ、engines[0]から見た成績を返す
+
+    開始局面にはplies手のランダムな手を足し（seedで再現できる）、組ごとに異なる局面にする。
+    """
+    pair_openings = make_openings(openings, (games + 1) // 2, plies, seed)
+    schedule = []
+    for i in range(games):
+        opening = pair_openings[i // 2]
+        # 同じ開始局面を先後入れ替えて2局ずつ
+        order = engines if i % 2 == 0 else engines[::-1]
+        schedule.append((i, opening, list(order)))
+
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    wins = draws = losses = 0
+    reasons = {}
+    result = "未決着"
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(play_game, *game, max_moves) for game in schedule]
+        for future in as_completed(futures):
+            game = future.result()
+            new_color = 0 if game["names"][0] == engines[0]["name"] else 1
+            if game["winner"] is None:
+                draws += 1
+            elif game["winner"] == new_color:
+                wins += 1
+            else:
+                losses += 1
+            reasons[game["reason"]] = reasons.get(game["reason"], 0) + 1
+            if out_dir is not None:
+                path = os.path.join(out_dir, f"{game['id']:04d}.kif")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(game_to_kif(game))
+            llr, lower, upper = sprt(wins, draws, losses, elo0, elo1, alpha, beta)
+            print(
+                f"対局{game['id']} {game['reason']} 勝{wins} 分{draws} 負{losses} "
+                f"LLR {llr:.2f} [{lower:.2f}, {upper:.2f}]",
+                file=sys.stderr,
+            )
+            if llr >= upper:
+                result = "H1採択（強くなった）"
+                break
+            if llr <= lower:
+                result = "H0採択（強くなっていない）"
+                break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    llr, lower, upper = sprt(wins, draws, losses, elo0, elo1, alpha, beta)
+    rating = elo(wins, draws, losses)
+    return {
+        "result": result,
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "elo": None if rating is None else round(rating, 1),
+        "llr": round(llr, 3),
+        "bounds": [round(lower, 3), round(upper, 3)],
+        "reasons": reasons,
+        "seconds": round(time.perf_counter() - start, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="match")
+    parser.add_argument("--new", default="", help='試す設定 例: "depth=4,values=fitted.json"')
+    parser.add_argument("--base", default="", help="基準の設定")
+    parser.add_argument("--openings", default=None, help="開始局面のファイル（1行に1局面）")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-moves", type=int, default=MAX_MOVES)
+    parser.add_argument("--elo0", type=float, default=0)
+    parser.add_argument("--elo1", type=float, default=10)
+    parser.add_argument("--out", default="match_kif", help="棋譜の保存先")
+    parser.add_argument(
+        "--random-plies", type=int, default=RANDOM_PLIES, help="開始局面のあとにランダムに指す手数"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="ランダムな手の乱数の種")
+    args = parser.parse_args()
+
+    engines = [parse_engine(args.new, "new"), parse_engine(args.base, "base")]
+    print(
+        run_match(
+            engines,
+            load_openings(args.openings),
+            args.games,
+            args.workers,
+            args.max_moves,
+            args.elo0,
+            args.elo1,
+            out_dir=args.out,
+            plies=args.random_plies,
+            seed=args.seed,
+        )
+    )
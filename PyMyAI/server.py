@@ -0,0 +1,703 @@
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+
+import shogi
+
+import MyAI
+
+# --- ローカルの解析サーバー ---
+# 複数のツール（棋譜の検討・学習スクリプト・GUI）から「この局面をこの予算で解析」の要求を受け、
+# MyAIを読み込み済みのワーカープロセスに配る。ワーカーは置換表（と解析キャッシュ）を要求をまたいで
+# 持ち続けるので、起動や表が空の状態から始める分を毎回払わずに済む。
+#
+# 通信は1行1JSON（localhostのTCPか、--unix でUnixソケット）。1つの接続で複数の要求を送ってよく、
+# 応答は終わった順に id 付きで返る。
+#   {"op": "analyze", "id": 1, "sfen": "...", "moves": [...], "depth": 6, "time_ms": 500,
+#    "nodes": null, "timeout_ms": 2000}
+#   {"op": "cancel", "id": 1}
+#   {"op": "stats"}
+# 同じ局面・同じ予算の要求が解析中なら1つの探索の結果を分け合う（dedup）。
+# timeout_ms は要求を受けてからの時間で、探索はその少し前に打ち切って途中までの結果を返す。
+# 長く待つ要求が後から同じ探索に加わったら探索を延ばし、先に締め切りが来た要求には
+# そこまでに終わった反復の結果を返す（"partial": true）。
+HOST = "127.0.0.1"
+PORT = 8765
+TIMEOUT_MARGIN_MS = 50  # 探索の締め切りを要求のタイムアウトより早める分
+DEFAULT_DEPTH = 6
+DEFAULT_BATCH = 4  # 待ちが多いとき1回にワーカーへ渡す要求の数
+
+
+# --- ワーカープロセス ---
+class WorkerLoop:
+    """ワーカープロセスの中身: 受信スレッドが指示を受け、メインスレッドが順に探索する"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.tasks = queue.Queue()
+        self.lock = threading.Lock()
+        self.queued = {}  # 受け取ってまだ始めていない要求
+        self.job = None  # 探索中の要求
+        self.limits = None
+        self.start = 0.0
+
+    def receive(self):
+        # forkした他のワーカーもパイプの親側を持っているので、親が死んでもEOFが来るとは限らない
+        parent = multiprocessing.parent_process()
+        while True:
+            try:
+                while not self.conn.poll(1.0):
+                    if parent is not None and not parent.is_alive():
+                        raise EOFError
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                message = ("quit",)
+            if message[0] == "jobs":
+                with self.lock:
+                    for job in message[1]:
+                        self.queued[job["job"]] = job
+                        self.tasks.put(job)
+            elif message[0] == "cancel":
+                # 終わった要求の取り消しは何もしない
+                with self.lock:
+                    job = self.queued.get(message[1])
+                    if job is not None:
+                        job["cancelled"] = True
+                    elif self.job is not None and message[1] == self.job["job"]:
+                        self.limits.stop()
+            elif message[0] == "deadline":
+                # 同じ局面をもっと長く待つ要求が加わった
+                with self.lock:
+                    job = self.queued.get(message[1])
+                    if job is not None:
+                        job["deadline"] = message[2]
+                    elif self.job is not None and message[1] == self.job["job"]:
+                        self.job["deadline"] = message[2]
+                        self.limits.set_deadline(self.search_deadline(self.job))
+            elif message[0] == "quit":
+                with self.lock:
+                    if self.limits is not None:
+                        self.limits.stop()
+                self.tasks.put(None)
+                return
+
+    def search_deadline(self, job):
+        """time_ms と要求の締め切り（time.time基準）の早い方を perf_counter 基準で返す"""
+        limit = None if job["time_ms"] is None else self.start + job["time_ms"] / 1000
+        if job["deadline"] is not None:
+            deadline = time.perf_counter() + (job["deadline"] - time.time())
+            limit = deadline if limit is None else min(limit, deadline)
+        return limit
+
+    def run(self):
+        threading.Thread(target=self.receive, daemon=True).start()
+        while True:
+            job = self.tasks.get()
+            if job is None:
+                break
+            job_id = job["job"]
+            limits = MyAI.SearchLimits()
+            with self.lock:
+                self.queued.pop(job_id, None)
+                if job.get("cancelled"):
+                    self.conn.send(("cancelled", job_id))
+                    continue
+                self.job, self.limits = job, limits
+                self.start = time.perf_counter()
+                limits.deadline = self.search_deadline(job)
+            try:
+                result = self.analyze(job, limits)
+                message = ("cancelled", job_id) if result is None else ("result", job_id, result)
+            except Exception as e:  # 壊れたSFEN・反則手など
+                message = ("error", job_id, f"{type(e).__name__}: {e}")
+            with self.lock:
+                self.job = self.limits = None
+            self.conn.send(message)
+
+    def analyze(self, job, limits):
+        """1つの要求を探索する。取り消されて1手も読めなければNone
+
+        反復が終わるごとに途中の結果を送る（先に締め切りが来た要求にはそれを返す）。
+        """
+        board = shogi.Board(job["sfen"])
+        for usi in job["moves"]:
+            move = shogi.Move.from_usi(usi)
+            if move not in board.legal_moves:
+                raise ValueError(f"反則手です: {usi}")
+            board.push(move)
+        start = self.start
+        if limits.deadline is not None and limits.deadline <= time.perf_counter():
+            return None
+
+        def on_iteration(depth, value, pv, nodes, elapsed_ms):
+            self.conn.send(
+                ("progress", job["job"], search_result(value, pv, depth, nodes, 0, start))
+            )
+
+        # 締め切りは limits に入れてあり、探索中に延びることがある
+        value, move, pv, depth, stats = MyAI.iterative_deepening(
+            board, job["depth"], None, job["nodes"], on_iteration=on_iteration, limits=limits
+        )
+        if limits.stopped and not depth and not stats.cache_depth:
+            return None
+        return search_result(value, pv or ([move] if move else []), depth, stats.nodes, stats.cache_depth, start)
+
+
+def search_result(value, pv, depth, nodes, cache_depth, start):
+    return {
+        "score": value,
+        "best": pv[0].usi() if pv else None,
+        "pv": [m.usi() for m in pv],
+        "depth": depth,
+        "nodes": nodes,
+        "cache_depth": cache_depth,
+        "ms": int((time.perf_counter() - start) * 1000),
+        "pid": os.getpid(),
+    }
+
+
+def worker_main(conn, hash_mb, cache_path, cache_mb):
+    MyAI.resize_hash(hash_mb)
+    if cache_path is not None:
+        MyAI.open_analysis_cache(cache_path, cache_mb)
+    WorkerLoop(conn).run()
+
+
+# --- サーバー ---
+def optional_count(request, name, default=None):
+    """正の整数かnullの欄"""
+    value = request.get(name, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError(f"{name}は正の整数です: {value!r}")
+    return value
+
+
+def parse_request(request):
+    """analyzeの要求を (sfen, moves, depth, time_ms, nodes, timeout_ms) にする。おかしければValueError"""
+    sfen = request.get("sfen") or shogi.STARTING_SFEN
+    if sfen == "startpos":
+        sfen = shogi.STARTING_SFEN
+    if not isinstance(sfen, str):
+        raise ValueError(f"sfenは文字列です: {sfen!r}")
+    moves = request.get("moves") or []
+    if not isinstance(moves, list) or not all(isinstance(m, str) for m in moves):
+        raise ValueError(f"movesはUSIの指し手の配列です: {moves!r}")
+    depth = optional_count(request, "depth") or DEFAULT_DEPTH
+    if depth > MyAI.MAX_PLY:
+        raise ValueError(f"depthが深すぎます: {depth}")
+    return (
+        sfen,
+        tuple(moves),
+        depth,
+        optional_count(request, "time_ms"),
+        optional_count(request, "nodes"),
+        optional_count(request, "timeout_ms"),
+    )
+
+
+class Job:
+    """1つの探索（同じ要求をまとめたもの）"""
+
+    def __init__(self, job_id, key, request, future):
+        self.id = job_id
+        self.key = key
+        self.request = request
+        self.future = future
+        self.waiters = 0
+        self.worker = None
+        self.progress = None  # 最後に終わった反復の結果
+        self.crashes = 0  # 探索中にワーカーが落ちた回数
+        self.created = time.perf_counter()
+
+    def extend(self, deadline):
+        """待つ人の締め切りのうち一番遅いものまで探索する。延びたらTrue"""
+        current = self.request["deadline"]
+        if current is None or (deadline is not None and deadline <= current):
+            return False
+        self.request["deadline"] = deadline
+        return True
+
+
+class WorkerHandle:
+    """サーバー側から見た1つのワーカープロセス"""
+
+    def __init__(self, hash_mb, cache_path, cache_mb):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=worker_main, args=(child, hash_mb, cache_path, cache_mb), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.jobs = set()  # 渡して結果がまだの要求
+        self.send_lock = threading.Lock()
+
+    def listen(self, server):
+        # 結果は受信スレッドからイベントループに渡す（Windowsのパイプはselectできないので）
+        threading.Thread(target=self.receive, args=(server,), daemon=True).start()
+
+    def send(self, message):
+        with self.send_lock:
+            try:
+                self.conn.send(message)
+            except OSError:
+                pass  # 落ちたワーカーは受信スレッドが見つけて on_worker_exit で片付ける
+
+    def receive(self, server):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            server.loop.call_soon_threadsafe(server.on_worker_message, self, message)
+        try:
+            server.loop.call_soon_threadsafe(server.on_worker_exit, self)
+        except RuntimeError:
+            pass  # イベントループはもう閉じている
+
+    def close(self):
+        try:
+            self.send(("quit",))
+        except OSError:
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class AnalysisServer:
+    """要求を待ち行列に入れ、空いたワーカーに渡す"""
+
+    def __init__(self, workers=None, hash_mb=64, cache_path=MyAI.CACHE_PATH, cache_mb=64, batch=DEFAULT_BATCH):
+        self.worker_count = workers or os.cpu_count() or 1
+        self.hash_mb = hash_mb
+        self.cache_path = cache_path
+        self.cache_mb = cache_mb
+        self.batch = batch
+        self.loop = None
+        self.closing = False
+        self.workers = []
+        self.pending = collections.deque()  # まだワーカーに渡していない要求
+        self.in_flight = {}  # キー -> Job（待ち行列か探索中）
+        self.jobs = {}  # 番号 -> Job
+        self.job_ids = itertools.count(1)
+        self.request_ids = itertools.count(1)
+        self.counts = collections.Counter()
+        self.total_ms = 0
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        if self.cache_path is not None:
+            # ワーカーが同時に作らないように、先に作っておく
+            MyAI.AnalysisCache(self.cache_path, self.cache_mb).close()
+        # スレッドを立てる前に全部forkしておく
+        self.workers = [
+            WorkerHandle(self.hash_mb, self.cache_path, self.cache_mb)
+            for _ in range(self.worker_count)
+        ]
+        for worker in self.workers:
+            worker.listen(self)
+
+    def close(self):
+        self.closing = True
+        for worker in self.workers:
+            worker.close()
+        for job in self.jobs.values():
+            if not job.future.done():
+                job.future.cancel()
+
+    # --- 要求 ---
+    async def analyze(self, request):
+        """解析の要求1つ（parse_request済み）。応答のdictを返す（取り消されたらCancelledError）"""
+        received = time.perf_counter()
+        sfen, moves, depth, time_ms, nodes, timeout_ms = request
+        self.counts["requests"] += 1
+
+        deadline = None
+        if timeout_ms is not None:
+            deadline = time.time() + max(1, timeout_ms - TIMEOUT_MARGIN_MS) / 1000
+        key = (sfen, moves, depth, time_ms, nodes)
+        job = self.in_flight.get(key)
+        if job is None:
+            job_request = {
+                "job": next(self.job_ids),
+                "sfen": sfen,
+                "moves": list(moves),
+                "depth": depth,
+                "time_ms": time_ms,
+                "nodes": nodes,
+                "deadline": deadline,
+            }
+            job = Job(job_request["job"], key, job_request, self.loop.create_future())
+            self.in_flight[key] = job
+            self.jobs[job.id] = job
+            self.pending.append(job)
+            self.dispatch()
+        else:
+            self.counts["deduplicated"] += 1
+            # 先に来た要求の締め切りで打ち切らないよう、探索を延ばす
+            if job.extend(deadline) and job.worker is not None:
+                job.worker.send(("deadline", job.id, deadline))
+
+        job.waiters += 1
+        try:
+            timeout = None if timeout_ms is None else timeout_ms / 1000
+            result = await asyncio.wait_for(asyncio.shield(job.future), timeout)
+        except asyncio.TimeoutError:
+            # 他の要求のために探索が続いていれば、そこまでの結果を返す
+            if job.progress is None:
+                self.counts["timeouts"] += 1
+                return {"status": "timeout"}
+            self.counts["partial"] += 1
+            result = dict(job.progress, status="ok", partial=True)
+        except asyncio.CancelledError:
+            self.counts["cancelled"] += 1
+            raise
+        finally:
+            job.waiters -= 1
+            if job.waiters == 0 and not job.future.done():
+                self.cancel_job(job)
+        self.counts["completed"] += 1
+        ms = int((time.perf_counter() - received) * 1000)
+        self.total_ms += ms
+        if result["status"] != "ok":
+            return result
+        return dict(result, ms=ms)
+
+    def cancel_job(self, job):
+        """待っている人がいなくなった探索をやめる"""
+        self.in_flight.pop(job.key, None)
+        if job.worker is None:
+            self.pending.remove(job)
+            self.jobs.pop(job.id, None)
+        else:
+            job.worker.send(("cancel", job.id))
+        job.future.cancel()
+
+    # --- ワーカーとのやりとり ---
+    def dispatch(self):
+        """空いているワーカーに待ち行列の要求を渡す。待ちが多ければまとめて渡す"""
+        idle = [worker for worker in self.workers if not worker.jobs]
+        while idle and self.pending:
+            worker = idle.pop()
+            count = max(1, min(self.batch, len(self.pending) // (len(idle) + 1)))
+            jobs = [self.pending.popleft() for _ in range(min(count, len(self.pending)))]
+            for job in jobs:
+                job.worker = worker
+                worker.jobs.add(job.id)
+            if len(jobs) > 1:
+                self.counts["batched"] += len(jobs)
+            worker.send(("jobs", [job.request for job in jobs]))
+
+    def on_worker_message(self, worker, message):
+        kind, job_id = message[0], message[1]
+        if kind == "progress":
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.progress = message[2]
+            return
+        worker.jobs.discard(job_id)
+        job = self.jobs.pop(job_id, None)
+        if job is not None:
+            if self.in_flight.get(job.key) is job:
+                del self.in_flight[job.key]
+            if not job.future.done():
+                if kind == "result":
+                    job.future.set_result(dict(message[2], status="ok"))
+                elif kind == "error":
+                    job.future.set_result({"status": "error", "error": message[2]})
+                else:
+                    job.future.set_result({"status": "cancelled"})
+        if not worker.jobs:
+            self.dispatch()
+
+    def on_worker_exit(self, worker):
+        """ワーカーが落ちたら代わりを立て、渡してあった要求をやり直す（2度落ちたら失敗にする）"""
+        if self.closing or worker not in self.workers:
+            return
+        replacement = WorkerHandle(self.hash_mb, self.cache_path, self.cache_mb)
+        replacement.listen(self)
+        self.workers[self.workers.index(worker)] = replacement
+        self.counts["restarts"] += 1
+        worker.conn.close()
+        multiprocessing.active_children()  # 終わったプロセスを回収する
+        for job_id in sorted(worker.jobs, reverse=True):
+            job = self.jobs.get(job_id)
+            if job is None:
+                continue
+            job.worker = None
+            job.crashes += 1
+            if job.future.done():  # 待つ人がいなくなって取り消し済み
+                del self.jobs[job_id]
+            elif job.crashes > 1:
+                del self.jobs[job_id]
+                if self.in_flight.get(job.key) is job:
+                    del self.in_flight[job.key]
+                job.future.set_result({"status": "error", "error": "ワーカーが異常終了しました"})
+            else:
+                self.pending.appendleft(job)
+        worker.jobs.clear()
+        self.dispatch()
+
+    def stats(self):
+        completed = self.counts["completed"]
+        return {
+            "workers": len(self.workers),
+            "queued": len(self.pending),
+            "running": sum(len(worker.jobs) for worker in self.workers),
+            "requests": self.counts["requests"],
+            "completed": completed,
+            "deduplicated": self.counts["deduplicated"],
+            "batched": self.counts["batched"],
+            "partial": self.counts["partial"],
+            "restarts": self.counts["restarts"],
+            "cancelled": self.counts["cancelled"],
+            "timeouts": self.counts["timeouts"],
+            "mean_ms": round(self.total_ms / completed, 1) if completed else 0,
+        }
+
+    # --- 接続 ---
+    async def handle_client(self, reader, writer):
+        tasks = {}  # 要求のid -> Task
+        write_lock = asyncio.Lock()
+
+        async def respond(response):
+            if writer.is_closing():
+                return  # 切断された接続には返さない
+            async with write_lock:
+                writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode())
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+
+        async def run(request_id, request):
+            try:
+                response = await self.analyze(request)
+            except asyncio.CancelledError:
+                response = {"status": "cancelled"}
+            except Exception as e:  # 応答を返さずに終わらないように
+                response = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+            finally:
+                tasks.pop(request_id, None)
+            await respond(dict(response, id=request_id))
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    await respond({"status": "error", "error": "JSONではありません"})
+                    continue
+                if not isinstance(request, dict):
+                    await respond({"status": "error", "error": "要求はJSONのオブジェクトです"})
+                    continue
+                op = request.get("op", "analyze")
+                request_id = request.get("id")
+                if not isinstance(request_id, (int, str, type(None))):
+                    await respond({"status": "error", "error": "idは整数か文字列です"})
+                    continue
+                if op == "analyze":
+                    if request_id is None:
+                        request_id = next(self.request_ids)
+                    if request_id in tasks:
+                        await respond({"id": request_id, "status": "error", "error": "idが重複しています"})
+                        continue
+                    try:
+                        parsed = parse_request(request)
+                    except ValueError as e:
+                        await respond({"id": request_id, "status": "error", "error": str(e)})
+                        continue
+                    tasks[request_id] = asyncio.ensure_future(run(request_id, parsed))
+                elif op == "cancel":
+                    task = tasks.get(request_id)
+                    if task is not None:
+                        task.cancel()
+                elif op == "stats":
+                    await respond(dict(self.stats(), id=request_id, status="ok"))
+                else:
+                    await respond({"id": request_id, "status": "error", "error": f"不明な命令です: {op}"})
+        except ConnectionError:
+            pass
+        finally:
+            # 切断されたら、その接続の要求はすべて取り消す
+            for task in list(tasks.values()):
+                task.cancel()
+            writer.close()
+
+
+async def serve(server, host=HOST, port=PORT, unix=None):
+    server.start()
+    try:
+        if unix is not None:
+            listener = await asyncio.start_unix_server(server.handle_client, unix)
+            where = unix
+        else:
+            listener = await asyncio.start_server(server.handle_client, host, port)
+            where = f"{host}:{port}"
+        print(f"解析サーバー {where} ワーカー{len(server.workers)}", file=sys.stderr, flush=True)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+# --- クライアント ---
+class AnalysisClient:
+    """解析サーバーに同期でつなぐ（1つの接続で1要求ずつ）"""
+
+    def __init__(self, host=HOST, port=PORT, unix=None, timeout=None):
+        if unix is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(unix)
+        else:
+            self.sock = socket.create_connection((host, port))
+        self.sock.settimeout(timeout)
+        self.file = self.sock.makefile("rwb")
+        self.ids = itertools.count(1)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def request(self, message):
+        self.file.write((json.dumps(message) + "\n").encode())
+        self.file.flush()
+        return json.loads(self.file.readline())
+
+    def analyze(self, sfen=None, moves=(), depth=DEFAULT_DEPTH, time_ms=None, nodes=None, timeout_ms=None):
+        return self.request(
+            {
+                "op": "analyze",
+                "id": next(self.ids),
+                "sfen": sfen,
+                "moves": list(moves),
+                "depth": depth,
+                "time_ms": time_ms,
+                "nodes": nodes,
+                "timeout_ms": timeout_ms,
+            }
+        )
+
+    def stats(self):
+        return self.request({"op": "stats"})
+
+
+def load_test(clients=8, requests=50, depth=DEFAULT_DEPTH, time_ms=100, host=HOST, port=PORT, unix=None):
+    """clients 本の接続から短い要求を requests 個ずつ投げ、処理量を測る"""
+    positions = MyAI.BENCH_POSITIONS
+    results = []
+
+    def client(seed):
+        rng = random.Random(seed)
+        connection = AnalysisClient(host, port, unix)
+        try:
+            for _ in range(requests):
+                results.append(connection.analyze(rng.choice(positions), (), depth, time_ms))
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    ok = [r for r in results if r["status"] == "ok"]
+    connection = AnalysisClient(host, port, unix)
+    stats = connection.stats()
+    connection.close()
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "seconds": round(seconds, 2),
+        "requests_per_second": round(len(results) / seconds, 1) if seconds else 0,
+        "mean_ms": round(sum(r["ms"] for r in ok) / len(ok), 1) if ok else 0,
+        "worker_pids": len({r["pid"] for r in ok}),
+        "server": stats,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", default=None, help="TCPの代わりに使うUnixソケットのパス")
+    commands = parser.add_subparsers(dest="command")
+    serve_parser = commands.add_parser("serve", help="解析サーバーを起動する")
+    serve_parser.add_argument("--workers", type=int, default=None)
+    serve_parser.add_argument("--hash-mb", type=int, default=64, help="ワーカーごとの置換表")
+    serve_parser.add_argument("--batch", type=int, default=DEFAULT_BATCH)
+    serve_parser.add_argument("--cache", default=MyAI.CACHE_PATH, help="解析キャッシュのファイル")
+    serve_parser.add_argument("--cache-mb", type=int, default=64)
+    serve_parser.add_argument("--no-cache", action="store_true", help="解析キャッシュを使わない")
+    query_parser = commands.add_parser("query", help="1局面を解析してもらう (JSON)")
+    query_parser.add_argument("sfen", nargs="*")
+    query_parser.add_argument("--moves", default="", help="空白区切りのUSIの指し手")
+    query_parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    query_parser.add_argument("--time-ms", type=int, default=None)
+    query_parser.add_argument("--timeout-ms", type=int, default=None)
+    load_parser = commands.add_parser("load", help="多数の短い要求で処理量を測る (JSON)")
+    load_parser.add_argument("--clients", type=int, default=8)
+    load_parser.add_argument("--requests", type=int, default=50)
+    load_parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    load_parser.add_argument("--time-ms", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        # python server.py serve --workers 4
+        server = AnalysisServer(
+            args.workers,
+            args.hash_mb,
+            None if args.no_cache else args.cache,
+            args.cache_mb,
+            args.batch,
+        )
+        try:
+            asyncio.run(serve(server, args.host, args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "query":
+        connection = AnalysisClient(args.host, args.port, args.unix)
+        response = connection.analyze(
+            " ".join(args.sfen) or None,
+            args.moves.split(),
+            args.depth,
+            args.time_ms,
+            None,
+            args.timeout_ms,
+        )
+        connection.close()
+        print(json.dumps(response, ensure_ascii=False))
+    elif args.command == "load":
+        print(
+            json.dumps(
+                load_test(
+                    args.clients,
+                    args.requests,
+                    args.depth,
+                    args.time_ms,
+                    args.host,
+                    args.port,
+                    args.unix,
+                ),
+                indent=2,
+            )
+        )
+    else:
+        parser.print_help()
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import shogi
+
+import MyAI
+import evaluation
+
+# --- 評価値の学習（Texel法） ---
+# 棋譜の静かな局面（王手でなく、静止探索しても評価が変わらない局面）を特徴量にして一度だけ保存し、
+# 評価値をシグモイドで勝率に直したものと対局結果との二乗誤差が小さくなるように、
+# 全局面まとめてのNumPyの勾配法で駒の価値（と evaluation の表）を合わせる。
+#
+# 特徴量
+#   material (n, 13)  駒の種類ごとの 先手の枚数 - 後手の枚数（持ち駒は成っていない駒に数える）
+#   index, sign (n, 120)  evaluationの表（pst / own_king / enemy_king を並べた1本のベクトル）の
+#                         添字と符号（先手の駒+1・後手の駒-1・空き0）。盤上の駒1枚につき3つ
+#   result (n,)  先手の勝ち1・負け0・引き分け0.5
+MATERIAL_SYMBOLS = ["P", "L", "N", "S", "G", "B", "R", "+P", "+L", "+N", "+S", "+B", "+R"]
+MATERIAL_INDEX = [-1] * 16
+for _i, _symbol in enumerate(MATERIAL_SYMBOLS):
+    MATERIAL_INDEX[shogi.Piece.from_symbol(_symbol).piece_type] = _i
+
+PST_SIZE = evaluation.PIECE_TYPES * 81
+KING_SIZE = evaluation.PIECE_TYPES * evaluation.RELATIVE
+TABLE_SIZE = PST_SIZE + 2 * KING_SIZE
+TABLE_WIDTH = 3 * 40
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FEATURES_PATH = os.path.join(HERE, "features.npz")
+MIN_PLY = 16  # 序盤は定跡なので使わない
+QUIET_NODES = 2000  # 静かな局面か調べる静止探索のノード数上限
+
+
+def is_quiet(pos):
+    if pos.in_check():
+        return False
+    stand_pat = pos.material if pos.turn == shogi.BLACK else -pos.material
+    root_ply = pos.ply
+    try:
+        score = MyAI.quiescence(
+            pos, -float("inf"), float("inf"), 0, MyAI.SearchLimits(max_nodes=QUIET_NODES)
+        )
+    except MyAI.SearchAborted:
+        pos.rewind(root_ply)
+        return False
+    return score == stand_pat
+
+
+def position_features(pos):
+    """1局面の (material, index, sign)"""
+    material = np.zeros(len(MATERIAL_SYMBOLS), dtype=np.float32)
+    index = np.zeros(TABLE_WIDTH, dtype=np.int32)
+    sign = np.zeros(TABLE_WIDTH, dtype=np.int8)
+    kings = pos.king_squares
+    n = 0
+    for square, code in enumerate(pos.board):
+        if not code:
+            continue
+        piece_type, color = code & 15, code >> 4
+        s = -1 if color else 1
+        if MATERIAL_INDEX[piece_type] >= 0:
+            material[MATERIAL_INDEX[piece_type]] += s
+        relative = evaluation.RELATIVE_INDEX[color]
+        own, enemy = max(kings[color], 0), max(kings[1 - color], 0)
+        index[n] = piece_type * 81 + (80 - square if color else square)
+        index[n + 1] = PST_SIZE + piece_type * evaluation.RELATIVE + relative[own, square]
+        index[n + 2] = (
+            PST_SIZE + KING_SIZE + piece_type * evaluation.RELATIVE + relative[enemy, square]
+        )
+        sign[n : n + 3] = s
+        n += 3
+    for i, count in enumerate(pos.hands):
+        if count:
+            material[MATERIAL_INDEX[i & 7]] += -count if i >> 3 else count
+    return material, index, sign
+
+
+def extract_features(paths, min_ply=MIN_PLY):
+    """棋譜から静かな局面を集めて特徴量の配列にする"""
+    materials, indices, signs, results = [], [], [], []
+    for file, record in MyAI.iter_records(paths):
+        result = {"b": 1.0, "w": 0.0, "-": 0.5}.get(record.get("win"))
+        if result is None:
+            continue
+        pos = MyAI.Position.from_sfen(record["sfen"])
+        for usi in record["moves"]:
+            move = MyAI.encode_move(shogi.Move.from_usi(usi))
+            if not pos.is_legal_move(move):
+                break
+            pos.make(move)
+            if pos.ply >= min_ply and is_quiet(pos):
+                material, index, sign = position_features(pos)
+                materials.append(material)
+                indices.append(index)
+                signs.append(sign)
+                results.append(result)
+    n = len(results)
+    return {
+        "material": np.array(materials, dtype=np.float32).reshape(n, len(MATERIAL_SYMBOLS)),
+        "index": np.array(indices, dtype=np.int32).reshape(n, TABLE_WIDTH),
+        "sign": np.array(signs, dtype=np.int8).reshape(n, TABLE_WIDTH),
+        "result": np.array(results, dtype=np.float32),
+    }
+
+
+def source_signature(paths):
+    """棋譜ファイルの一覧と更新時刻（特徴量のキャッシュが古くないか調べる）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in names]
+        else:
+            files.append(path)
+    return json.dumps(sorted((f, os.stat(f).st_mtime) for f in files))
+
+
+def load_features(paths, cache=FEATURES_PATH, rebuild=False):
+    """キャッシュがあって棋譜が変わっていなければそれを使い、なければ作って保存する"""
+    signature = source_signature(paths)
+    if not rebuild and os.path.exists(cache):
+        with np.load(cache) as data:
+            if str(data["signature"]) == signature:
+                return {name: data[name] for name in ("material", "index", "sign", "result")}
+    features = extract_features(paths)
+    np.savez_compressed(cache, signature=signature, **features)
+    return features
+
+
+# --- 学習 ---
+def initial_weights():
+    material = np.array(
+        [MyAI.PIECE_VALUE_DICT[symbol] for symbol in MATERIAL_SYMBOLS], dtype=np.float64
+    )
+    tables = evaluation.TableEvaluator().tables
+    table = np.concatenate(
+        [tables["pst"].ravel(), tables["own_king"].ravel(), tables["enemy_king"].ravel()]
+    ).astype(np.float64)
+    return material, table
+
+
+def evaluate(features, material, table):
+    score = features["material"] @ material
+    if table is not None:
+        score += (features["sign"] * table[features["index"]]).sum(axis=1)
+    return score
+
+
+def loss(features, material, table, scale):
+    p = 1 / (1 + np.exp(-evaluate(features, material, table) / scale))
+    return float(np.mean((p - features["result"]) ** 2))
+
+
+def fit_scale(features, material, table):
+    """今の評価値で誤差が最小になるシグモイドの幅（cp）"""
+    scales = np.geomspace(50, 5000, 60)
+    errors = [loss(features, material, table, scale) for scale in scales]
+    return float(scales[int(np.argmin(errors))])
+
+
+def fit(features, material, table=None, epochs=500, lr=2.0, l2=1e-4, scale=None):
+    """Adamで全局面まとめての勾配降下。歩の価値は100に固定して尺度を決める"""
+    if scale is None:
+        scale = fit_scale(features, material, table)
+    params = [material.copy()] + ([table.copy()] if table is not None else [])
+    moments = [np.zeros_like(p) for p in params]
+    velocities = [np.zeros_like(p) for p in params]
+    result = features["result"]
+    n = len(result)
+    for step in range(1, epochs + 1):
+        current = params[1] if table is not None else None
+        p = 1 / (1 + np.exp(-evaluate(features, params[0], current) / scale))
+        g = 2 * (p - result) * p * (1 - p) / scale / n
+        grads = [features["material"].T @ g]
+        grads[0][0] = 0.0  # 歩は固定
+        if table is not None:
+            weights = (features["sign"] * g[:, None]).ravel()
+            grads.append(
+                np.bincount(features["index"].ravel(), weights=weights, minlength=TABLE_SIZE)
+                + l2 * params[1]
+            )
+        for param, grad, m, v in zip(params, grads, moments, velocities):
+            m *= 0.9
+            m += 0.1 * grad
+            v *= 0.999
+            v += 0.001 * grad**2
+            param -= lr * (m / (1 - 0.9**step)) / (np.sqrt(v / (1 - 0.999**step)) + 1e-12)
+    return params[0], params[1] if table is not None else None, scale
+
+
+def write_piece_values(material, path=MyAI.PIECE_VALUES_PATH):
+    values = {symbol: int(round(value)) for symbol, value in zip(MATERIAL_SYMBOLS, material)}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(values, f, indent=1)
+    return values
+
+
+def write_tables(table, path=evaluation.TABLES_PATH):
+    table = np.rint(table).astype(np.int32)
+    tables = {
+        "pst": table[:PST_SIZE].reshape(evaluation.PIECE_TYPES, 81),
+        "own_king": table[PST_SIZE : PST_SIZE + KING_SIZE].reshape(
+            evaluation.PIECE_TYPES, evaluation.RELATIVE
+        ),
+        "enemy_king": table[PST_SIZE + KING_SIZE :].reshape(
+            evaluation.PIECE_TYPES, evaluation.RELATIVE
+        ),
+    }
+    np.savez(path, **tables)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="tune")
+    parser.add_argument("paths", nargs="+", help="KIF/CSAファイルかディレクトリ")
+    parser.add_argument("--tables", action="store_true", help="evaluationの表も合わせる")
+    parser.add_argument("--epochs", type=int, default=500)
+    parser.add_argument("--lr", type=float, default=2.0)
+    parser.add_argument("--rebuild", action="store_true", help="特徴量を作り直す")
+    parser.add_argument("--dry-run", action="store_true", help="結果を書き出さない")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    features = load_features(args.paths, rebuild=args.rebuild)
+    n = len(features["result"])
+    print(f"{n}局面の特徴量 ({time.perf_counter() - start:.1f}秒)", file=sys.stderr)
+    if n == 0:
+        sys.exit("静かな局面がありません")
+
+    material, table = initial_weights()
+    if not args.tables:
+        table = None
+    start = time.perf_counter()
+    before = loss(features, material, table, fit_scale(features, material, table))
+    material, table, scale = fit(features, material, table, args.epochs, args.lr)
+    after = loss(features, material, table, scale)
+    print(
+        f"誤差 {before:.5f} -> {after:.5f} (幅{scale:.0f}cp, {args.epochs}回, "
+        f"{time.perf_counter() - start:.1f}秒)",
+        file=sys.stderr,
+    )
+    if args.dry_run:
+        print({symbol: int(round(v)) for symbol, v in zip(MATERIAL_SYMBOLS, material)})
+    else:
+        print(write_piece_values(material))
+        if table is not None:
+            write_tables(table)
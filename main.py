@@ -9,8 +9,15 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.graphics import Color, Rectangle, Line
 from kivy.clock import Clock
-from threading import Thread
+from itertools import islice
+import os
+import queue
 import sys
+import threading
+import time
+
+# 探索部は PyMyAI/MyAI.py（ルートの MyAI/ や MyAI.*.pyd より先に見つかるように）
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "PyMyAI"))
 import shogi, MyAI
 
 # -------------------------
@@ -18,9 +25,19 @@ import shogi, MyAI
 # -------------------------
 selectedPiece = None  # 盤上の駒選択
 selectedHand = None  # 持ち駒選択
-holding_pieces = {0: [], 1: []}  # 0=先手,1=後手
+# 現局面の合法手の索引: 出発地（USIの升 "7g" / 持ち駒 "P"）-> {到着升: (不成で指せる, 成って指せる)}
+legal_index = {}
 turn = 0
 ai_turn = int(input("AIの手番を選択: "))
+AI_MAX_DEPTH = 8
+ai_time_left_ms = 3 * 60 * 1000  # 3分切れ負け
+
+# 表示中の状態（前回との差分だけ描き直す）
+shown_pieces = ["."] * 81  # 升（python-shogiの升番号）ごとの表示中の駒の記号
+shown_hands = {0: {}, 1: {}}  # 0=先手,1=後手 -> {駒の記号: 表示中の枚数}
+holding_buttons = {}  # (手番, 駒の記号) -> HoldingPieceButton（作ったものを使い回す）
+drawn_ply = None  # 表示済みの手数（Noneなら全升を描く）
+redraw_stats = {"squares": 0, "hands": 0, "ms": 0.0, "redraws": 0}
 
 # -------------------------
 # 駒画像
@@ -56,6 +73,28 @@ piece_images = {
     "+l": "static/image/white_prom_lance.png",
 }
 
+# 駒画像をまとめたKivyのアトラス（static/image/pieces.atlas と pieces-0.png）
+PIECE_ATLAS = "static/image/pieces"
+
+
+def load_piece_sources():
+    """駒の記号 -> 画像のsource。アトラスがなければ作り、作れなければPNGをそのまま使う"""
+    if not os.path.exists(PIECE_ATLAS + ".atlas"):
+        try:
+            from kivy.atlas import Atlas
+
+            Atlas.create(PIECE_ATLAS, sorted(set(piece_images.values())), 1024)
+        except (ImportError, OSError) as e:
+            print(f"[DEBUG] 駒のアトラスを作れません: {e}")
+            return dict(piece_images)
+    return {
+        symbol: f"atlas://{PIECE_ATLAS}/{os.path.splitext(os.path.basename(path))[0]}"
+        for symbol, path in piece_images.items()
+    }
+
+
+piece_sources = load_piece_sources()
+
 
 # -------------------------
 # USI / SFEN
@@ -75,39 +114,37 @@ def CoorsToUSI(col, row):
     return str(9 - col) + colToAlpha[row]
 
 
-def board_to_piece_list(board):
-    sfen = board.sfen()
-    piece_list = []
-    board_part = sfen.split()[0]
-
-    for row in board_part.split("/"):
-        row_list = []
-        i = 0
-        while i < len(row):
-            c = row[i]
-            if c.isdigit():
-                row_list.extend(["."] * int(c))
-                i += 1
-            elif c == "+":
-                i += 1
-                row_list.append("+" + row[i])
-                i += 1
-            else:
-                row_list.append(c)
-                i += 1
+def USIToCoors(square):
+    """USIの升 "7g" -> (col, row)"""
+    return 9 - int(square[0]), ord(square[1]) - ord("a")
 
-        while len(row_list) < 9:
-            row_list.append(".")
-        piece_list.append(row_list)
 
-    return piece_list
+def build_legal_index(board):
+    """合法手を1回だけ生成して、出発地 -> {到着升: (不成, 成)} の索引にする"""
+    index = {}
+    for move in board.legal_moves:
+        usi = move.usi()
+        origin = usi[0] if move.drop_piece_type else usi[:2]
+        destinations = index.setdefault(origin, {})
+        normal, promote = destinations.get(usi[2:4], (False, False))
+        if move.promotion:
+            promote = True
+        else:
+            normal = True
+        destinations[usi[2:4]] = (normal, promote)
+    return index
 
 
 # -------------------------
 # ボード初期化
 # -------------------------
 board = shogi.Board()
-piece_list = board_to_piece_list(board)
+
+
+def piece_symbol(square):
+    """盤の升の駒の記号（空きは "."）"""
+    piece = board.piece_at(square)
+    return piece.symbol() if piece else "."
 
 
 # -------------------------
@@ -122,7 +159,7 @@ class HoldingPieceButton(RelativeLayout):
         self.width = self.height = 50
 
         # 駒画像
-        self.img = Image(source=piece_images[piece], size_hint=(1, 1))
+        self.img = Image(source=piece_sources[piece], size_hint=(1, 1))
         self.add_widget(self.img)
 
         # 枚数ラベル
@@ -137,6 +174,9 @@ class HoldingPieceButton(RelativeLayout):
         self.add_widget(self.count_label)
         self.bind(size=self.update_label_pos)
 
+    def set_count(self, count):
+        self.count_label.text = str(count) if count > 1 else ""
+
     def update_label_pos(self, *args):
         self.count_label.pos = (
             self.width - self.count_label.width,
@@ -149,6 +189,9 @@ class HoldingPieceButton(RelativeLayout):
             if (turn == 0 and self.owner == 0) or (turn == 1 and self.owner == 1):
                 selectedHand = self.piece
                 selectedPiece = None
+                for btn in app_ref.piece_buttons:
+                    btn.remove_highlight()
+                show_targets(self.piece.upper())
                 print(f"[DEBUG] 持ち駒 {self.piece} を選択")
                 return True
         return super().on_touch_down(touch)
@@ -164,6 +207,7 @@ class PieceButton(ButtonBehavior, Image):
         self.col = col
         self.piece = None
         self.highlighted = False
+        self.target_mark = None  # 選んだ駒の行き先の印
         self.promotion_buttons = []
         self.size_hint = (None, None)
         self.size = (50, 50)
@@ -190,23 +234,23 @@ class PieceButton(ButtonBehavior, Image):
                 self.size[0],
                 self.size[1],
             )
+        if self.target_mark:
+            self.target_mark.pos = self.pos
+            self.target_mark.size = self.size
 
     def on_press(self):
         global selectedPiece, selectedHand, turn
         col, row = self.col, self.row
-        self.piece = piece_list[row][col]
+        self.piece = shown_pieces[row * 9 + col]
 
         # --- 持ち駒を打つ ---
         if selectedHand and self.piece == ".":
             usi_move = selectedHand.upper()
-            usi = usi_move + "*" + CoorsToUSI(col, row)
-            legal_usi = [m.usi() for m in board.legal_moves]
-            print(usi, legal_usi)
-            if usi in legal_usi:
+            destination = CoorsToUSI(col, row)
+            usi = usi_move + "*" + destination
+            if destination in legal_index.get(usi_move, {}):
                 move = shogi.Move.from_usi(usi)
                 board.push(move)
-                holder = 0 if turn == 0 else 1
-                holding_pieces[holder].remove(selectedHand)
                 selectedHand = None
                 update_board_and_buttons()
                 print(f"[DEBUG] 持ち駒打ち: {move.usi()}")
@@ -227,19 +271,21 @@ class PieceButton(ButtonBehavior, Image):
 
         if self.highlighted:
             self.remove_highlight()
+            clear_targets()
             selectedPiece = None
         else:
             for btn in app_ref.piece_buttons:
                 btn.remove_highlight()
                 btn.remove_promotion_buttons()
+            clear_targets()
 
             if selectedPiece is not None:
                 departure, destination = selectedPiece, CoorsToUSI(col, row)
                 usi_normal = departure + destination
                 usi_promote = departure + destination + "+"
-                legal_usi = [m.usi() for m in board.legal_moves]
-                normal_legal = usi_normal in legal_usi
-                promote_legal = usi_promote in legal_usi
+                normal_legal, promote_legal = legal_index.get(departure, {}).get(
+                    destination, (False, False)
+                )
 
                 if normal_legal and promote_legal:
                     self.show_promotion_buttons(departure, destination)
@@ -253,7 +299,6 @@ class PieceButton(ButtonBehavior, Image):
                     selectedPiece = None
                     return
 
-                handle_capture(move_to_play)
                 board.push(move_to_play)
                 update_board_and_buttons()
                 print(f"[DEBUG] 駒移動: {move_to_play.usi()}")
@@ -261,7 +306,9 @@ class PieceButton(ButtonBehavior, Image):
                 selectedPiece = None
             else:
                 selectedPiece = CoorsToUSI(col, row)
+                selectedHand = None
                 self.add_highlight()
+                show_targets(selectedPiece)
 
     # --- 成ボタン ---
     def show_promotion_buttons(self, departure, destination):
@@ -291,7 +338,6 @@ class PieceButton(ButtonBehavior, Image):
         def promote_action(instance):
             global selectedPiece
             move = shogi.Move.from_usi(departure + destination + "+")
-            handle_capture(move)
             board.push(move)
             self.remove_promotion_buttons()
             update_board_and_buttons()
@@ -304,7 +350,6 @@ class PieceButton(ButtonBehavior, Image):
         def normal_action(instance):
             global selectedPiece
             move = shogi.Move.from_usi(departure + destination)
-            handle_capture(move)
             board.push(move)
             self.remove_promotion_buttons()
             update_board_and_buttons()
@@ -341,84 +386,317 @@ class PieceButton(ButtonBehavior, Image):
             self.highlight_line = None
             self.highlighted = False
 
+    def add_target_mark(self):
+        if self.target_mark is None:
+            with self.canvas.after:
+                self.target_color = Color(0.2, 0.7, 0.3, 0.35)
+                self.target_mark = Rectangle(pos=self.pos, size=self.size)
+
+    def remove_target_mark(self):
+        if self.target_mark is not None:
+            self.canvas.after.remove(self.target_color)
+            self.canvas.after.remove(self.target_mark)
+            self.target_mark = None
+
 
 # -------------------------
-# キャプチャ処理
+# 行き先の表示（合法手の索引から）
 # -------------------------
-def handle_capture(move):
-    captured_piece = board.piece_at(move.to_square)
-    if captured_piece:
-        holder = 0 if board.turn == shogi.BLACK else 1
-        piece_symbol = captured_piece.symbol().replace("+", "")
-        piece_symbol = piece_symbol.upper() if holder == 0 else piece_symbol.lower()
-        holding_pieces[holder].append(piece_symbol)
+def show_targets(origin):
+    clear_targets()
+    for destination in legal_index.get(origin, {}):
+        col, row = USIToCoors(destination)
+        app_ref.piece_buttons[row * 9 + col].add_target_mark()
+
+
+def clear_targets():
+    for btn in app_ref.piece_buttons:
+        btn.remove_target_mark()
 
 
 # -------------------------
-# 持ち駒更新
+# 差分描画
 # -------------------------
-def update_holding_area():
-    app_ref.top_captures.clear_widgets()
-    app_ref.bottom_captures.clear_widgets()
+def dirty_squares():
+    """前回描いてから指された手で変わった升。手数が戻っていれば全升"""
+    global drawn_ply
+    moves = board.move_stack
+    if drawn_ply is None or len(moves) < drawn_ply:
+        squares = range(81)
+    else:
+        squares = set()
+        for move in islice(moves, drawn_ply, None):
+            if move.from_square is not None:
+                squares.add(move.from_square)
+            squares.add(move.to_square)
+    drawn_ply = len(moves)
+    return squares
+
+
+def redraw_squares(squares):
+    """表示と違う升だけ画像を差し替え、差し替えた升の数を返す"""
+    redrawn = 0
+    for square in squares:
+        symbol = piece_symbol(square)
+        if symbol != shown_pieces[square]:
+            shown_pieces[square] = symbol
+            btn = app_ref.piece_buttons[square]
+            btn.source = "" if symbol == "." else piece_sources[symbol]
+            redrawn += 1
+    return redrawn
 
-    top_height = app_ref.top_captures.height
-    bottom_height = app_ref.bottom_captures.height
 
-    display_order = ["P", "L", "N", "S", "G", "B", "R"]
+# -------------------------
+# 持ち駒更新
+# -------------------------
+def update_holding_area():
+    """盤の持ち駒の枚数を読み、枚数の変わった駒だけ更新する
 
+    ボタンは作ったものを使い回し、駒の種類が増減したときだけ駒台に並べ直す。
+    更新した駒の数を返す。
+    """
+    updated = 0
     for owner in [1, 0]:
-        holder_pieces = holding_pieces[owner]
+        box = app_ref.top_captures if owner == 1 else app_ref.bottom_captures
+        hand = board.pieces_in_hand[owner]
         counts = {}
-        for p in holder_pieces:
-            counts[p] = counts.get(p, 0) + 1
-
-        for base_piece in display_order:
-            piece = base_piece.lower() if owner == 1 else base_piece
-            if piece in counts:
-                c = counts[piece]
+        for piece_type in range(shogi.PAWN, shogi.KING):  # 歩香桂銀金角飛の順
+            if hand[piece_type]:
+                counts[shogi.Piece(piece_type, owner).symbol()] = hand[piece_type]
+        shown = shown_hands[owner]
+        if counts == shown:
+            continue
+
+        for piece, c in counts.items():
+            if shown.get(piece) == c:
+                continue
+            updated += 1
+            btn = holding_buttons.get((owner, piece))
+            if btn is None:
                 btn = HoldingPieceButton(piece=piece, owner=owner, count=c)
-                btn.height = btn.width = (
-                    top_height * 0.9 if owner == 1 else bottom_height * 0.9
-                )
-                if owner == 1:
-                    app_ref.top_captures.add_widget(btn)
-                else:
-                    app_ref.bottom_captures.add_widget(btn)
+                holding_buttons[(owner, piece)] = btn
+            else:
+                btn.set_count(c)
+        if counts.keys() != shown.keys():
+            updated += len(shown.keys() - counts.keys())
+            box.clear_widgets()
+            for piece in counts:
+                btn = holding_buttons[(owner, piece)]
+                btn.height = btn.width = box.height * 0.9
+                box.add_widget(btn)
+        shown_hands[owner] = counts
+    return updated
+
+
+def update_perf_label(dt=None):
+    s = redraw_stats
+    app_ref.perf_label.text = (
+        f"再描画 {s['squares']}升 持ち駒{s['hands']} {s['ms']:.1f}ms "
+        f"(計{s['redraws']}回) {Clock.get_fps():.0f}fps"
+    )
 
 
 # -------------------------
-# AIを別スレッドで実行
-# AIが先手の時、おそらく、AI側の最悪手を指している
-# AIが後手の時、legal_moves_listの先頭の手を指している
+# AIの思考スレッド（常駐）
+# 盤はUIとは別に自分で持ち、UIからはキューでコマンドを受け取る。
+# 人の手番の間は読み筋の予想手を指した局面を先読み（ponder）し、
+# 予想が当たればその探索を続けて使う。途中経過と指し手は Clock.schedule_once でUIに返す。
 # -------------------------
-def ai_move():
-    """AIの手を非同期で指す処理"""
+class EngineWorker:
+    """思考スレッド。on_info(depth, value, pv, pondering) と
+    on_bestmove(sfen, moves, move, pv, stats, elapsed_ms) はUIスレッドで呼ばれる"""
+
+    def __init__(self, on_info, on_bestmove):
+        self.on_info = on_info
+        self.on_bestmove = on_bestmove
+        self.commands = queue.Queue()
+        self.lock = threading.Lock()
+        self.board = shogi.Board()
+        self.limits = None  # 探索中のSearchLimits
+        self.pondering = False
+        self.ponder_position = None  # 先読み中の局面（予想手を指した後の sfen, moves）
+        self.ponder_hit = False
+        self.cancelled = False
+        self.started = 0.0  # 思考時間を数え始めた時刻
+        self.released = threading.Event()  # 先読みの結果を使うか捨てるか決まった
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # --- UIスレッドから呼ぶ ---
+    def search(self, sfen, moves, time_ms):
+        """局面を送って思考させる。先読みが当たっていればその探索に持ち時間を与えて続ける"""
+        with self.lock:
+            if self.pondering and self.ponder_position == (sfen, moves):
+                self.limits.set_deadline(time.perf_counter() + time_ms / 1000)
+                self.started = time.perf_counter()
+                self.pondering = False
+                self.ponder_hit = True
+                self.released.set()
+                print("[DEBUG] 予想手が当たりました")
+                return
+        self.stop()
+        self.commands.put(("position", sfen, moves))
+        self.commands.put(("search", time_ms))
+
+    def ponder(self, sfen, moves, predicted):
+        """人の手番の間、予想手 predicted（USI）を指した局面を読んでおく"""
+        self.stop()
+        position = (sfen, moves + [predicted])
+        self.commands.put(("position",) + position)
+        self.commands.put(("ponder", position))
+
+    def stop(self):
+        """まだ始めていないコマンドを捨て、今の探索を止めて結果を捨てる"""
+        try:
+            while True:
+                self.commands.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.limits is not None:
+                self.limits.stop()
+                self.cancelled = True
+            self.pondering = False
+            self.released.set()
+
+    def quit(self):
+        self.stop()
+        self.commands.put(("quit",))
+
+    # --- 思考スレッド ---
+    def run(self):
+        while True:
+            command = self.commands.get()
+            if command[0] == "quit":
+                return
+            if command[0] == "position":
+                sfen, moves = command[1], command[2]
+                self.board = shogi.Board(sfen)
+                for usi in moves:
+                    self.board.push_usi(usi)
+            elif command[0] == "search":
+                self.think(command[1], None)
+            elif command[0] == "ponder":
+                self.think(None, command[1])
+
+    def think(self, time_ms, ponder_position):
+        pondering = ponder_position is not None
+        limits = MyAI.SearchLimits()
+        with self.lock:
+            self.limits = limits
+            self.cancelled = False
+            self.pondering = pondering
+            self.ponder_position = ponder_position
+            self.ponder_hit = False
+            self.started = time.perf_counter()
+            if pondering:
+                self.released.clear()
+            else:
+                self.released.set()
+
+        best_pv = []  # 最後に終わった反復の読み筋
+
+        def info(depth, value, pv, nodes, elapsed_ms):
+            best_pv[:] = pv
+            Clock.schedule_once(lambda dt: self.on_info(depth, value, pv, pondering), 0)
+
+        board = self.board
+        move, stats = MyAI.get_best_move(
+            board,
+            depth=AI_MAX_DEPTH,
+            time_limit_ms=time_ms,
+            with_stats=True,
+            book=None if pondering else "weighted",
+            limits=limits,
+            on_iteration=info,
+        )
+        # 先読みは当たるか外れるまで結果を出さない
+        self.released.wait()
+        with self.lock:
+            self.limits = None
+            self.pondering = False
+            if self.cancelled or (pondering and not self.ponder_hit):
+                return
+            elapsed_ms = int((time.perf_counter() - self.started) * 1000)
+        # 先読みが当たった場合、盤は予想手（＝人が指した手）を指した後の局面
+        sfen, moves = MyAI.board_to_usi_position(board)
+        if move is not None and best_pv and best_pv[0] == move:
+            pv = [m.usi() for m in best_pv]
+        else:
+            pv = [move.usi()] if move is not None else []
+        Clock.schedule_once(
+            lambda dt: self.on_bestmove(sfen, moves, move, pv, stats, elapsed_ms), 0
+        )
+
+
+def request_ai_move():
+    """AIの手番になったら、思考スレッドに今の局面を送る"""
+    if not board.legal_moves:
+        app_ref.engine_label.text = "AIの負けです"
+        return
+    sfen, moves = MyAI.board_to_usi_position(board)
     print("[DEBUG] AI思考中...")
-    usi_move = MyAI.get_best_move(board, depth=3)
-    if usi_move == None:
-        sys.exit()
-    board.push(usi_move)
-    print(f"[DEBUG] AI指し手: {usi_move.usi()}")
-    Clock.schedule_once(lambda dt: update_board_and_buttons(), 0)
+    engine.search(sfen, moves, MyAI.allocate_time(ai_time_left_ms))
+
+
+def on_ai_info(depth, value, pv, pondering):
+    # 評価値はAIから見たcp
+    score = value if ai_turn == 0 else -value
+    head = "予想" if pondering else "AI"
+    app_ref.engine_label.text = (
+        f"{head} 深さ{depth} 評価{score:+d} 読み筋 {' '.join(m.usi() for m in pv[:6])}"
+    )
+
+
+def on_ai_bestmove(sfen, moves, move, pv, stats, elapsed_ms):
+    """思考スレッドの指し手をUIスレッドで盤に反映する"""
+    global ai_time_left_ms
+    if MyAI.board_to_usi_position(board) != (sfen, moves):
+        return  # 古い局面の結果
+    ai_time_left_ms -= elapsed_ms
+    if move is None:
+        print("[DEBUG] AIが投了しました")
+        app_ref.engine_label.text = "AIの投了です"
+        return
+    board.push(move)
+    print(f"[DEBUG] AI残り時間: {ai_time_left_ms / 1000:.1f}秒")
+    print(f"[DEBUG] AI指し手: {move.usi()} ({stats.summary()})")
+    update_board_and_buttons()
+    # 人が考えている間に予想手の先を読む
+    if len(pv) > 1 and shogi.Move.from_usi(pv[1]) in board.legal_moves:
+        engine.ponder(sfen, moves + [move.usi()], pv[1])
+
+
+# 前回までの探索結果（解析キャッシュ）を引き継ぐ
+try:
+    MyAI.open_analysis_cache()
+except OSError as e:
+    print(f"[DEBUG] 解析キャッシュを開けません: {e}")
+engine = EngineWorker(on_ai_info, on_ai_bestmove)
 
 
 # -------------------------
 # 盤更新
 # -------------------------
 def update_board_and_buttons():
-    global turn, piece_list
+    global turn, legal_index
+    start = time.perf_counter()
     turn = 0 if board.turn == shogi.BLACK else 1
-    piece_list[:] = board_to_piece_list(board)
-
-    for btn in app_ref.piece_buttons:
-        piece = piece_list[btn.row][btn.col]
-        btn.source = "" if piece == "." else piece_images[piece]
-
-    update_holding_area()
+    squares = redraw_squares(dirty_squares())
+    hands = update_holding_area()
+    redraw_stats["squares"] = squares
+    redraw_stats["hands"] = hands
+    redraw_stats["ms"] = (time.perf_counter() - start) * 1000
+    redraw_stats["redraws"] += 1
+    update_perf_label()
+
+    # 人の手番だけ作る
+    legal_index = build_legal_index(board) if turn != ai_turn else {}
+    clear_targets()
 
     # 後手(AI)の番なら非同期で思考
     if turn == ai_turn:
-        Thread(target=ai_move).start()
+        request_ai_move()
 
 
 # -------------------------
@@ -455,10 +733,8 @@ class ShogiApp(App):
         app_ref.piece_buttons = []
         for row in range(9):
             for col in range(9):
-                piece = piece_list[row][col]
-                btn = PieceButton(
-                    row, col, source="" if piece == "." else piece_images[piece]
-                )
+                # 駒の画像は最初の update_board_and_buttons で差分として描く
+                btn = PieceButton(row, col)
                 app_ref.board_layout.add_widget(btn)
                 app_ref.piece_buttons.append(btn)
 
@@ -482,11 +758,42 @@ class ShogiApp(App):
         )
         root.add_widget(app_ref.bottom_captures)
 
+        # AIの読み筋
+        app_ref.engine_label = Label(
+            text=f"探索部: {MyAI.backend()}",
+            font_size=12,
+            font_name="static/NotoSansJP-Regular.ttf",
+            size_hint=(None, None),
+            size=(480, 20),
+            pos_hint={"x": 0, "top": 0.88},
+            color=(0.2, 0.2, 0.2, 1),
+        )
+        root.add_widget(app_ref.engine_label)
+
+        # 再描画した升の数・時間の表示
+        app_ref.perf_label = Label(
+            text="",
+            font_size=12,
+            font_name="static/NotoSansJP-Regular.ttf",
+            size_hint=(None, None),
+            size=(320, 20),
+            pos_hint={"right": 1, "top": 0.88},
+            color=(0.2, 0.2, 0.2, 1),
+        )
+        root.add_widget(app_ref.perf_label)
+        Clock.schedule_interval(update_perf_label, 0.5)
+
         update_board_and_buttons()
         root.bind(size=self.update_board)
         self.update_board(root, root.size)
         return root
 
+    def on_stop(self):
+        engine.quit()
+        if MyAI.analysis_cache is not None:
+            print(f"[DEBUG] 解析キャッシュ: {MyAI.analysis_cache.stats()}")
+            MyAI.close_analysis_cache()
+
     def update_top_bg(self, *args):
         app_ref.top_bg.pos = app_ref.top_captures.pos
         app_ref.top_bg.size = app_ref.top_captures.size
@@ -1,5 +1,18 @@
 # python setup.py build_ext --inplace
-from setuptools import setup
+# PyMyAI/MyAI.pyx を拡張モジュール myai_core として PyMyAI/ に作る（MyAI.py はこれがあれば使う）
+from setuptools import Extension, setup
 from Cython.Build import cythonize
 
-setup(ext_modules=cythonize("MyAI.pyx", compiler_directives={"language_level": "3"}))
+extensions = [
+    Extension(
+        "myai_core",
+        ["PyMyAI/MyAI.pyx"],
+        extra_compile_args=["/O2"] if __import__("os").name == "nt" else ["-O3"],
+    )
+]
+
+setup(
+    name="myai_core",
+    package_dir={"": "PyMyAI"},
+    ext_modules=cythonize(extensions, build_dir="build", compiler_directives={"language_level": "3"}),
+)
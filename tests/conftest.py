@@ -0,0 +1,5 @@
+import os
+import sys
+
+# PyMyAIのモジュールは「import MyAI」で読む
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "PyMyAI"))
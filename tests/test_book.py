@@ -0,0 +1,44 @@
+import os
+import random
+
+import shogi
+
+import MyAI
+
+KIF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "kif", "001.kif")
+
+
+def test_write_and_probe_round_trip(tmp_path):
+    rng = random.Random(0)
+    entries = [
+        (rng.getrandbits(64), rng.getrandbits(16), rng.randint(1, 100), 0) for _ in range(300)
+    ]
+    entries += [(entries[0][0], 7, 500, 3), (entries[0][0], 9, 500, 4)]  # 同じ局面に複数の手
+    path = str(tmp_path / "book.bin")
+    MyAI.write_book(path, entries)
+    book = MyAI.OpeningBook(path)
+    try:
+        assert book.size == len(entries)
+        for key in {e[0] for e in entries}:
+            expected = sorted(
+                [(m, c, w) for k, m, c, w in entries if k == key], key=lambda e: (-e[1], -e[2], e[0])
+            )
+            assert book.probe(key) == expected
+        assert book.probe(0) == []  # 無い局面
+    finally:
+        book.close()
+
+
+def test_book_from_kif(tmp_path):
+    games, entries = MyAI.build_book([KIF])
+    assert games == 1
+    path = str(tmp_path / "book.bin")
+    MyAI.write_book(path, entries)
+    book = MyAI.OpeningBook(path)
+    try:
+        pos = MyAI.Position.from_sfen(shogi.STARTING_SFEN)
+        move = book.choose(pos, "best")
+        assert move in pos.legal_moves()
+        assert book.probe(pos.key)[0][1] == 1
+    finally:
+        book.close()
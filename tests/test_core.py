@@ -0,0 +1,41 @@
+import shogi
+import pytest
+
+import MyAI
+
+from test_tt import SCORES
+
+pytestmark = pytest.mark.skipif(MyAI.myai_core is None, reason="myai_core がビルドされていない")
+
+
+def test_tt_matches_python_across_generations():
+    """Cython版の置換表もPython版と同じビット配置で、世代が進んでも値が変わらない"""
+    searcher = MyAI.myai_core.Searcher(1)
+    tt = MyAI.TranspositionTable(1)
+    key = 0x123456789ABCDEF0
+    for generation in range(256):
+        searcher.new_search()
+        tt.new_search()
+        for score in SCORES:
+            for bound in (MyAI.EXACT, MyAI.LOWER, MyAI.UPPER):
+                depth = generation % 64
+                move = (generation * 131 + bound) % 0xFFFF + 1
+                searcher.store(key, depth, score, bound, move)
+                tt.store(key, depth, score, bound, move)
+                assert searcher.probe(key) == tt.probe(key) == (depth, score, bound, move), generation
+
+
+def test_backends_agree_over_many_searches():
+    """置換表を使い回して世代が一周しても、Python版とCython版の探索は同じ"""
+    tt = MyAI.TranspositionTable(1)
+    ordering = MyAI.MoveOrdering()
+    searcher = MyAI.myai_core.Searcher(1)
+    for i in range(80):
+        board = shogi.Board(MyAI.BENCH_POSITIONS[i % len(MyAI.BENCH_POSITIONS)])
+        results = []
+        for backend in ("python", "cython"):
+            value, move, pv, depth, stats = MyAI.iterative_deepening(
+                board, 3, tt=tt, ordering=ordering, backend=backend, searcher=searcher, cache=False
+            )
+            results.append((value, move, pv, depth, stats.nodes))
+        assert results[0] == results[1], i
@@ -0,0 +1,56 @@
+import io
+
+import numpy as np
+import pytest
+import shogi
+
+import MyAI
+import evaluation
+import match
+
+
+@pytest.mark.parametrize("sfen", MyAI.BENCH_POSITIONS)
+def test_positional_matches_arrays(sfen):
+    """探索用の positional は evaluate_arrays(material=False) と同じ値"""
+    evaluator = evaluation.TableEvaluator(tables=evaluation.default_tables())
+    pos = MyAI.Position.from_sfen(sfen, evaluator)
+    for move in pos.legal_moves():
+        pos.make(move)
+        boards = np.frombuffer(pos.board, dtype=np.uint8)[None]
+        kings = np.array([pos.king_squares]).clip(0)
+        expected = int(evaluator.evaluate_arrays(boards, None, kings, material=False)[0])
+        assert evaluator.positional(pos) == expected
+        pos.unmake()
+
+
+def test_match_engine_with_tables(tmp_path):
+    path = str(tmp_path / "tables.npz")
+    evaluation.TableEvaluator(tables=evaluation.default_tables()).save(path)
+    engine = match.parse_engine(f"depth=2,eval=table,tables={path}", "table")
+    player = match.Player(engine)
+    assert isinstance(player.evaluator, evaluation.TableEvaluator)
+    assert player.search(shogi.Board()) is not None
+    with pytest.raises(ValueError):
+        match.parse_engine("eval=nnue", "bad")
+
+
+def test_usi_eval_option(tmp_path):
+    path = str(tmp_path / "tables.npz")
+    evaluation.TableEvaluator(tables=evaluation.default_tables()).save(path)
+    out = io.StringIO()
+    engine = MyAI.USIEngine(out)
+    engine.run(
+        [
+            "usi",
+            "setoption name OwnBook value false",
+            "setoption name Eval value table",
+            f"setoption name EvalFile value {path}",
+            "position startpos",
+            "go depth 2",
+            "isready",
+            "quit",
+        ]
+    )
+    assert isinstance(engine.evaluator, evaluation.TableEvaluator)
+    assert "option name Eval type combo" in out.getvalue()
+    assert "bestmove" in out.getvalue()
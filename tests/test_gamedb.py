@@ -0,0 +1,31 @@
+import os
+
+import shogi
+
+import gamedb
+
+KIF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "kif", "001.kif")
+
+
+def test_ingest_and_lookup(tmp_path):
+    db = gamedb.GameDB(str(tmp_path / "games.sqlite3"))
+    try:
+        assert db.ingest([KIF]) == (1, 0)
+        assert db.ingest([KIF]) == (0, 1)  # 変わっていないファイルは飛ばす
+        (game_id, ply, usi), = db.lookup_sfen(shogi.STARTING_SFEN)
+        assert ply == 0
+        game = db.game(game_id)
+        assert game["moves"][0] == usi
+        assert db.next_moves(shogi.STARTING_SFEN) == {usi: 1}
+
+        # 途中の局面からも同じ対局の同じ手数が引ける
+        board = shogi.Board(game["sfen"])
+        for move in game["moves"][:10]:
+            board.push_usi(move)
+        assert (game_id, 10, game["moves"][10]) in db.lookup_sfen(board.sfen())
+        counts = db.counts()
+        assert counts["games"] == 1
+        assert counts["moves"] == len(game["moves"])
+        assert counts["positions"] == len(game["moves"]) + 1
+    finally:
+        db.close()
@@ -0,0 +1,43 @@
+import math
+
+import pytest
+import shogi
+
+import match
+
+
+def test_openings_are_distinct_and_reproducible():
+    openings = match.load_openings(None)
+    first = match.make_openings(openings, 60, seed=1)
+    assert len({(sfen, tuple(moves)) for sfen, moves in first}) == 60
+    assert match.make_openings(openings, 60, seed=1) == first
+    for sfen, moves in first:
+        board = shogi.Board(sfen)
+        for usi in moves:
+            assert shogi.Move.from_usi(usi) in board.legal_moves
+            board.push_usi(usi)
+
+
+def test_too_few_openings_without_random_plies():
+    openings = match.load_openings(None)
+    assert len(match.make_openings(openings, len(openings), plies=0)) == len(openings)
+    with pytest.raises(ValueError):
+        match.make_openings(openings, len(openings) + 1, plies=0)
+
+
+def test_sprt_bounds():
+    llr, lower, upper = match.sprt(0, 0, 0, 0, 10)
+    assert llr == 0
+    assert lower == pytest.approx(math.log(0.05 / 0.95))
+    assert upper == pytest.approx(math.log(0.95 / 0.05))
+    assert match.sprt(60, 20, 20, 0, 10)[0] > 0
+    assert match.sprt(20, 20, 60, 0, 10)[0] < 0
+
+
+def test_sprt_one_sided_results_stop():
+    """全勝・全敗・全引き分けでも対数尤度比が閾値を越える"""
+    _, lower, upper = match.sprt(0, 0, 0, 0, 10)
+    assert match.sprt(40, 0, 0, 0, 10)[0] > upper
+    assert match.sprt(0, 0, 40, 0, 10)[0] < lower
+    assert match.sprt(0, 300, 0, 0, 10)[0] < lower
+    assert lower < match.sprt(3, 0, 0, 0, 10)[0] < upper
@@ -0,0 +1,36 @@
+import threading
+import time
+
+import shogi
+
+import MyAI
+
+# 詰みを疑うが、df-pn では5000ノードで解けない局面
+HARD = "l1r2k3/1gs2g1+B1/ppn+Rp4/2p2p2l/P1P4PP/4KPpsp/1P1PPSn1L/1B1S1G3/LNG4N1 b 3p 89"
+
+
+def test_mate_in_one():
+    mate, moves, nodes = MyAI.solve_mate("4k4/9/4P4/9/9/9/9/9/4K4 b G 1")
+    assert mate is True
+    assert [m.usi() for m in moves] == ["G*5b"]
+
+
+def test_quick_mate_check_is_capped():
+    assert MyAI.suspect_mate(MyAI.Position.from_sfen(HARD))
+    board = shogi.Board(HARD)
+    start = time.perf_counter()
+    MyAI.get_best_move(board, 1, book=None)
+    assert time.perf_counter() - start < 0.5  # 時間指定なしでも DFPN_QUICK_MS まで
+
+    move, stats = MyAI.get_best_move(board, 20, node_limit=2000, book=None, with_stats=True)
+    assert move in board.legal_moves
+    assert stats.nodes <= 2000 - 2000 // 10 + 1  # 詰み探索の分は探索のノード数から引く
+
+
+def test_stop_interrupts_mate_search():
+    limits = MyAI.SearchLimits()
+    threading.Timer(0.05, limits.stop).start()
+    start = time.perf_counter()
+    mate, moves, nodes = MyAI.solve_mate(HARD, 10**7, limits=limits)
+    assert mate is None
+    assert time.perf_counter() - start < 1
@@ -0,0 +1,30 @@
+import shogi
+import pytest
+
+import MyAI
+
+STARTPOS_PERFT = [30, 900, 25470]
+
+
+@pytest.mark.parametrize("generator", list(MyAI.PERFT_GENERATORS))
+def test_startpos(generator):
+    depths = len(STARTPOS_PERFT) if generator != "python-shogi" else 2
+    for depth in range(1, depths + 1):
+        assert MyAI.PERFT_GENERATORS[generator](shogi.STARTING_SFEN, depth) == STARTPOS_PERFT[depth - 1]
+
+
+@pytest.mark.parametrize("sfen", MyAI.BENCH_POSITIONS)
+def test_matches_python_shogi(sfen):
+    expected = MyAI.perft_board(shogi.Board(sfen), 2)
+    for name, generator in MyAI.PERFT_GENERATORS.items():
+        if name != "python-shogi":
+            assert generator(sfen, 2) == expected, name
+
+
+@pytest.mark.parametrize("sfen", MyAI.BENCH_POSITIONS)
+def test_make_unmake_restores_position(sfen):
+    pos = MyAI.Position.from_sfen(sfen)
+    before = pos.sfen(), pos.key, pos.material
+    MyAI.perft(pos, 2)
+    assert (pos.sfen(), pos.key, pos.material) == before
+    assert pos.key == pos.compute_key()
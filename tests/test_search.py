@@ -0,0 +1,63 @@
+import shogi
+import pytest
+
+import MyAI
+
+
+def snapshot(pos):
+    return pos.sfen(), pos.key, pos.material, pos.turn, pos.ply, list(pos.king_squares)
+
+
+@pytest.mark.parametrize("sfen", MyAI.BENCH_POSITIONS)
+def test_abort_restores_root(sfen):
+    """どのノードで打ち切っても、rewindでルートの局面に戻る（null moveの途中でも）"""
+    pos = MyAI.Position.from_board(shogi.Board(sfen))
+    root = snapshot(pos)
+    for max_nodes in range(50, 3000, 97):
+        limits = MyAI.SearchLimits(max_nodes=max_nodes)
+        tt = MyAI.TranspositionTable(1)
+        try:
+            MyAI.negamax(pos, 4, -float("inf"), float("inf"), 0, tt, limits, None, MyAI.MoveOrdering())
+        except MyAI.SearchAborted:
+            pos.rewind(root[4])
+        assert snapshot(pos) == root
+        assert pos.key == pos.compute_key()
+
+
+class RecordingCache:
+    """iterative_deepening が書き込む局面を覚えておく"""
+
+    def __init__(self):
+        self.stored = []
+
+    def lookup(self, pos):
+        return None
+
+    def store_pv(self, pos, depth, value, pv):
+        self.stored.append(pos.sfen())
+
+
+@pytest.mark.parametrize("sfen", MyAI.BENCH_POSITIONS)
+def test_aborted_iterative_deepening_keeps_root(sfen):
+    board = shogi.Board(sfen)
+    root = MyAI.Position.from_board(board).sfen()
+    for node_limit in range(200, 6000, 400):
+        cache = RecordingCache()
+        move = MyAI.iterative_deepening(
+            board, 8, node_limit=node_limit, backend="python", cache=cache
+        )[1]
+        assert move in board.legal_moves
+        assert cache.stored in ([], [root])
+
+
+def test_parallel_search_shares_node_limit():
+    """ルート分割の並列探索でも、使うノード数は全ワーカー合計でnode_limit程度"""
+    workers = 2
+    try:
+        _, move, _, _, stats = MyAI.parallel_search(
+            shogi.Board(MyAI.BENCH_POSITIONS[0]), 10, workers, node_limit=3000
+        )
+    finally:
+        MyAI.shutdown_pool()
+    assert move is not None
+    assert stats.nodes <= 3000 + workers * MyAI.SHARED_NODES_FLUSH
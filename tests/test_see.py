@@ -0,0 +1,25 @@
+import shogi
+
+import MyAI
+
+
+def see(sfen, usi):
+    return MyAI.Position.from_sfen(sfen).see(MyAI.encode_move(shogi.Move.from_usi(usi)))
+
+
+def test_see():
+    pawn, rook = MyAI.SEE_VALUES[shogi.PAWN], MyAI.SEE_VALUES[shogi.ROOK]
+    assert see("4k4/9/4p4/9/9/9/9/4R4/4K4 b - 1", "5h5c") == pawn
+    assert see("4k4/4g4/4p4/9/9/9/9/4R4/4K4 b - 1", "5h5c") == pawn - rook
+
+
+def test_see_values_follow_piece_values():
+    assert MyAI.SEE_VALUES == MyAI.see_values(MyAI.PIECE_VALUE_DICT)
+    assert MyAI.PIECE_TYPE_VALUES == MyAI.piece_type_values(MyAI.PIECE_VALUE_DICT)
+    values = dict(MyAI.PIECE_VALUE_DICT, P=90, p=-90, **{"+P": 600, "+p": -600})
+    see_values = MyAI.see_values(values)
+    assert see_values[shogi.PAWN] == 180
+    assert see_values[shogi.PROM_PAWN] == 690  # と金は盤上の価値＋持ち駒の歩
+    type_values = MyAI.piece_type_values(dict(values, L=430, N=480))
+    assert type_values[shogi.PAWN] == 1  # 90cpでも0にしない
+    assert type_values[shogi.LANCE] < type_values[shogi.KNIGHT]
@@ -0,0 +1,43 @@
+import pytest
+
+import MyAI
+
+SCORES = [0, 1, -1, 100, -100, 32767, -32768, MyAI.MATE_VALUE - 3, -(MyAI.MATE_VALUE - 3)]
+
+
+def test_round_trip_across_generations():
+    tt = MyAI.TranspositionTable(1)
+    key = 0x123456789ABCDEF0
+    for generation in range(256):
+        tt.new_search()
+        for score in SCORES:
+            for bound in (MyAI.EXACT, MyAI.LOWER, MyAI.UPPER):
+                depth = generation % 64
+                move = (generation * 131 + bound) % 0xFFFF + 1  # 0は「前の手を残す」
+                tt.store(key, depth, score, bound, move)
+                assert tt.probe(key) == (depth, score, bound, move), generation
+
+
+def test_same_generation_keeps_deeper_entry():
+    tt = MyAI.TranspositionTable(1)
+    tt.new_search()
+    deep, shallow = 5, 5 + tt.size  # 同じスロットに入る別の局面
+    tt.store(deep, 8, 100, MyAI.EXACT, 1)
+    tt.store(shallow, 2, -50, MyAI.EXACT, 2)
+    assert tt.probe(deep) == (8, 100, MyAI.EXACT, 1)
+    assert tt.probe(shallow) is None
+
+
+@pytest.mark.parametrize("searches", [1, 63, 64, 200])
+def test_old_generation_is_replaced(searches):
+    tt = MyAI.TranspositionTable(1)
+    deep, shallow = 5, 5 + tt.size
+    tt.store(deep, 8, 100, MyAI.EXACT, 1)
+    for _ in range(searches):
+        tt.new_search()
+    tt.store(shallow, 2, -50, MyAI.EXACT, 2)
+    if searches % 64:
+        assert tt.probe(shallow) == (2, -50, MyAI.EXACT, 2)
+    else:
+        # 世代が一周すると同じ世代に見える
+        assert tt.probe(deep) == (8, 100, MyAI.EXACT, 1)